@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Bulk Admin Transaction Actions
+Set-based status changes for hundreds or thousands of transactions at once
+
+Targets are either an explicit list of ids or an admin search filter
+(same keys as /api/admin/transactions, see admin_search.py). Work is done in
+chunks of CHUNK_SIZE ids, one DB transaction per chunk:
+
+    SELECT id, user_id, status, ... FOR UPDATE      lock the chunk
+    UPDATE transactions SET status = :new, processed_at = NOW()
+    WHERE id IN (...) AND status IN (:allowed)      one statement per chunk
+    INSERT INTO admin_bulk_audit (...)              one compact audit row per chunk
+    rollup deltas                                   one upsert per touched bucket
+    outbox socket.delta                             one event per user in the chunk
+
+The outbox events commit with the chunk, so a change is never applied without
+its notification (or the other way round). They reach the dashboard as one
+`transactions_bulk_update` per user and chunk ({'status', 'ids', 'count'}),
+or inside that user's next coalesced `transactions_delta` when
+SOCKETIO_DELTA_WINDOW is set (realtime_deltas.py).
+After the last chunk analytics cache entries are invalidated.
+
+A filter matching more than MAX_IDS transactions is rejected, like an explicit
+id list over MAX_IDS, rather than silently applied to the first MAX_IDS.
+
+Allowed transitions (anything else is skipped and counted):
+    FRAUD   <- SUCCESS, PENDING, FAILED
+    FAILED  <- PENDING                      (reversing a PENDING batch)
+    SUCCESS <- PENDING                      (approving a PENDING batch)
+
+Route usage (inside the admin blueprint's existing admin check):
+    from admin_bulk import handle_bulk_request
+    body, status = handle_bulk_request(db.session, request.get_json(), admin_id=current_user.id)
+    return jsonify(body), status
+
+Request body:
+    {"status": "FRAUD", "ids": [1, 2, 3], "reason": "card testing ring"}
+    {"status": "FAILED", "filter": {"status": "PENDING", "date_to": "2026-10-01"}}
+
+CLI:
+    python admin_bulk.py create                               # audit table
+    python admin_bulk.py apply --status FRAUD --ids 1,2,3 --admin-id 1 --reason "..."
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import Column, DateTime, Integer, String, Table, Text, bindparam, text
+
+from app import create_app, db
+from admin_search import build_query, parse_filters
+
+CHUNK_SIZE = 500
+MAX_IDS = 50000
+
+ALLOWED_FROM = {
+    'FRAUD': ('SUCCESS', 'PENDING', 'FAILED'),
+    'FAILED': ('PENDING',),
+    'SUCCESS': ('PENDING',),
+}
+
+admin_bulk_audit = Table(
+    'admin_bulk_audit', db.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('admin_id', Integer, nullable=True),
+    Column('new_status', String(20), nullable=False),
+    Column('reason', String(255), nullable=True),
+    Column('transaction_ids', Text, nullable=False),
+    Column('affected_count', Integer, nullable=False),
+    Column('created_at', DateTime, nullable=False, default=datetime.utcnow),
+    extend_existing=True,
+)
+
+
+def compact_ids(ids):
+    """Encode sorted ids as ranges, e.g. [1,2,3,7] -> '1-3,7'"""
+    parts = []
+    ids = sorted(ids)
+    start = prev = None
+    for row_id in ids:
+        if start is None:
+            start = prev = row_id
+        elif row_id == prev + 1:
+            prev = row_id
+        else:
+            parts.append(f"{start}-{prev}" if prev != start else str(start))
+            start = prev = row_id
+    if start is not None:
+        parts.append(f"{start}-{prev}" if prev != start else str(start))
+    return ','.join(parts)
+
+
+def ids_from_filter(session, filters, limit=MAX_IDS):
+    """
+    Resolve a search filter into ids by walking the indexed keyset pages
+    Returns (ids, truncated); truncated means more than `limit` rows match.
+    """
+    filters = dict(filters, limit=CHUNK_SIZE)
+    filters.pop('cursor', None)
+    ids = []
+    while len(ids) <= limit:
+        sql, params = build_query(filters)
+        rows = session.execute(text(sql), params).mappings().all()
+        ids.extend(row['id'] for row in rows[:CHUNK_SIZE])
+        if len(rows) <= CHUNK_SIZE:
+            break
+        last = rows[CHUNK_SIZE - 1]
+        filters['cursor'] = (last['created_at'], last['id'])
+    return ids[:limit], len(ids) > limit
+
+
+def filter_args(raw):
+    """
+    JSON filter values as the query-string strings parse_filters expects
+    Numbers are converted; lists, objects and booleans are field errors.
+    """
+    args, errors = {}, {}
+    for key, value in raw.items():
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            errors[key] = 'Must be a string or a number'
+        else:
+            args[key] = str(value)
+    return args, errors
+
+
+def apply_chunk(session, ids, new_status, admin_id, reason):
+    """Update one chunk and queue its notifications in one DB transaction, return affected rows"""
+    from analytics_rollups import apply_status_changes
+    from outbox_dispatcher import enqueue_event
+
+    allowed = ALLOWED_FROM[new_status]
+    select_chunk = text("""
+        SELECT id, user_id, status, currency, amount, created_at
+        FROM transactions
+        WHERE id IN :ids AND status IN :allowed
+        FOR UPDATE
+    """).bindparams(bindparam('ids', expanding=True), bindparam('allowed', expanding=True))
+    rows = session.execute(select_chunk, {'ids': ids, 'allowed': list(allowed)}).mappings().all()
+    if not rows:
+        session.commit()
+        return []
+
+    affected_ids = [row['id'] for row in rows]
+    session.execute(text("""
+        UPDATE transactions SET status = :status, processed_at = :now
+        WHERE id IN :ids
+    """).bindparams(bindparam('ids', expanding=True)),
+        {'status': new_status, 'now': datetime.utcnow(), 'ids': affected_ids})
+
+    session.execute(admin_bulk_audit.insert().values(
+        admin_id=admin_id,
+        new_status=new_status,
+        reason=(reason or '')[:255] or None,
+        transaction_ids=compact_ids(affected_ids),
+        affected_count=len(affected_ids),
+    ))
+    apply_status_changes(session, [
+        (row['user_id'], row['created_at'], row['status'], row['currency'], row['amount'])
+        for row in rows
+    ], new_status)
+
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row['user_id'], []).append(row)
+    for user_id, user_rows in by_user.items():
+        enqueue_event(session, 'socket.delta', {'transactions': [{
+            'id': row['id'],
+            'status': new_status,
+            'previous_status': row['status'],
+            'amount': row['amount'],
+            'currency': row['currency'],
+        } for row in user_rows]}, user_id=user_id)
+    session.commit()
+    return rows
+
+
+def bulk_update_status(session, new_status, ids=None, filters=None, admin_id=None, reason=None):
+    """
+    Apply a status change to ids or to everything matching filters
+    Raises ValueError if filters match more than MAX_IDS transactions.
+    """
+    from analytics_cache import invalidate_user
+
+    if ids is None:
+        ids, truncated = ids_from_filter(session, filters or {})
+        if truncated:
+            raise ValueError(f"Filter matches more than {MAX_IDS} transactions, narrow it down")
+    ids = sorted(set(int(i) for i in ids))[:MAX_IDS]
+
+    users = set()
+    updated = 0
+    for offset in range(0, len(ids), CHUNK_SIZE):
+        rows = apply_chunk(session, ids[offset:offset + CHUNK_SIZE], new_status, admin_id, reason)
+        updated += len(rows)
+        users.update(row['user_id'] for row in rows)
+
+    for user_id in users:
+        invalidate_user(user_id)
+
+    return {
+        'requested': len(ids),
+        'updated': updated,
+        'skipped': len(ids) - updated,
+        'users_notified': len(users),
+    }
+
+
+def handle_bulk_request(session, payload, admin_id=None):
+    """Validate a bulk request body, return (json body, http status)"""
+    payload = payload or {}
+    errors = {}
+
+    new_status = str(payload.get('status') or '').upper()
+    if new_status not in ALLOWED_FROM:
+        errors['status'] = f"Must be one of {', '.join(ALLOWED_FROM)}"
+
+    ids = payload.get('ids')
+    filters = None
+    if ids is not None:
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids):
+            errors['ids'] = 'Must be a list of transaction ids'
+        elif len(ids) > MAX_IDS:
+            errors['ids'] = f"At most {MAX_IDS} ids per request"
+    elif isinstance(payload.get('filter'), dict) and payload['filter']:
+        args, filter_errors = filter_args(payload['filter'])
+        filters, parse_errors = parse_filters(args)
+        filter_errors.update(parse_errors)
+        errors.update({f"filter.{k}": v for k, v in filter_errors.items()})
+    else:
+        errors['ids'] = 'Provide ids or a non-empty filter'
+
+    if errors:
+        return {'success': False, 'errors': errors}, 400
+
+    try:
+        result = bulk_update_status(session, new_status, ids=ids, filters=filters,
+                                    admin_id=admin_id, reason=payload.get('reason'))
+    except ValueError as e:
+        return {'success': False, 'errors': {'filter': str(e)}}, 400
+    return {'success': True, **result}, 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk admin transaction actions')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help='Create the admin_bulk_audit table')
+    apply = subparsers.add_parser('apply', help='Apply a bulk status change')
+    apply.add_argument('--status', required=True)
+    apply.add_argument('--ids', help='Comma separated transaction ids')
+    apply.add_argument('--filter', help='JSON search filter, e.g. {"status": "PENDING"}')
+    apply.add_argument('--admin-id', type=int)
+    apply.add_argument('--reason')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.command == 'create':
+            admin_bulk_audit.create(db.engine, checkfirst=True)
+            print("✓ admin_bulk_audit table ready")
+            return 0
+
+        payload = {'status': args.status, 'reason': args.reason}
+        if args.ids:
+            payload['ids'] = [i.strip() for i in args.ids.split(',') if i.strip()]
+        if args.filter:
+            payload['filter'] = json.loads(args.filter)
+        body, status = handle_bulk_request(db.session, payload, admin_id=args.admin_id)
+        print(json.dumps(body, indent=2))
+        return 0 if status == 200 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
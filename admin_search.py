@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Indexed Server-Side Search for /api/admin/transactions
+Filters and keyset (cursor) pagination that never scan the whole table
+
+Supported filters (query string):
+    external_transaction_id   exact match
+    last4                     last four digits of the card
+    ip_address                exact match
+    status                    SUCCESS / FAILED / PENDING / FRAUD
+    min_amount, max_amount    inclusive range
+    date_from, date_to        ISO dates, date_to exclusive
+    limit                     page size (max 200)
+    cursor                    opaque value from the previous page's next_cursor
+
+Results are ordered newest first by (created_at, id). The cursor encodes the
+last row's (created_at, id), so page N costs the same as page 1 (no OFFSET).
+
+Indexes (created by `python admin_search.py create-indexes`):
+    ix_tx_status_created      (status, created_at, id)
+    ix_tx_created             (created_at, id)
+    ix_tx_external_id         (external_transaction_id)
+    ix_tx_last4_created       (card_last4, created_at)   card_last4 is a STORED
+                                                          generated column
+    ix_tx_ip_created          (ip_address, created_at)
+    ix_tx_amount              (amount)
+    ix_tx_processed           (processed_at)             incremental exports
+
+Route usage:
+    from admin_search import parse_filters, search_transactions
+
+    filters, errors = parse_filters(request.args)
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+    page = search_transactions(db.session, filters)
+    return jsonify({'success': True, **page})
+
+Verify every filter uses an index: python test_admin_search_explain.py
+"""
+
+import base64
+import json
+import os
+import re
+import sys
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+MAX_LIMIT = 200
+DEFAULT_LIMIT = 50
+STATUSES = ('SUCCESS', 'FAILED', 'PENDING', 'FRAUD')
+LAST4_RE = re.compile(r'^\d{4}$')
+
+COLUMNS = ('id, user_id, amount, currency, status, masked_card_number, fraud_score, '
+           'ip_address, created_at, processed_at, external_transaction_id')
+
+INDEXES = [
+    ('ix_tx_status_created', '(status, created_at, id)'),
+    ('ix_tx_created', '(created_at, id)'),
+    ('ix_tx_external_id', '(external_transaction_id)'),
+    ('ix_tx_last4_created', '(card_last4, created_at)'),
+    ('ix_tx_ip_created', '(ip_address, created_at)'),
+    ('ix_tx_amount', '(amount)'),
+    ('ix_tx_processed', '(processed_at)'),
+]
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(created_at), int(row_id)
+
+
+def parse_filters(args):
+    """Validate query args, return (filters, errors) with every error reported"""
+    filters = {}
+    errors = {}
+
+    for key in ('external_transaction_id', 'ip_address'):
+        value = (args.get(key) or '').strip()
+        if value:
+            filters[key] = value[:100]
+
+    last4 = (args.get('last4') or '').strip()
+    if last4:
+        if LAST4_RE.match(last4):
+            filters['last4'] = last4
+        else:
+            errors['last4'] = 'Must be exactly 4 digits'
+
+    status = (args.get('status') or '').strip().upper()
+    if status:
+        if status in STATUSES:
+            filters['status'] = status
+        else:
+            errors['status'] = f"Must be one of {', '.join(STATUSES)}"
+
+    for key in ('min_amount', 'max_amount'):
+        value = (args.get(key) or '').strip()
+        if value:
+            try:
+                amount = Decimal(value)
+            except InvalidOperation:
+                amount = None
+            # Decimal() also accepts NaN / Infinity, which the driver cannot bind
+            if amount is not None and amount.is_finite():
+                filters[key] = amount
+            else:
+                errors[key] = 'Must be a number'
+
+    for key in ('date_from', 'date_to'):
+        value = (args.get(key) or '').strip()
+        if value:
+            try:
+                filters[key] = datetime.fromisoformat(value)
+            except ValueError:
+                errors[key] = 'Must be an ISO date (YYYY-MM-DD)'
+
+    try:
+        filters['limit'] = max(1, min(int(args.get('limit') or DEFAULT_LIMIT), MAX_LIMIT))
+    except ValueError:
+        errors['limit'] = 'Must be an integer'
+
+    cursor = args.get('cursor')
+    if cursor:
+        try:
+            filters['cursor'] = decode_cursor(cursor)
+        except (ValueError, TypeError):
+            errors['cursor'] = 'Invalid cursor'
+
+    return filters, errors
+
+
+def build_query(filters):
+    """Return (sql, params) for one page"""
+    clauses = []
+    params = {'limit': filters.get('limit', DEFAULT_LIMIT) + 1}
+
+    if 'external_transaction_id' in filters:
+        clauses.append('external_transaction_id = :external_id')
+        params['external_id'] = filters['external_transaction_id']
+    if 'last4' in filters:
+        clauses.append('card_last4 = :last4')
+        params['last4'] = filters['last4']
+    if 'ip_address' in filters:
+        clauses.append('ip_address = :ip')
+        params['ip'] = filters['ip_address']
+    if 'status' in filters:
+        clauses.append('status = :status')
+        params['status'] = filters['status']
+    if 'min_amount' in filters:
+        clauses.append('amount >= :min_amount')
+        params['min_amount'] = filters['min_amount']
+    if 'max_amount' in filters:
+        clauses.append('amount <= :max_amount')
+        params['max_amount'] = filters['max_amount']
+    if 'date_from' in filters:
+        clauses.append('created_at >= :date_from')
+        params['date_from'] = filters['date_from']
+    if 'date_to' in filters:
+        clauses.append('created_at < :date_to')
+        params['date_to'] = filters['date_to']
+    if 'cursor' in filters:
+        # Row constructor comparison is index friendly on (created_at, id)
+        clauses.append('(created_at, id) < (:cursor_created, :cursor_id)')
+        params['cursor_created'], params['cursor_id'] = filters['cursor']
+
+    where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    sql = (f"SELECT {COLUMNS} FROM transactions {where} "
+           f"ORDER BY created_at DESC, id DESC LIMIT :limit")
+    return sql, params
+
+
+def search_transactions(session, filters):
+    """Run one page of the search, return {'transactions', 'next_cursor', 'has_more'}"""
+    sql, params = build_query(filters)
+    rows = session.execute(text(sql), params).mappings().all()
+
+    limit = filters.get('limit', DEFAULT_LIMIT)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    transactions = []
+    for row in rows:
+        item = dict(row)
+        item['amount'] = float(item['amount']) if item['amount'] is not None else None
+        for key in ('created_at', 'processed_at'):
+            item[key] = item[key].isoformat() if item[key] else None
+        transactions.append(item)
+
+    next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+    return {'transactions': transactions, 'next_cursor': next_cursor, 'has_more': has_more}
+
+
+def create_indexes(conn):
+    """Add the generated last-four column and every search index (idempotent)"""
+    existing_columns = set(conn.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'"
+    )).scalars())
+    if 'card_last4' not in existing_columns:
+        print("   Adding generated column card_last4")
+        conn.execute(text(
+            "ALTER TABLE transactions ADD COLUMN card_last4 CHAR(4) "
+            "AS (RIGHT(masked_card_number, 4)) STORED"
+        ))
+
+    existing_indexes = set(conn.execute(text(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'"
+    )).scalars())
+    for name, columns in INDEXES:
+        if name in existing_indexes:
+            print(f"   ✓ {name} exists")
+            continue
+        print(f"   Creating {name} {columns}")
+        conn.execute(text(f"CREATE INDEX {name} ON transactions {columns}"))
+    conn.commit()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('create-indexes', 'search'):
+        print("Usage: python admin_search.py create-indexes")
+        print("       python admin_search.py search key=value [key=value ...]")
+        return 1
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        if sys.argv[1] == 'create-indexes':
+            with db.engine.connect() as conn:
+                create_indexes(conn)
+            print("✓ Search indexes ready")
+            return 0
+
+        args = dict(arg.split('=', 1) for arg in sys.argv[2:])
+        filters, errors = parse_filters(args)
+        if errors:
+            print(json.dumps(errors, indent=2))
+            return 1
+        print(json.dumps(search_transactions(db.session, filters), indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Redis Analytics Cache with Event-Driven Invalidation
+Response cache for /api/analytics/stats and /api/admin/stats
+
+Keys:
+    analytics:v1:user:<user_id>:<epoch>:<name>:<window>   per-user views
+    analytics:v1:admin:<epoch>:<name>:<window>            admin views
+
+Invalidation is by epoch bump, never by key scan:
+- analytics:epoch:user:<user_id> is INCR'd after a commit that touches the user
+- analytics:epoch:global is INCR'd after any transaction commit (admin views)
+Old entries simply stop being read and expire on their own TTL.
+
+Stampede protection:
+- Every entry stores its value together with a soft expiry
+- After the soft expiry the first caller takes a short NX lock and recomputes,
+  everyone else keeps getting the stale value until the new one lands
+- A hard TTL (soft TTL + STALE_GRACE) bounds how stale a value can be
+- After an epoch bump there is no stale value; callers wait briefly on the
+  lock holder and only compute themselves if it does not finish in time
+- The lock holds a per-holder token and is released with a compare-and-delete
+  script, so a holder that overran LOCK_TTL cannot drop someone else's lock
+
+Redis is never required: any RedisError falls back to compute(). Hit / miss
+counters are kept per process and flushed with one pipelined HINCRBY per
+outcome every COUNTER_FLUSH_SECONDS, not one round trip per request.
+
+Usage in a route:
+    from analytics_cache import cached_user_view, cached_admin_view, invalidate_user
+
+    stats = cached_user_view(user_id, 'stats', '30d', lambda: user_stats(db.session, user_id))
+    ...
+    db.session.commit()
+    invalidate_user(transaction.user_id)      # after the commit
+
+CLI:
+    python analytics_cache.py stats             # Hit / miss / stale counters
+    python analytics_cache.py flush             # Bump every epoch
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+PREFIX = 'analytics:v1'
+DEFAULT_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 30))
+STALE_GRACE = int(os.environ.get('ANALYTICS_CACHE_STALE_GRACE', 300))
+LOCK_TTL = 10
+LOCK_WAIT = 2.0
+COUNTER_FLUSH_SECONDS = 5.0
+
+# Delete the lock only if it still holds our token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+_release = None
+_counts = Counter()
+_counts_lock = threading.Lock()
+_flushed_at = time.monotonic()
+MISSING = object()
+
+
+def get_redis():
+    """Shared Redis client built from the same settings docker-compose passes the app"""
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            socket_timeout=0.5,
+            decode_responses=True,
+        )
+    return _client
+
+
+def _epoch(client, key):
+    return client.get(key) or '0'
+
+
+def _count(client, outcome):
+    """Count locally; flush to Redis at most every COUNTER_FLUSH_SECONDS"""
+    global _flushed_at
+    with _counts_lock:
+        _counts[outcome] += 1
+        if time.monotonic() - _flushed_at < COUNTER_FLUSH_SECONDS:
+            return
+        pending = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    try:
+        pipe = client.pipeline(transaction=False)
+        for name, count in pending.items():
+            pipe.hincrby(f"{PREFIX}:counters", name, count)
+        pipe.execute()
+    except redis.RedisError:
+        # Counters are diagnostics only
+        pass
+
+
+def get_or_compute(key, compute, ttl=DEFAULT_TTL, client=None):
+    """
+    Return the cached value for key, recomputing at most once across workers
+    compute() must return something json serializable.
+    Falls back to compute() if Redis is unavailable.
+    """
+    client = client or get_redis()
+    try:
+        raw = client.get(key)
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry['soft_expiry'] > time.time():
+                _count(client, 'hit')
+                return entry['value']
+            token = _acquire(client, key)
+            if token is None:
+                # Someone else is refreshing, serve stale
+                _count(client, 'stale')
+                return entry['value']
+        else:
+            token = _acquire(client, key)
+            if token is None:
+                # Cold key being computed elsewhere: wait for it rather than piling on
+                value = _wait_for(client, key)
+                if value is not MISSING:
+                    return value
+            _count(client, 'miss')
+    except redis.RedisError:
+        return compute()
+
+    if token is None:
+        return compute()
+    return _refresh(client, key, compute, ttl, token)
+
+
+def _acquire(client, key):
+    """Lock token if we got the refresh lock, else None"""
+    token = uuid.uuid4().hex
+    return token if client.set(f"{key}:lock", token, nx=True, ex=LOCK_TTL) else None
+
+
+def _wait_for(client, key):
+    deadline = time.time() + LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        raw = client.get(key)
+        if raw is not None:
+            _count(client, 'waited')
+            return json.loads(raw)['value']
+    return MISSING
+
+
+def _release_lock(client, key, token):
+    global _release
+    if _release is None:
+        _release = client.register_script(RELEASE_SCRIPT)
+    _release(keys=[f"{key}:lock"], args=[token], client=client)
+
+
+def _refresh(client, key, compute, ttl, token):
+    try:
+        value = compute()
+        entry = {'value': value, 'soft_expiry': time.time() + ttl}
+        try:
+            client.set(key, json.dumps(entry, default=str), ex=ttl + STALE_GRACE)
+        except redis.RedisError:
+            pass
+        return value
+    finally:
+        try:
+            _release_lock(client, key, token)
+        except redis.RedisError:
+            # The lock expires after LOCK_TTL
+            pass
+
+
+def user_key(user_id, name, window, client=None):
+    client = client or get_redis()
+    epoch = _epoch(client, f"analytics:epoch:user:{user_id}")
+    return f"{PREFIX}:user:{user_id}:{epoch}:{name}:{window}"
+
+
+def admin_key(name, window, client=None):
+    client = client or get_redis()
+    epoch = _epoch(client, 'analytics:epoch:global')
+    return f"{PREFIX}:admin:{epoch}:{name}:{window}"
+
+
+def cached_user_view(user_id, name, window, compute, ttl=DEFAULT_TTL):
+    """Cache a per-user analytics view"""
+    try:
+        key = user_key(user_id, name, window)
+    except redis.RedisError:
+        return compute()
+    return get_or_compute(key, compute, ttl)
+
+
+def cached_admin_view(name, window, compute, ttl=DEFAULT_TTL):
+    """Cache a platform-wide admin view"""
+    try:
+        key = admin_key(name, window)
+    except redis.RedisError:
+        return compute()
+    return get_or_compute(key, compute, ttl)
+
+
+def invalidate_user(user_id, client=None):
+    """Call after a commit that adds or changes the user's transactions"""
+    client = client or get_redis()
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(f"analytics:epoch:user:{user_id}")
+        pipe.incr('analytics:epoch:global')
+        pipe.execute()
+    except redis.RedisError:
+        # Entries expire on their own TTL, a missed bump only delays freshness
+        pass
+
+
+def flush_all(client=None):
+    client = client or get_redis()
+    bumped = 1
+    client.incr('analytics:epoch:global')
+    for key in client.scan_iter('analytics:epoch:user:*', count=1000):
+        client.incr(key)
+        bumped += 1
+    return bumped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analytics response cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Show cache counters')
+    subparsers.add_parser('flush', help='Invalidate every cached view')
+    args = parser.parse_args()
+
+    client = get_redis()
+    if args.command == 'stats':
+        counters = {k: int(v) for k, v in client.hgetall(f"{PREFIX}:counters").items()}
+        total = sum(counters.values()) or 1
+        for outcome in ('hit', 'stale', 'waited', 'miss'):
+            count = counters.get(outcome, 0)
+            print(f"{outcome:<8} {count:>10}  ({count / total * 100:.1f}%)")
+    else:
+        print(f"✓ Bumped {flush_all(client)} epoch(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Pre-Aggregated Transaction Rollups
+Hourly and daily rollups for /api/analytics/stats and /api/analytics/trends
+
+Tables (keyed by user, bucket, status, currency):
+- transaction_rollups_hourly: bucket = start of the hour
+- transaction_rollups_daily:  bucket = day
+- transaction_rollup_watermark: one row, the first hour not folded yet
+
+How they stay current:
+- `fold` upserts every hour from the watermark up to hour_start(now - FOLD_LAG)
+  from raw rows (INSERT ... SELECT ... GROUP BY ... ON DUPLICATE KEY UPDATE)
+  and advances the watermark in the same DB transaction. FOLD_LAG leaves time
+  for transactions stamped just before the hour boundary to commit, so an hour
+  is never folded while rows for it are still in flight. `run` folds every
+  ROLLUP_FOLD_INTERVAL seconds (the `rollups` service in docker-compose.yml).
+- The watermark is its own row rather than MAX(bucket): hours without any
+  transactions leave no rollup rows but are still folded
+- Status changes on already-folded rows (PENDING -> SUCCESS, FRAUD marks) are
+  applied at commit time with apply_status_change() in the same DB transaction;
+  it reads the watermark with a shared lock, so it waits for a running fold
+- Everything from the watermark on is read live from `transactions`
+  (a small range on the user_id/created_at index)
+
+Analytics endpoints answer from:
+    from analytics_rollups import user_stats, user_trends
+    user_stats(db.session, user_id)      # same keys as /api/analytics/stats
+    user_trends(db.session, user_id, 30) # daily series for /api/analytics/trends
+
+Usage:
+    python analytics_rollups.py create
+    python analytics_rollups.py fold
+    python analytics_rollups.py run                  # create, then fold forever
+    python analytics_rollups.py repair --days 90     # Rebuild from raw rows
+    python analytics_rollups.py stats --user-id 1    # Compare rollup vs raw answer
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import (
+    Column, Date, DateTime, Integer, Numeric, PrimaryKeyConstraint, String, Table, func, select, text,
+)
+
+from app import create_app, db
+
+HOURLY = 'transaction_rollups_hourly'
+DAILY = 'transaction_rollups_daily'
+WATERMARK = 'transaction_rollup_watermark'
+# How long after an hour ends before it is folded
+FOLD_LAG = timedelta(seconds=int(os.environ.get('ROLLUP_FOLD_LAG_SECONDS', 300)))
+FOLD_INTERVAL = float(os.environ.get('ROLLUP_FOLD_INTERVAL', 60))
+
+
+def _rollup_table(name, bucket_type):
+    return Table(
+        name, db.metadata,
+        Column('user_id', Integer, nullable=False),
+        Column('bucket', bucket_type, nullable=False),
+        Column('status', String(20), nullable=False),
+        Column('currency', String(3), nullable=False),
+        Column('tx_count', Integer, nullable=False, default=0),
+        Column('amount_total', Numeric(18, 2), nullable=False, default=0),
+        PrimaryKeyConstraint('user_id', 'bucket', 'status', 'currency'),
+        extend_existing=True,
+    )
+
+
+rollups_hourly = _rollup_table(HOURLY, DateTime)
+rollups_daily = _rollup_table(DAILY, Date)
+rollup_watermark = Table(
+    WATERMARK, db.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('folded_until', DateTime, nullable=False),
+    extend_existing=True,
+)
+
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def folded_until(session, lock=None):
+    """
+    First hour that has not been folded yet (None if nothing folded)
+    lock='update' serializes folds, lock='share' waits for a running fold.
+    """
+    query = select(rollup_watermark.c.folded_until).where(rollup_watermark.c.id == 1)
+    if lock:
+        query = query.with_for_update(read=lock == 'share')
+    watermark = session.execute(query).scalar()
+    if watermark is None:
+        # Rollups folded before the watermark row existed
+        latest = session.execute(select(func.max(rollups_hourly.c.bucket))).scalar()
+        watermark = latest + timedelta(hours=1) if latest else None
+    return watermark
+
+
+def set_folded_until(session, watermark):
+    session.execute(text(f"""
+        INSERT INTO {WATERMARK} (id, folded_until) VALUES (1, :watermark)
+        ON DUPLICATE KEY UPDATE folded_until = GREATEST(folded_until, VALUES(folded_until))
+    """), {'watermark': watermark})
+
+
+def fold_range(session, start, end):
+    """Recompute hourly rows for [start, end) and the daily rows they touch"""
+    # Clear first so that hours whose rows all moved status do not keep stale counts
+    session.execute(text(f"DELETE FROM {HOURLY} WHERE bucket >= :start AND bucket < :end"),
+                    {'start': start, 'end': end})
+    session.execute(text(f"""
+        INSERT INTO {HOURLY} (user_id, bucket, status, currency, tx_count, amount_total)
+        SELECT user_id,
+               DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00'),
+               status, currency, COUNT(*), COALESCE(SUM(amount), 0)
+        FROM transactions
+        WHERE created_at >= :start AND created_at < :end
+        GROUP BY user_id, DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00'), status, currency
+        ON DUPLICATE KEY UPDATE tx_count = VALUES(tx_count), amount_total = VALUES(amount_total)
+    """), {'start': start, 'end': end})
+
+    # Daily rows are rebuilt from the hourly rows of every touched day
+    day_start = start.replace(hour=0)
+    day_end = hour_start(end - timedelta(microseconds=1)).replace(hour=0) + timedelta(days=1)
+    session.execute(text(f"DELETE FROM {DAILY} WHERE bucket >= :start AND bucket < :end"),
+                    {'start': day_start.date(), 'end': day_end.date()})
+    session.execute(text(f"""
+        INSERT INTO {DAILY} (user_id, bucket, status, currency, tx_count, amount_total)
+        SELECT user_id, DATE(bucket), status, currency, SUM(tx_count), SUM(amount_total)
+        FROM {HOURLY}
+        WHERE bucket >= :start AND bucket < :end
+        GROUP BY user_id, DATE(bucket), status, currency
+        ON DUPLICATE KEY UPDATE tx_count = VALUES(tx_count), amount_total = VALUES(amount_total)
+    """), {'start': day_start, 'end': day_end})
+
+
+def fold(session, now=None):
+    """Fold every hour that closed at least FOLD_LAG ago, return (start, end) folded"""
+    end = hour_start((now or datetime.utcnow()) - FOLD_LAG)
+    start = folded_until(session, lock='update')
+    if start is None:
+        oldest = session.execute(text("SELECT MIN(created_at) FROM transactions")).scalar()
+        if oldest is None:
+            session.rollback()
+            return None
+        start = hour_start(oldest)
+    if start >= end:
+        session.rollback()
+        return None
+
+    fold_range(session, start, end)
+    set_folded_until(session, end)
+    session.commit()
+    return start, end
+
+
+def apply_status_change(session, transaction, old_status):
+    """
+    Move one already-folded transaction between status buckets
+    Call before db.session.commit() wherever a transaction's status changes.
+    Rows in hours that are not folded yet are left to `fold`.
+    """
+    apply_status_changes(session, [(
+        transaction.user_id, transaction.created_at, old_status,
+        transaction.currency, transaction.amount,
+    )], transaction.status)
+
+
+def apply_status_changes(session, rows, new_status):
+    """
+    Set-based version for bulk updates
+    rows are (user_id, created_at, old_status, currency, amount); deltas are
+    summed per bucket so each touched bucket gets one upsert.
+    """
+    watermark = folded_until(session, lock='share')
+    if watermark is None:
+        return
+
+    new_status = getattr(new_status, 'name', new_status)
+    deltas = {}
+    for user_id, created_at, old_status, currency, amount in rows:
+        hour = hour_start(created_at)
+        if hour >= watermark:
+            continue
+        old_status = getattr(old_status, 'name', old_status)
+        for table, bucket in ((HOURLY, hour), (DAILY, hour.date())):
+            for status, sign in ((old_status, -1), (new_status, 1)):
+                key = (table, user_id, bucket, status, currency)
+                count, total = deltas.get(key, (0, 0))
+                deltas[key] = (count + sign, total + sign * amount)
+
+    for table in (HOURLY, DAILY):
+        params = [
+            {'user_id': user_id, 'bucket': bucket, 'status': status, 'currency': currency,
+             'count': count, 'amount': total}
+            for (t, user_id, bucket, status, currency), (count, total) in deltas.items()
+            if t == table and count
+        ]
+        if params:
+            session.execute(text(f"""
+                INSERT INTO {table} (user_id, bucket, status, currency, tx_count, amount_total)
+                VALUES (:user_id, :bucket, :status, :currency, :count, :amount)
+                ON DUPLICATE KEY UPDATE tx_count = tx_count + VALUES(tx_count),
+                                        amount_total = amount_total + VALUES(amount_total)
+            """), params)
+
+
+def _live_rows(session, user_id, since):
+    """Per status/currency totals from raw rows not yet folded"""
+    return session.execute(text("""
+        SELECT status, currency, COUNT(*) AS tx_count, COALESCE(SUM(amount), 0) AS amount_total
+        FROM transactions
+        WHERE user_id = :user_id AND created_at >= :since
+        GROUP BY status, currency
+    """), {'user_id': user_id, 'since': since}).mappings().all()
+
+
+def user_stats(session, user_id):
+    """Answer /api/analytics/stats from rollups plus the live unfolded tail"""
+    watermark = folded_until(session) or datetime(1970, 1, 1)
+    today = watermark.replace(hour=0)
+
+    rows = list(session.execute(text(f"""
+        SELECT status, currency, SUM(tx_count) AS tx_count, SUM(amount_total) AS amount_total
+        FROM {DAILY} WHERE user_id = :user_id AND bucket < :today
+        GROUP BY status, currency
+        UNION ALL
+        SELECT status, currency, SUM(tx_count), SUM(amount_total)
+        FROM {HOURLY} WHERE user_id = :user_id AND bucket >= :today AND bucket < :watermark
+        GROUP BY status, currency
+    """), {'user_id': user_id, 'today': today.date(), 'watermark': watermark}).mappings().all())
+    rows.extend(_live_rows(session, user_id, watermark))
+
+    stats = {'total_transactions': 0, 'total_amount': 0.0, 'successful_count': 0, 'failed_count': 0}
+    for row in rows:
+        count = int(row['tx_count'] or 0)
+        stats['total_transactions'] += count
+        if row['status'] == 'SUCCESS':
+            stats['successful_count'] += count
+            stats['total_amount'] += float(row['amount_total'] or 0)
+        elif row['status'] == 'FAILED':
+            stats['failed_count'] += count
+    stats['total_amount'] = round(stats['total_amount'], 2)
+    return stats
+
+
+def user_trends(session, user_id, days=30):
+    """Daily count / successful amount / success rate for the last `days` days"""
+    watermark = folded_until(session) or datetime(1970, 1, 1)
+    first_day = (datetime.utcnow() - timedelta(days=days - 1)).date()
+
+    series = {}
+
+    def add(day, status, count, amount):
+        point = series.setdefault(day.isoformat(), {'count': 0, 'amount': 0.0, 'successful': 0})
+        point['count'] += int(count)
+        if status == 'SUCCESS':
+            point['successful'] += int(count)
+            point['amount'] += float(amount)
+
+    for row in session.execute(text(f"""
+        SELECT bucket, status, SUM(tx_count) AS tx_count, SUM(amount_total) AS amount_total
+        FROM {DAILY} WHERE user_id = :user_id AND bucket >= :first_day AND bucket < :today
+        GROUP BY bucket, status
+    """), {'user_id': user_id, 'first_day': first_day, 'today': watermark.date()}).mappings():
+        add(row['bucket'], row['status'], row['tx_count'], row['amount_total'])
+
+    for row in session.execute(text(f"""
+        SELECT status, SUM(tx_count) AS tx_count, SUM(amount_total) AS amount_total
+        FROM {HOURLY} WHERE user_id = :user_id AND bucket >= :today AND bucket < :watermark
+        GROUP BY status
+    """), {'user_id': user_id, 'today': watermark.replace(hour=0), 'watermark': watermark}).mappings():
+        add(watermark.date(), row['status'], row['tx_count'], row['amount_total'])
+
+    for row in session.execute(text("""
+        SELECT DATE(created_at) AS day, status, COUNT(*) AS tx_count, COALESCE(SUM(amount), 0) AS amount_total
+        FROM transactions WHERE user_id = :user_id AND created_at >= :since
+        GROUP BY DATE(created_at), status
+    """), {'user_id': user_id, 'since': watermark}).mappings():
+        add(row['day'], row['status'], row['tx_count'], row['amount_total'])
+
+    trends = []
+    for offset in range(days):
+        day = (first_day + timedelta(days=offset)).isoformat()
+        point = series.get(day, {'count': 0, 'amount': 0.0, 'successful': 0})
+        trends.append({
+            'date': day,
+            'count': point['count'],
+            'amount': round(point['amount'], 2),
+            'success_rate': round(point['successful'] / point['count'] * 100, 2) if point['count'] else 0.0,
+        })
+    return trends
+
+
+def raw_stats(session, user_id):
+    """The original full-scan answer, used to check the rollups"""
+    row = session.execute(text("""
+        SELECT COUNT(*) AS total,
+               COALESCE(SUM(CASE WHEN status = 'SUCCESS' THEN amount END), 0) AS amount,
+               SUM(status = 'SUCCESS') AS successful,
+               SUM(status = 'FAILED') AS failed
+        FROM transactions WHERE user_id = :user_id
+    """), {'user_id': user_id}).mappings().first()
+    return {
+        'total_transactions': int(row['total'] or 0),
+        'total_amount': round(float(row['amount'] or 0), 2),
+        'successful_count': int(row['successful'] or 0),
+        'failed_count': int(row['failed'] or 0),
+    }
+
+
+def create_tables():
+    rollups_hourly.create(db.engine, checkfirst=True)
+    rollups_daily.create(db.engine, checkfirst=True)
+    rollup_watermark.create(db.engine, checkfirst=True)
+
+
+def run(session):
+    """Fold every FOLD_INTERVAL seconds; a failed run is retried on the next tick"""
+    create_tables()
+    print(f"✓ Rollup folder started (every {FOLD_INTERVAL:.0f}s, lag {FOLD_LAG})")
+    while True:
+        try:
+            folded = fold(session)
+        except Exception as e:
+            session.rollback()
+            print(f"   ✗ Fold failed: {e}")
+        else:
+            if folded:
+                print(f"   Folded {folded[0]} .. {folded[1]}")
+        time.sleep(FOLD_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transaction analytics rollups')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help='Create rollup tables')
+    subparsers.add_parser('fold', help='Fold closed hours into the rollups')
+    subparsers.add_parser('run', help='Create tables, then fold every ROLLUP_FOLD_INTERVAL seconds')
+    repair = subparsers.add_parser('repair', help='Rebuild rollups from raw transactions')
+    repair.add_argument('--days', type=int, default=None, help='Only rebuild the last N days')
+    stats = subparsers.add_parser('stats', help='Show rollup answer next to the raw answer')
+    stats.add_argument('--user-id', type=int, required=True)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        session = db.session
+        if args.command == 'create':
+            create_tables()
+            print("✓ Rollup tables ready")
+        elif args.command == 'run':
+            run(session)
+        elif args.command == 'fold':
+            folded = fold(session)
+            print(f"✓ Folded {folded[0]} .. {folded[1]}" if folded else "✓ Rollups are current")
+        elif args.command == 'repair':
+            end = hour_start(datetime.utcnow() - FOLD_LAG)
+            if args.days:
+                start = end.replace(hour=0) - timedelta(days=args.days)
+            else:
+                oldest = session.execute(text("SELECT MIN(created_at) FROM transactions")).scalar()
+                start = hour_start(oldest) if oldest else end
+            # One day per DB transaction keeps lock time short
+            cursor = start
+            while cursor < end:
+                step = min(cursor.replace(hour=0) + timedelta(days=1), end)
+                fold_range(session, cursor, step)
+                set_folded_until(session, step)
+                session.commit()
+                cursor = step
+            print(f"✓ Rebuilt rollups {start} .. {end}")
+        else:
+            print(json.dumps({
+                'rollup': user_stats(session, args.user_id),
+                'raw': raw_stats(session, args.user_id),
+            }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
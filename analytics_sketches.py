@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Approximate Analytics Sketches for Admin Dashboards
+Mergeable per-hour sketches in Redis, queried in time independent of row count
+
+Per hour bucket (UTC, key suffix YYYYMMDDHH):
+- HyperLogLog (Redis PFADD) of distinct cards, ip_address, user_id
+  Standard error 1.04 / sqrt(16384) = 0.81%
+  Cards are counted by the keyed fingerprint of the full PAN
+  (velocity.fingerprint): masked numbers only keep the BIN and last four
+  digits, so different cards collide and distinct cards were undercounted
+- DDSketch of amount and fraud_score, stored as a Redis hash of bucket -> count
+  Every quantile is within ALPHA (1%) relative error of the true value
+
+Merging a window of hours:
+- PFCOUNT over all hourly HLL keys (Redis merges server side)
+- Hash bucket counts are summed, then the quantile is read off the merged buckets
+Cost depends on the number of hours in the window, never on transactions.
+
+Recording goes through the outbox: enqueue_payment_events(..., card_number=)
+queues a `sketch.record` event holding the fingerprint (never the PAN), and
+the dispatcher records it in one pipelined round trip. Directly:
+    from analytics_sketches import record_transaction
+    record_transaction(transaction, card_number)
+
+Admin endpoint:
+    from analytics_sketches import platform_summary
+    platform_summary(hours=24)
+    -> {'distinct_cards': {'estimate': ..., 'relative_error': 0.0081}, ...}
+
+CLI:
+    python analytics_sketches.py summary --hours 168
+    python analytics_sketches.py backfill --hours 720     # Rebuild from raw rows
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+PREFIX = 'sketch:v1'
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOG_GAMMA = math.log(GAMMA)
+HLL_ERROR = 1.04 / math.sqrt(16384)
+RETENTION = timedelta(days=400)
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+
+DISTINCT_FIELDS = {
+    'cards': 'encrypted_card_token',    # decrypted PAN -> fingerprint
+    'ips': 'ip_address',
+    'users': 'user_id',
+}
+QUANTILE_FIELDS = ['amount', 'fraud_score']
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            socket_timeout=0.5,
+            decode_responses=True,
+        )
+    return _client
+
+
+def hour_suffix(moment):
+    return moment.strftime('%Y%m%d%H')
+
+
+def bucket_index(value):
+    """DDSketch bucket for a value; values <= 0 share the 'z' bucket"""
+    if value <= 0:
+        return 'z'
+    return str(math.ceil(math.log(value) / LOG_GAMMA))
+
+
+def bucket_value(index):
+    """Representative value of a bucket, within ALPHA of everything mapped to it"""
+    if index == 'z':
+        return 0.0
+    return 2 * GAMMA ** int(index) / (GAMMA + 1)
+
+
+def quantiles_from_buckets(buckets, quantiles=QUANTILES):
+    """Read quantiles off merged {bucket: count}"""
+    total = sum(buckets.values())
+    if not total:
+        return {f"p{int(q * 100)}": None for q in quantiles}
+
+    ordered = sorted(buckets.items(), key=lambda item: -math.inf if item[0] == 'z' else int(item[0]))
+    result = {}
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen > rank:
+                result[f"p{int(q * 100)}"] = round(bucket_value(index), 4)
+                break
+    return result
+
+
+def record_values(pipe, moment, card=None, ip=None, user_id=None, amount=None, fraud_score=None):
+    suffix = hour_suffix(moment)
+    expire_at = int((moment + RETENTION).timestamp())
+    for name, value in (('cards', card), ('ips', ip), ('users', user_id)):
+        if value is not None:
+            key = f"{PREFIX}:hll:{name}:{suffix}"
+            pipe.pfadd(key, value)
+            pipe.expireat(key, expire_at)
+    for name, value in (('amount', amount), ('fraud_score', fraud_score)):
+        if value is not None:
+            key = f"{PREFIX}:dd:{name}:{suffix}"
+            pipe.hincrby(key, bucket_index(float(value)), 1)
+            pipe.expireat(key, expire_at)
+
+
+def card_fingerprint(card_number):
+    from velocity import fingerprint
+
+    return fingerprint(card_number) if card_number else None
+
+
+def sketch_values(transaction, card_number=None):
+    """What one transaction adds to the sketches; safe to store (no PAN)"""
+    return {
+        'card': card_fingerprint(card_number),
+        'ip': transaction.ip_address,
+        'user_id': transaction.user_id,
+        'amount': transaction.amount,
+        'fraud_score': transaction.fraud_score,
+    }
+
+
+def record(moment, values, client=None):
+    """Add sketch_values() for one transaction to its hour's sketches"""
+    client = client or get_redis()
+    try:
+        pipe = client.pipeline(transaction=False)
+        record_values(pipe, moment, **values)
+        pipe.execute()
+    except redis.RedisError:
+        # Sketches are approximate already, a dropped update is within tolerance
+        pass
+
+
+def record_transaction(transaction, card_number=None, client=None):
+    """Add one committed transaction to its hour's sketches"""
+    record(transaction.created_at or datetime.utcnow(), sketch_values(transaction, card_number), client)
+
+
+def hour_suffixes(hours, now=None):
+    now = now or datetime.utcnow()
+    return [hour_suffix(now - timedelta(hours=h)) for h in range(hours)]
+
+
+def platform_summary(hours=24, client=None):
+    """Merged distinct counts and quantiles for the last `hours` hours, with error bounds"""
+    client = client or get_redis()
+    suffixes = hour_suffixes(hours)
+
+    pipe = client.pipeline(transaction=False)
+    for name in DISTINCT_FIELDS:
+        pipe.pfcount(*[f"{PREFIX}:hll:{name}:{s}" for s in suffixes])
+    for name in QUANTILE_FIELDS:
+        for s in suffixes:
+            pipe.hgetall(f"{PREFIX}:dd:{name}:{s}")
+    results = pipe.execute()
+
+    summary = {'window_hours': hours}
+    for name, count in zip(DISTINCT_FIELDS, results[:len(DISTINCT_FIELDS)]):
+        summary[f"distinct_{name}"] = {'estimate': count, 'relative_error': round(HLL_ERROR, 4)}
+
+    offset = len(DISTINCT_FIELDS)
+    for name in QUANTILE_FIELDS:
+        merged = {}
+        for hourly in results[offset:offset + len(suffixes)]:
+            for index, count in hourly.items():
+                merged[index] = merged.get(index, 0) + int(count)
+        offset += len(suffixes)
+        summary[name] = {
+            'count': sum(merged.values()),
+            'quantiles': quantiles_from_buckets(merged),
+            'relative_error': ALPHA,
+        }
+    return summary
+
+
+def backfill(hours):
+    """Rebuild the last `hours` hours of sketches from raw transactions"""
+    from sqlalchemy import text
+    from app import create_app, db
+    from app.utils.encryption import AESCipher
+
+    client = get_redis()
+    suffixes = hour_suffixes(hours)
+    for s in suffixes:
+        client.delete(*[f"{PREFIX}:hll:{n}:{s}" for n in DISTINCT_FIELDS],
+                      *[f"{PREFIX}:dd:{n}:{s}" for n in QUANTILE_FIELDS])
+
+    app = create_app()
+    with app.app_context():
+        cipher = AESCipher()
+        since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+        with db.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text("""
+                SELECT created_at, encrypted_card_token, ip_address, user_id, amount, fraud_score
+                FROM transactions WHERE created_at >= :since
+            """), {'since': since})
+
+            total = 0
+            while True:
+                rows = result.fetchmany(5000)
+                if not rows:
+                    break
+                pipe = client.pipeline(transaction=False)
+                for row in rows:
+                    # Tokens are "<PAN>|<expiry>"
+                    card = cipher.decrypt(row[1]).split('|')[0] if row[1] else None
+                    record_values(pipe, row[0], card=card_fingerprint(card), ip=row[2], user_id=row[3],
+                                  amount=row[4], fraud_score=row[5])
+                pipe.execute()
+                total += len(rows)
+    print(f"✓ Backfilled sketches from {total:,} transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Approximate admin analytics sketches')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary = subparsers.add_parser('summary', help='Print merged sketch answers')
+    summary.add_argument('--hours', type=int, default=24)
+    fill = subparsers.add_parser('backfill', help='Rebuild sketches from raw rows')
+    fill.add_argument('--hours', type=int, default=24 * 30)
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        print(json.dumps(platform_summary(args.hours), indent=2))
+    else:
+        backfill(args.hours)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
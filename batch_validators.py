@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Vectorized Batch Validators
+Card numbers, CVVs, expiry dates and amounts for thousands of rows at once
+
+Batch charges, CSV imports and migrations used to call the validators row by
+row. These take whole columns and do the work with NumPy array operations:
+
+    from batch_validators import validate_card_numbers, validate_expiry_dates, validate_amounts
+
+    ok, codes = validate_card_numbers(df['card_number'].to_numpy())
+    ok, codes = validate_expiry_dates(expiry_column)
+    ok, codes, cents = validate_amounts(amount_column)      # int64 cents, exact
+
+`ok` is a boolean mask, `codes` an int8 array indexing CODES (0 = valid,
+otherwise the same error code the single-payment schema reports, e.g.
+CODES[codes[i]] == 'luhn'); error_names(codes) maps a whole column.
+
+How it works:
+- the column becomes one fixed-width UTF-32 array, viewed as a
+  (rows x width) uint32 matrix of code points: digit tests, lengths and the
+  '/' of MM/YY are comparisons on that matrix
+- Luhn: digit matrix, right-aligned position parity, doubled-digit lookup
+  table, one row sum and `% 10`
+- expiry: month/year from fixed positions, one vectorized comparison against
+  the current year*12+month
+- amounts: plain decimal strings ("1234.50", ".5", "10.") are turned into
+  exact int64 cents with positional powers of ten; anything else (signs,
+  exponents, NaN, very long or non-ASCII text) goes through the scalar check
+
+Results are identical to the scalar field checks in payment_schema.py
+(Digits / Expiry / Money), which is what test_batch_validators.py fuzzes.
+Empty or None values get 'required'.
+
+CLI:
+    python batch_validators.py bench --rows 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from payment_schema import ERROR_CODES, PAYMENT_SCHEMA
+
+CODES = ('',) + tuple(ERROR_CODES)
+CODE = {name: n for n, name in enumerate(CODES)}
+
+# Longer values are left to the scalar check instead of widening the matrix
+MAX_WIDTH = 32
+MAX_INTEGER_DIGITS = 15
+
+DOUBLED = np.array([0, 2, 4, 6, 8, 1, 3, 5, 7, 9], dtype=np.int8)
+POWERS = 10 ** np.arange(MAX_INTEGER_DIGITS + 1, dtype=np.int64)
+ZERO, NINE, SLASH, DOT = ord('0'), ord('9'), ord('/'), ord('.')
+
+
+def error_names(codes):
+    return np.array(CODES, dtype=object)[codes]
+
+
+def as_text(values):
+    """Any column (list, object or numeric array) -> (stripped unicode array, missing mask)"""
+    values = np.asarray(values)
+    if values.dtype.kind != 'U':
+        values = np.array(['' if v is None else v if isinstance(v, str) else str(v)
+                           for v in values.tolist()], dtype=str)
+    # Like the schema: only None / '' count as missing, blank text is a format error
+    return np.char.strip(values), np.char.str_len(values) == 0
+
+
+def code_points(text):
+    """(rows x width) uint8 matrix of characters, zero padded; non-ASCII becomes DEL"""
+    width = max(int(text.dtype.itemsize // 4), 1)
+    text = np.ascontiguousarray(text.astype(f'U{width}'))
+    points = text.view(np.uint32).reshape(len(text), width)
+    return np.where(points < 128, points, 127).astype(np.uint8)
+
+
+def scalar_fallback(text, rows, check, codes):
+    """Run the scalar field check for the given rows; returns their clean values"""
+    values = {}
+    for i in np.flatnonzero(rows):
+        value, code = check(str(text[i]))
+        codes[i] = CODE[code] if code else 0
+        values[i] = value
+    return values
+
+
+def split_long(text, missing, codes):
+    lengths = np.char.str_len(text).astype(np.int16)
+    codes[missing] = CODE['required']
+    long_rows = lengths > MAX_WIDTH
+    short = np.where(long_rows, '', text).astype(f'U{MAX_WIDTH}') if long_rows.any() else text
+    return short, lengths, long_rows
+
+
+def validate_digits(values, field, strip_chars=''):
+    text, missing = as_text(values)
+    codes = np.zeros(len(text), dtype=np.int8)
+    short, lengths, long_rows = split_long(text, missing, codes)
+    cp = code_points(short)
+    positions = np.arange(cp.shape[1], dtype=np.int16)
+    inside = positions[None, :] < lengths[:, None]
+
+    is_digit = (cp >= ZERO) & (cp <= NINE)
+    allowed = is_digit
+    for ch in strip_chars:
+        allowed = allowed | (cp == ord(ch))
+    # Separators are skipped, so the length is the number of digits
+    digit_count = is_digit.sum(axis=1, dtype=np.int16)
+    well_formed = (allowed | ~inside).all(axis=1) & (digit_count > 0)
+
+    pending = (codes == 0) & ~long_rows
+    codes[pending & ~well_formed] = CODE['format']
+    pending &= well_formed
+    bad_length = pending & ((digit_count < field.min_length) | (digit_count > field.max_length))
+    codes[bad_length] = CODE['length']
+    pending &= ~bad_length
+
+    if field.luhn:
+        digits = np.where(is_digit, cp - ZERO, 0).astype(np.int8)
+        # Every second digit from the right is doubled (minus 9 when over 9)
+        from_right = digit_count[:, None] - np.cumsum(is_digit, axis=1, dtype=np.int16)
+        doubled = is_digit & ((from_right & 1) == 1)
+        weighted = digits + doubled * (digits - 9 * (digits >= 5))
+        checksum = weighted.sum(axis=1, dtype=np.int32) % 10
+        codes[pending & (checksum != 0)] = CODE['luhn']
+
+    scalar_fallback(text, long_rows & (codes == 0), field.check, codes)
+    return codes == 0, codes
+
+
+def validate_card_numbers(values):
+    """13-19 digits (spaces and dashes ignored) with a valid Luhn check digit"""
+    return validate_digits(values, PAYMENT_SCHEMA['card_number'], strip_chars=' -')
+
+
+def validate_cvvs(values):
+    return validate_digits(values, PAYMENT_SCHEMA['cvv'])
+
+
+def validate_expiry_dates(values, today=None):
+    """MM/YY or MM/YYYY, not before the current month"""
+    today = today or date.today()
+    text, missing = as_text(values)
+    codes = np.zeros(len(text), dtype=np.int8)
+    short, lengths, long_rows = split_long(text, missing, codes)
+    cp = code_points(short)
+    if cp.shape[1] < 7:
+        cp = np.pad(cp, ((0, 0), (0, 7 - cp.shape[1])))
+
+    positions = np.arange(cp.shape[1], dtype=np.int16)
+    is_digit = (cp >= ZERO) & (cp <= NINE)
+    digits = np.where(is_digit, cp.astype(np.int64) - ZERO, 0)
+    year_cols = (positions[None, :] >= 3) & (positions[None, :] < lengths[:, None])
+    well_formed = (((lengths == 5) | (lengths == 7)) & is_digit[:, 0] & is_digit[:, 1]
+                   & (cp[:, 2] == SLASH) & (is_digit | ~year_cols).all(axis=1))
+
+    pending = (codes == 0) & ~long_rows
+    codes[pending & ~well_formed] = CODE['format']
+    pending &= well_formed
+
+    month = digits[:, 0] * 10 + digits[:, 1]
+    short_year = digits[:, 3] * 10 + digits[:, 4]
+    long_year = short_year * 100 + digits[:, 5] * 10 + digits[:, 6]
+    year = np.where(lengths == 7, long_year, short_year)
+    year = np.where(year < 100, year + 2000, year)
+
+    bad_month = pending & ((month < 1) | (month > 12))
+    codes[bad_month] = CODE['month']
+    pending &= ~bad_month
+    codes[pending & (year * 12 + month < today.year * 12 + today.month)] = CODE['expired']
+
+    # Long rows are never MM/YY(YY): the scalar check reports them as format errors
+    scalar_fallback(text, long_rows & (codes == 0), PAYMENT_SCHEMA['expiry_date'].check, codes)
+    return codes == 0, codes
+
+
+def validate_amounts(values):
+    """Positive amounts with at most 2 significant decimals; returns (ok, codes, int64 cents)"""
+    field = PAYMENT_SCHEMA['amount']
+    text, missing = as_text(values)
+    codes = np.zeros(len(text), dtype=np.int8)
+    short, lengths, long_rows = split_long(text, missing, codes)
+    cp = code_points(short)
+
+    positions = np.arange(cp.shape[1], dtype=np.int16)
+    inside = positions[None, :] < lengths[:, None]
+    is_digit = (cp >= ZERO) & (cp <= NINE) & inside
+    is_dot = (cp == DOT) & inside
+    dots = is_dot.sum(axis=1)
+    dot_at = np.where(dots == 1, is_dot.argmax(axis=1), lengths)
+    integer_cols = is_digit & (positions[None, :] < dot_at[:, None])
+    fast = ((codes == 0) & ~long_rows & (dots <= 1) & ((is_digit | is_dot) == inside).all(axis=1)
+            & (is_digit.sum(axis=1) >= 1) & (integer_cols.sum(axis=1) <= MAX_INTEGER_DIGITS))
+
+    digits = np.where(is_digit, cp - ZERO, 0).astype(np.int8)
+    exponent = np.clip(dot_at[:, None] - 1 - positions[None, :], 0, MAX_INTEGER_DIGITS)
+    integer = (digits * np.where(integer_cols, POWERS[exponent], 0)).sum(axis=1)
+    decimal_place = positions[None, :] - dot_at[:, None]
+    tenths = np.where(is_digit & (decimal_place == 1), digits, 0).sum(axis=1)
+    hundredths = np.where(is_digit & (decimal_place == 2), digits, 0).sum(axis=1)
+    beyond = (is_digit & (decimal_place >= 3) & (digits != 0)).any(axis=1)
+    value = integer * 100 + tenths * 10 + hundredths
+
+    max_cents = int(field.maximum * 100)
+    min_cents = int(field.minimum * 100)
+    pending = fast.copy()
+    not_positive = pending & (value == 0) & ~beyond
+    codes[not_positive] = CODE['not_positive']
+    pending &= ~not_positive
+    too_large = pending & ((value > max_cents) | ((value == max_cents) & beyond))
+    codes[too_large] = CODE['too_large']
+    pending &= ~too_large
+    codes[pending & beyond] = CODE['precision']
+    pending &= ~beyond
+    codes[pending & (value < min_cents)] = CODE['too_small']
+    cents = np.where(fast & (codes == 0), value, 0)
+
+    slow = (codes == 0) & ~fast
+    for i, amount in scalar_fallback(text, slow, field.check, codes).items():
+        if amount is not None:
+            cents[i] = int(amount * 100)
+    return codes == 0, codes, cents
+
+
+def sample_columns(rows, seed=7, today=None):
+    """Mostly valid card numbers, expiry dates and amounts with a share of typical mistakes"""
+    import random
+
+    rng = random.Random(seed)
+    today = today or date.today()
+
+    def card():
+        body = [rng.choice('3456')] + [str(rng.randrange(10)) for _ in range(rng.choice((14, 15, 18)))]
+        total = sum(int(d) if i % 2 else int(DOUBLED[int(d)]) for i, d in enumerate(reversed(body)))
+        number = ''.join(body) + str(-total % 10)
+        roll = rng.random()
+        if roll < 0.05:
+            number = number[:-1] + str((int(number[-1]) + 1) % 10)
+        elif roll < 0.08:
+            number = number[:rng.randrange(8, 13)]
+        elif roll < 0.10:
+            number = number[:6] + 'x' + number[7:]
+        elif roll < 0.20:
+            number = ' '.join(number[i:i + 4] for i in range(0, len(number), 4))
+        return number
+
+    def expiry():
+        year = today.year + rng.randrange(-2, 8)
+        month = rng.randrange(0 if rng.random() < 0.03 else 1, 14 if rng.random() < 0.03 else 13)
+        return f"{month:02d}/{year % 100:02d}" if rng.random() < 0.9 else f"{month:02d}/{year}"
+
+    def amount():
+        roll = rng.random()
+        if roll < 0.05:
+            return rng.choice(('0', '-5', 'abc', '', '1e3', '0.001', '10.500', '9999999'))
+        return f"{rng.randrange(1, 500000) / 100:.2f}"
+
+    return {
+        'card_number': [card() for _ in range(rows)],
+        'expiry_date': [expiry() for _ in range(rows)],
+        'amount': [amount() for _ in range(rows)],
+    }
+
+
+def bench(rows):
+    """Vectorized columns vs the scalar field checks, row by row"""
+    columns = sample_columns(rows)
+    checks = (
+        ('card_number', validate_card_numbers),
+        ('expiry_date', validate_expiry_dates),
+        ('amount', validate_amounts),
+    )
+    for name, vectorized in checks:
+        check = PAYMENT_SCHEMA[name].check
+        started = time.perf_counter()
+        for value in columns[name]:
+            if value:
+                check(value)
+        scalar = time.perf_counter() - started
+        started = time.perf_counter()
+        vectorized(columns[name])
+        fast = time.perf_counter() - started
+        print(f"   {name:<12} {rows:,} rows: scalar {scalar * 1e3:7.1f} ms, "
+              f"vectorized {fast * 1e3:6.1f} ms ({scalar / fast:.1f}x)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized batch validators')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help='Vectorized vs row-by-row timing')
+    bench_parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+    return bench(args.rows)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+BIN Range Index
+Card brand, issuer, country and type from the first digits of the card number
+
+The BIN table is a CSV (BIN_SOURCE, default bins.csv):
+
+    start,end,brand,issuer,country,card_type
+    4,4,VISA,,,
+    2221,2720,MASTERCARD,,,
+    45717360,45717360,VISA,Example Bank,DK,DEBIT
+
+start/end are BIN prefixes of 1-8 digits, padded to 8 digits (start with 0s,
+end with 9s). Where ranges overlap the narrowest one wins, so an issuer-level
+list can be appended to the brand-level rows shipped in bins.csv.
+
+bins.csv only identifies the card brand. Issuer, country and card type need a
+licensed issuer-level BIN list (from the acquirer or a BIN data vendor); point
+BIN_SOURCE at it, or append it to bins.csv. `build` warns when the source has
+no issuer-level rows.
+
+`build` compiles it into one flat binary file (BIN_INDEX_PATH):
+
+    header   '<4sII'  magic, range count, offset of the metadata table
+    starts   uint32[count]   sorted, non-overlapping 8-digit range starts
+    ends     uint32[count]
+    meta     uint16[count]   row in the metadata table
+    metadata JSON list of [brand, issuer, country, card_type] (deduplicated)
+
+Workers mmap the file read-only, so every process shares one copy in the page
+cache. A lookup is a bisect over the mmapped starts array: a few microseconds,
+no parsing, no per-worker load.
+
+If BIN_INDEX_PATH does not exist, the first lookup in a process compiles it
+from BIN_SOURCE, so a missing build step costs one build, not every lookup.
+
+Reload without a restart: `reload` builds into a temp file next to the index
+and os.replace()s it in (atomic on POSIX). Workers notice the new inode within
+RELOAD_CHECK_SECONDS and map the new file; lookups already running finish on
+the old mapping, which stays valid until it is dropped.
+
+In PaymentService.process_payment (after validation):
+    from bin_index import enrich
+    for field, value in enrich(card_number).items():
+        setattr(transaction, field, value)     # card_brand, card_issuer, card_country, card_type
+
+    python bin_index.py add-columns           # adds those columns to transactions
+
+CLI:
+    python bin_index.py build                 # bins.csv -> bin_index.bin
+    python bin_index.py reload --source new_bins.csv
+    python bin_index.py lookup 4111111111111111
+    python bin_index.py bench
+"""
+
+import argparse
+import bisect
+import csv
+import heapq
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BIN_SOURCE = os.environ.get('BIN_SOURCE', 'bins.csv')
+BIN_INDEX_PATH = os.environ.get('BIN_INDEX_PATH', 'bin_index.bin')
+RELOAD_CHECK_SECONDS = 2.0
+
+MAGIC = b'BIN1'
+HEADER = struct.Struct('<4sII')
+BIN_DIGITS = 8
+FIELDS = ('card_brand', 'card_issuer', 'card_country', 'card_type')
+EMPTY = dict.fromkeys(FIELDS)
+
+_current = None
+_checked_at = 0.0
+_build_tried = False
+_lock = threading.Lock()
+
+
+def read_ranges(source):
+    """CSV rows -> [(start, end, (brand, issuer, country, card_type))]"""
+    ranges = []
+    with open(source, newline='') as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            start = (row.get('start') or '').strip()
+            end = (row.get('end') or '').strip() or start
+            if not (start.isdigit() and end.isdigit() and len(start) <= BIN_DIGITS and len(end) <= BIN_DIGITS):
+                raise ValueError(f"{source}:{line}: start/end must be 1-{BIN_DIGITS} digit BIN prefixes")
+            low, high = int(start.ljust(BIN_DIGITS, '0')), int(end.ljust(BIN_DIGITS, '9'))
+            if low > high:
+                raise ValueError(f"{source}:{line}: start {start} is after end {end}")
+            meta = tuple((row.get(name) or '').strip() or None for name in ('brand', 'issuer', 'country', 'card_type'))
+            ranges.append((low, high, meta))
+    return ranges
+
+
+def flatten(ranges):
+    """Overlapping ranges -> sorted disjoint intervals, the narrowest range winning"""
+    ranges = sorted(ranges, key=lambda r: r[0])
+    bounds = sorted({r[0] for r in ranges} | {r[1] + 1 for r in ranges})
+    intervals, active, i = [], [], 0
+    for low, next_low in zip(bounds, bounds[1:]):
+        while i < len(ranges) and ranges[i][0] <= low:
+            start, end, meta = ranges[i]
+            heapq.heappush(active, (end - start, i, end, meta))
+            i += 1
+        # Ranges that ended before this segment are dropped lazily once on top
+        while active and active[0][2] < low:
+            heapq.heappop(active)
+        if not active:
+            continue
+        meta = active[0][3]
+        high = next_low - 1
+        if intervals and intervals[-1][2] == meta and intervals[-1][1] == low - 1:
+            intervals[-1] = (intervals[-1][0], high, meta)
+        else:
+            intervals.append((low, high, meta))
+    return intervals
+
+
+def write_index(intervals, path):
+    """Write the binary index to a temp file and atomically replace path"""
+    metas = sorted({meta for _, _, meta in intervals}, key=lambda m: tuple(v or '' for v in m))
+    if len(metas) > 0xFFFF:
+        raise ValueError("more than 65535 distinct BIN metadata rows")
+    meta_row = {meta: n for n, meta in enumerate(metas)}
+    count = len(intervals)
+
+    body = struct.pack(f'<{count}I', *(low for low, _, _ in intervals))
+    body += struct.pack(f'<{count}I', *(high for _, high, _ in intervals))
+    body += struct.pack(f'<{count}H', *(meta_row[meta] for _, _, meta in intervals))
+    body += b'\0' * (-len(body) % 4)
+    table = json.dumps([list(meta) for meta in metas], separators=(',', ':')).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.bin_index.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(HEADER.pack(MAGIC, count, HEADER.size + len(body)))
+            handle.write(body)
+            handle.write(table)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return count, len(metas)
+
+
+def build(source=BIN_SOURCE, path=BIN_INDEX_PATH):
+    ranges = read_ranges(source)
+    if not any(any(meta[1:]) for _, _, meta in ranges):
+        print(f"   ⚠ {source} has brand rows only: card_issuer, card_country and card_type will be NULL "
+              f"(set BIN_SOURCE to an issuer-level BIN list)")
+    return write_index(flatten(ranges), path)
+
+
+class BinIndex:
+    """One read-only mapping of a compiled index file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            stat = os.fstat(handle.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, meta_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a BIN index")
+        view = memoryview(self.map)
+        offset = HEADER.size
+        self.starts = view[offset:offset + 4 * self.count].cast('I')
+        offset += 4 * self.count
+        self.ends = view[offset:offset + 4 * self.count].cast('I')
+        offset += 4 * self.count
+        self.rows = view[offset:offset + 2 * self.count].cast('H')
+        self.meta = [dict(zip(FIELDS, row)) for row in json.loads(bytes(view[meta_offset:]))]
+
+    def lookup(self, card_number):
+        digits = ''.join(ch for ch in str(card_number) if ch.isdigit())[:BIN_DIGITS]
+        if not digits:
+            return None
+        key = int(digits.ljust(BIN_DIGITS, '0'))
+        i = bisect.bisect_right(self.starts, key) - 1
+        if i < 0 or key > self.ends[i]:
+            return None
+        return self.meta[self.rows[i]]
+
+
+def get_bin_index(path=None):
+    """The current mapping; swaps in a replaced file at most every RELOAD_CHECK_SECONDS"""
+    global _current, _checked_at, _build_tried
+    path = path or BIN_INDEX_PATH
+    now = time.monotonic()
+    if _current is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _current
+    with _lock:
+        _checked_at = now
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if _current is not None or _build_tried:
+                return _current
+            # Never built (e.g. image without the build step): compile it once
+            _build_tried = True
+            try:
+                build(BIN_SOURCE, path)
+                stat = os.stat(path)
+            except (OSError, ValueError) as e:
+                print(f"   ⚠ No BIN index at {path} and building it from {BIN_SOURCE} failed: {e}")
+                return None
+        if _current is None or _current.identity != (stat.st_ino, stat.st_mtime_ns):
+            _current = BinIndex(path)
+    return _current
+
+
+def enrich(card_number, path=None):
+    """{card_brand, card_issuer, card_country, card_type}; all None when unknown"""
+    index = get_bin_index(path)
+    found = index.lookup(card_number) if index is not None else None
+    return dict(found) if found else dict(EMPTY)
+
+
+def add_columns(conn):
+    """Add the enrichment columns to transactions (idempotent)"""
+    from sqlalchemy import text
+
+    existing = set(conn.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'"
+    )).scalars())
+    for name, ddl in (('card_brand', 'VARCHAR(20)'), ('card_issuer', 'VARCHAR(120)'),
+                      ('card_country', 'CHAR(2)'), ('card_type', 'VARCHAR(20)')):
+        if name in existing:
+            print(f"   ✓ {name} exists")
+            continue
+        print(f"   Adding column {name}")
+        conn.execute(text(f"ALTER TABLE transactions ADD COLUMN {name} {ddl} NULL"))
+    conn.commit()
+
+
+def bench(lookups, path=None):
+    index = get_bin_index(path)
+    if index is None:
+        print(f"✗ No index at {path or BIN_INDEX_PATH}; run `python bin_index.py build` first")
+        return 1
+    rng = random.Random(1)
+    cards = [f"{rng.randrange(10 ** 15, 10 ** 16)}" for _ in range(lookups)]
+    started = time.perf_counter()
+    hits = sum(index.lookup(card) is not None for card in cards)
+    elapsed = time.perf_counter() - started
+    print(f"   {lookups:,} lookups over {index.count:,} ranges: {elapsed / lookups * 1e6:.2f} µs each, "
+          f"{hits:,} matched")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BIN range index')
+    parser.add_argument('--index', default=BIN_INDEX_PATH, help='Compiled index file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, text in (('build', 'Compile the BIN CSV'), ('reload', 'Rebuild and swap in atomically')):
+        sub = subparsers.add_parser(name, help=text)
+        sub.add_argument('--source', default=BIN_SOURCE)
+    lookup = subparsers.add_parser('lookup', help='Enrichment for a card number or BIN')
+    lookup.add_argument('card')
+    subparsers.add_parser('add-columns', help='Add card_brand/issuer/country/type to transactions')
+    bench_parser = subparsers.add_parser('bench', help='Lookup timing')
+    bench_parser.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.command in ('build', 'reload'):
+        count, metas = build(args.source, args.index)
+        print(f"✓ {args.source} -> {args.index}: {count:,} ranges, {metas:,} distinct rows"
+              + (f" (workers pick it up within {RELOAD_CHECK_SECONDS:.0f}s)" if args.command == 'reload' else ''))
+        return 0
+    if args.command == 'lookup':
+        print(json.dumps(enrich(args.card, args.index), indent=2))
+        return 0
+    if args.command == 'bench':
+        return bench(args.lookups, args.index)
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            add_columns(conn)
+    print("✓ Enrichment columns ready")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Database Connection Pool Monitor & Stress Test
+Sizes the SQLAlchemy pool from the gunicorn worker model and reports pool health
+
+Usage:
+    python db_pool_monitor.py limits              # Recommended pool_size / max_overflow
+    python db_pool_monitor.py stats               # Live pool snapshot (JSON)
+    python db_pool_monitor.py stress --max 64     # Find where checkout waits start
+
+Pool limits are derived from:
+- GUNICORN_WORKER_CLASS: sync (one request per worker) or eventlet (green threads)
+- GUNICORN_WORKERS / GUNICORN_WORKER_CONNECTIONS (same values wait-for-db.sh uses)
+- CPU core count (eventlet only ever runs queries from one OS thread, so
+  connections beyond a few per core just queue inside MySQL)
+- MYSQL_MAX_CONNECTIONS: the whole fleet must stay below this budget
+
+The admin metrics endpoint can expose pool state with:
+    from db_pool_monitor import pool_snapshot
+    pool_snapshot(db.engine)
+
+Wait-time histograms are only recorded when the engine is built with
+TimedQueuePool, e.g. SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': TimedQueuePool}.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Checkout wait buckets in milliseconds (upper bounds, last bucket is +Inf)
+WAIT_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Connections kept free for migrations, admin shells and monitoring
+RESERVED_CONNECTIONS = 10
+
+
+def worker_settings():
+    """Read the gunicorn worker model from the environment"""
+    cores = os.cpu_count() or 1
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+    default_workers = 1 if worker_class == 'eventlet' else cores * 2 + 1
+    return {
+        'worker_class': worker_class,
+        'workers': int(os.environ.get('GUNICORN_WORKERS', default_workers)),
+        'worker_connections': int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000)),
+        'cores': cores,
+        'max_connections': int(os.environ.get('MYSQL_MAX_CONNECTIONS', 151)),
+    }
+
+
+def recommended_pool_limits(worker_class, workers, worker_connections, cores, max_connections):
+    """
+    Compute per-worker pool_size and max_overflow
+
+    sync workers handle one request at a time, so one connection plus one
+    spare for nested sessions is enough. eventlet workers multiplex up to
+    worker_connections green threads; they are capped at 4 connections per
+    core because more only adds contention inside MySQL.
+    Returns dict with pool_size, max_overflow and the fleet-wide peak.
+    """
+    budget = max(max_connections - RESERVED_CONNECTIONS, workers)
+    per_worker_budget = max(budget // max(workers, 1), 1)
+
+    if worker_class == 'sync':
+        wanted = 2
+    else:
+        wanted = min(worker_connections, 4 * cores)
+
+    peak = min(wanted, per_worker_budget)
+    pool_size = max(peak * 2 // 3, 1)
+    max_overflow = peak - pool_size
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'per_worker_peak': peak,
+        'fleet_peak': peak * workers,
+        'max_connections': max_connections,
+    }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self._wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._wait_total_ms = 0.0
+        self._wait_count = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self._record_wait((time.perf_counter() - start) * 1000)
+
+    def _record_wait(self, elapsed_ms):
+        index = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = i
+                break
+        with self._wait_lock:
+            self._wait_counts[index] += 1
+            self._wait_total_ms += elapsed_ms
+            self._wait_count += 1
+
+    def wait_histogram(self):
+        """Return cumulative checkout wait buckets (Prometheus style)"""
+        with self._wait_lock:
+            counts = list(self._wait_counts)
+            total_ms = self._wait_total_ms
+            count = self._wait_count
+
+        buckets = {}
+        running = 0
+        for bound, bucket_count in zip(WAIT_BUCKETS_MS + ['+Inf'], counts):
+            running += bucket_count
+            buckets[str(bound)] = running
+        return {'buckets_ms': buckets, 'count': count, 'sum_ms': round(total_ms, 3)}
+
+
+def pool_snapshot(engine):
+    """Return pool size, checked-out connections, overflow and wait histogram"""
+    pool = engine.pool
+    snapshot = {'pool_class': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            'pool_size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        snapshot['checkout_wait'] = pool.wait_histogram()
+
+    return snapshot
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_stress(database_uri, limits, max_concurrency, hold_seconds, rounds):
+    """
+    Ramp concurrency against a TimedQueuePool sized with the recommended limits
+    Each thread checks out a connection, holds it with SELECT SLEEP and returns it.
+    Prints checkout wait percentiles for every concurrency level.
+    """
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(
+        database_uri,
+        poolclass=TimedQueuePool,
+        pool_size=limits['pool_size'],
+        max_overflow=limits['max_overflow'],
+        pool_timeout=30,
+        pool_pre_ping=True,
+    )
+
+    print(f"{'threads':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'checked_out':>12} {'overflow':>9}")
+    print("-" * 64)
+
+    first_wait_level = None
+    level = 1
+    while level <= max_concurrency:
+        waits = []
+        waits_lock = threading.Lock()
+        peak = {'checked_out': 0, 'overflow': 0}
+
+        def worker():
+            for _ in range(rounds):
+                start = time.perf_counter()
+                with engine.connect() as conn:
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    with waits_lock:
+                        waits.append(elapsed_ms)
+                        peak['checked_out'] = max(peak['checked_out'], engine.pool.checkedout())
+                        peak['overflow'] = max(peak['overflow'], engine.pool.overflow())
+                    conn.execute(text('SELECT SLEEP(:s)'), {'s': hold_seconds})
+
+        threads = [threading.Thread(target=worker) for _ in range(level)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        p50 = percentile(waits, 50)
+        p95 = percentile(waits, 95)
+        print(f"{level:>8} {p50:>10.2f} {p95:>10.2f} {max(waits):>10.2f} "
+              f"{peak['checked_out']:>12} {peak['overflow']:>9}")
+
+        # A checkout that waits longer than a tenth of the hold time queued on the pool
+        if first_wait_level is None and p95 > hold_seconds * 100:
+            first_wait_level = level
+
+        level *= 2
+
+    print("-" * 64)
+    peak_connections = limits['pool_size'] + limits['max_overflow']
+    if first_wait_level:
+        print(f"⚠️  Checkout waits start at {first_wait_level} concurrent requests "
+              f"(pool peak {peak_connections} connections)")
+    else:
+        print(f"✅ No checkout waits up to {max_concurrency} concurrent requests")
+
+    print(json.dumps(pool_snapshot(engine), indent=2))
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database connection pool monitor')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('limits', help='Print recommended pool limits')
+    subparsers.add_parser('stats', help='Print live pool snapshot')
+    stress = subparsers.add_parser('stress', help='Ramp concurrency until checkouts wait')
+    stress.add_argument('--max', type=int, default=64, help='Highest concurrency level')
+    stress.add_argument('--hold', type=float, default=0.05, help='Seconds each checkout is held')
+    stress.add_argument('--rounds', type=int, default=20, help='Checkouts per thread')
+    args = parser.parse_args()
+
+    settings = worker_settings()
+    limits = recommended_pool_limits(**settings)
+
+    if args.command == 'limits':
+        print(json.dumps({'workers': settings, 'limits': limits}, indent=2))
+        print(f"\nexport DB_POOL_SIZE={limits['pool_size']}")
+        print(f"export DB_MAX_OVERFLOW={limits['max_overflow']}")
+        return 0
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        if args.command == 'stats':
+            print(json.dumps(pool_snapshot(db.engine), indent=2))
+        else:
+            print("=" * 64)
+            print("  CONNECTION POOL STRESS TEST")
+            print("=" * 64)
+            print(f"Worker model: {settings['worker_class']} x {settings['workers']} "
+                  f"on {settings['cores']} core(s)")
+            print(f"Pool: size={limits['pool_size']} overflow={limits['max_overflow']}\n")
+            run_stress(db.engine.url.render_as_string(hide_password=False),
+                       limits, args.max, args.hold, args.rounds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Streaming Transaction Export
+Constant-memory CSV, NDJSON and Parquet exports with optional on-the-fly gzip
+
+The export never builds the file in memory:
+- Rows are read with a server-side cursor (stream_results) in CHUNK_ROWS chunks
+- Each chunk is written to a small reusable buffer and yielded immediately
+- gzip is a streaming zlib compressor, output is yielded as it is produced
+Memory stays flat no matter how many rows the export has, and the worker
+starts sending bytes as soon as the first chunk is read.
+
+Route usage:
+    from export_stream import csv_export_response
+
+    @payment_bp.route('/export/csv')
+    def export_csv():
+        return csv_export_response(user_id=current_user_id,
+                                   compress=request.args.get('gzip') == '1')
+
+Admin exports pass user_id=None for every user.
+
+Warehouse formats (export_response with fmt='ndjson' or 'parquet'):
+- One JSON object per line, or a Parquet file written one row group at a time
+  (ROW_GROUP_ROWS rows buffered, never the whole export)
+- Parquet stores status and currency as dictionary-encoded columns
+- Incremental loads pass updated_since: rows created or processed in
+  [updated_since, watermark) are exported, and the watermark is returned in the
+  X-Export-Watermark header (and the Parquet metadata) for the next run.
+  The watermark lags now by WATERMARK_LAG_SECONDS so in-flight commits land
+  in the next export instead of being skipped.
+
+    @payment_bp.route('/export/<fmt>')
+    def export(fmt):
+        since = request.args.get('updated_since')
+        return export_response(fmt, user_id=current_user_id,
+                               updated_since=datetime.fromisoformat(since) if since else None)
+
+Incremental filters use ix_tx_created and ix_tx_processed (admin_search.py create-indexes).
+
+CLI:
+    python export_stream.py --user-id 1 --out export.csv
+    python export_stream.py --out all.csv.gz --gzip
+    python export_stream.py --format parquet --out all.parquet
+    python export_stream.py --format ndjson --out delta.ndjson.gz --gzip --updated-since 2026-10-01T00:00:00
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_ROWS = 2000
+ROW_GROUP_ROWS = 50000
+WATERMARK_LAG_SECONDS = 5
+
+EXPORT_COLUMNS = [
+    'id', 'created_at', 'amount', 'currency', 'status', 'masked_card_number',
+    'fraud_score', 'ip_address', 'processed_at', 'external_transaction_id',
+]
+
+HEADER = [
+    'Transaction ID', 'Date', 'Amount', 'Currency', 'Status', 'Card',
+    'Fraud Score', 'IP Address', 'Processed At', 'Bank Reference',
+]
+
+# NDJSON / Parquet carry user_id so admin exports can be joined in the warehouse
+WAREHOUSE_COLUMNS = [
+    'id', 'user_id', 'created_at', 'processed_at', 'amount', 'currency', 'status',
+    'masked_card_number', 'fraud_score', 'ip_address', 'external_transaction_id',
+]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_watermark():
+    """Upper bound for an incremental export, slightly behind now"""
+    return datetime.utcnow().replace(microsecond=0) - timedelta(seconds=WATERMARK_LAG_SECONDS)
+
+
+def iter_transaction_chunks(user_id=None, since=None, chunk_rows=CHUNK_ROWS,
+                            columns=EXPORT_COLUMNS, updated_since=None, until=None):
+    """Yield lists of row tuples from a server-side cursor"""
+    from sqlalchemy import text
+    from app import db
+
+    clauses = []
+    params = {}
+    if user_id is not None:
+        clauses.append('user_id = :user_id')
+        params['user_id'] = user_id
+    if since is not None:
+        clauses.append('created_at >= :since')
+        params['since'] = since
+    if updated_since is not None:
+        # processed_at >= created_at, so this OR is COALESCE(processed_at, created_at) >= :x
+        # written in a form MySQL can answer with an index merge
+        clauses.append('(created_at >= :updated_since OR processed_at >= :updated_since)')
+        params['updated_since'] = updated_since
+    if until is not None:
+        clauses.append('COALESCE(processed_at, created_at) < :until')
+        params['until'] = until
+    where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+    # A dedicated connection, so the request session is not held open
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(
+            text(f"SELECT {', '.join(columns)} FROM transactions {where} ORDER BY id"),
+            params,
+        )
+        while True:
+            rows = result.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+
+
+def format_row(row):
+    values = list(row)
+    # status may arrive as the enum name or an Enum member
+    values[4] = getattr(values[4], 'name', values[4])
+    for index in (1, 8):
+        if isinstance(values[index], datetime):
+            values[index] = values[index].strftime('%Y-%m-%d %H:%M:%S')
+    return values
+
+
+def csv_chunks(row_chunks, compress=False):
+    """Turn row chunks into encoded CSV bytes, gzip'd incrementally if asked"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(HEADER)
+    yield drain()
+
+    for rows in row_chunks:
+        writer.writerows(format_row(row) for row in rows)
+        data = drain()
+        if data:
+            yield data
+
+    if compressor:
+        yield compressor.flush()
+
+
+def _status_name(value):
+    return getattr(value, 'name', value)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Two-decimal amounts round-trip exactly through float's shortest repr
+        return float(value)
+    return value
+
+
+def ndjson_chunks(row_chunks, compress=False):
+    """One JSON object per WAREHOUSE_COLUMNS row, gzip'd incrementally if asked"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    status_index = WAREHOUSE_COLUMNS.index('status')
+
+    for rows in row_chunks:
+        lines = []
+        for row in rows:
+            record = {name: _json_value(value) for name, value in zip(WAREHOUSE_COLUMNS, row)}
+            record['status'] = _status_name(row[status_index])
+            lines.append(json.dumps(record, separators=(',', ':')))
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        data = compressor.compress(data) if compressor else data
+        if data:
+            yield data
+
+    if compressor:
+        yield compressor.flush()
+
+
+class _StreamSink:
+    """Write-only file object that hands Parquet output back to the generator"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_schema(metadata=None):
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('created_at', pa.timestamp('us')),
+        ('processed_at', pa.timestamp('us')),
+        ('amount', pa.decimal128(18, 2)),
+        ('currency', pa.dictionary(pa.int32(), pa.string())),
+        ('status', pa.dictionary(pa.int32(), pa.string())),
+        ('masked_card_number', pa.string()),
+        ('fraud_score', pa.float64()),
+        ('ip_address', pa.string()),
+        ('external_transaction_id', pa.string()),
+    ], metadata=metadata)
+
+
+def _row_group(columns, schema):
+    import pyarrow as pa
+
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == 'amount':
+            values = [v if v is None or isinstance(v, Decimal) else Decimal(str(v)) for v in values]
+        elif field.name == 'status':
+            values = [_status_name(v) for v in values]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def parquet_chunks(row_chunks, metadata=None, row_group_rows=ROW_GROUP_ROWS):
+    """Write WAREHOUSE_COLUMNS rows as Parquet, one row group per ROW_GROUP_ROWS rows"""
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(metadata)
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd',
+                              use_dictionary=['currency', 'status'])
+    columns = [[] for _ in WAREHOUSE_COLUMNS]
+    buffered = 0
+
+    def flush_group():
+        writer.write_table(_row_group(columns, schema), row_group_size=row_group_rows)
+        for values in columns:
+            values.clear()
+        return sink.drain()
+
+    for rows in row_chunks:
+        for row in rows:
+            for values, value in zip(columns, row):
+                values.append(value)
+        buffered += len(rows)
+        if buffered >= row_group_rows:
+            buffered = 0
+            yield flush_group()
+
+    if buffered:
+        yield flush_group()
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(fmt, row_chunks, compress=False, metadata=None):
+    """Encoded bytes for any FORMATS entry"""
+    if fmt == 'csv':
+        return csv_chunks(row_chunks, compress=compress)
+    if fmt == 'ndjson':
+        return ndjson_chunks(row_chunks, compress=compress)
+    if fmt == 'parquet':
+        # Parquet pages are already compressed
+        return parquet_chunks(row_chunks, metadata=metadata)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def export_response(fmt, user_id=None, updated_since=None, compress=False):
+    """Flask streaming response for a csv / ndjson / parquet export"""
+    from flask import Response, jsonify, stream_with_context
+
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'error': f"Format must be one of {', '.join(FORMATS)}"}), 400
+
+    mimetype, extension = FORMATS[fmt]
+    compress = compress and fmt != 'parquet'
+    until = export_watermark() if updated_since is not None or fmt != 'csv' else None
+    columns = EXPORT_COLUMNS if fmt == 'csv' else WAREHOUSE_COLUMNS
+    metadata = {'export_watermark': until.isoformat()} if until else None
+
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    filename = f"transactions_{stamp}.{extension}" + ('.gz' if compress else '')
+    rows = iter_transaction_chunks(user_id=user_id, columns=columns,
+                                   updated_since=updated_since, until=until)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    }
+    if until:
+        headers['X-Export-Watermark'] = until.isoformat()
+
+    return Response(
+        stream_with_context(export_chunks(fmt, rows, compress=compress, metadata=metadata)),
+        mimetype='application/gzip' if compress else mimetype,
+        headers=headers,
+    )
+
+
+def csv_export_response(user_id=None, since=None, compress=False):
+    """Flask streaming response for a CSV (or .csv.gz) export"""
+    from flask import Response, stream_with_context
+
+    stamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    filename = f"transactions_{stamp}.csv" + ('.gz' if compress else '')
+    body = csv_chunks(iter_transaction_chunks(user_id=user_id, since=since), compress=compress)
+
+    return Response(
+        stream_with_context(body),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+            # Stop nginx from buffering the whole stream
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream transactions to CSV, NDJSON or Parquet')
+    parser.add_argument('--user-id', type=int, help='Only this user (default: everyone)')
+    parser.add_argument('--out', required=True, help='Output file')
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help='Compress while writing (csv, ndjson)')
+    parser.add_argument('--updated-since', type=datetime.fromisoformat,
+                        help='Only rows created or processed since this UTC time')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    until = export_watermark() if args.updated_since or args.format != 'csv' else None
+    columns = EXPORT_COLUMNS if args.format == 'csv' else WAREHOUSE_COLUMNS
+    metadata = {'export_watermark': until.isoformat()} if until else None
+
+    app = create_app()
+    with app.app_context():
+        written = 0
+        rows = iter_transaction_chunks(user_id=args.user_id, columns=columns,
+                                       updated_since=args.updated_since, until=until)
+        with open(args.out, 'wb') as handle:
+            for data in export_chunks(args.format, rows, compress=args.gzip, metadata=metadata):
+                handle.write(data)
+                written += len(data)
+    print(f"✓ Wrote {written / 1e6:,.1f} MB to {args.out}")
+    if until:
+        print(f"  Next incremental run: --updated-since {until.isoformat()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+High-Speed Synthetic Data Generator for Scale Testing
+Creates N users and M transactions with realistic distributions
+
+Usage:
+    python generate_scale_data.py --users 10000 --transactions 10000000
+    python generate_scale_data.py --users 500 --transactions 1000000 --mode infile
+
+Distributions (same shape as create_demo_transactions.py):
+- Status: SUCCESS 75%, FAILED 20%, PENDING 4%, FRAUD 1%
+- Dates: uniform over the last 60 days, processed 1-5s after creation
+- Amounts: log-normal around $80, clipped to $1 - $5,000
+- Users: Zipf-like skew, a few merchants own most of the volume
+- Cards: standard test PANs, IPs from private /16 ranges
+
+Speed:
+- Rows are built and AES encrypted in a process pool (one AESCipher per process)
+- --mode insert: multi-row INSERTs of --batch rows per statement
+- --mode infile: rows streamed to a temp TSV and bulk loaded with
+  LOAD DATA LOCAL INFILE (requires local_infile=ON on the MySQL server)
+- unique_checks / foreign_key_checks are disabled on the loading connection only
+
+Generated users have emails scale_<n>@scale.test and share the demo password.
+Remove them with: python generate_scale_data.py --purge
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+EMAIL_DOMAIN = 'scale.test'
+PASSWORD = '123456789Aa1@'
+
+TEST_CARDS = [
+    '4111111111111111',
+    '4012888888881881',
+    '5555555555554444',
+    '5105105105105100',
+    '378282246310005',
+    '6011111111111117',
+]
+
+STATUS_NAMES = ['SUCCESS', 'FAILED', 'PENDING', 'FRAUD']
+STATUS_WEIGHTS = [0.75, 0.20, 0.04, 0.01]
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_1) Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) Mobile/15E148',
+    'Mozilla/5.0 (Linux; Android 14) Chrome/120.0 Mobile',
+]
+
+TRANSACTION_COLUMNS = [
+    'user_id', 'amount', 'currency', 'status', 'masked_card_number',
+    'encrypted_card_token', 'fraud_score', 'ip_address', 'user_agent',
+    'created_at', 'processed_at', 'external_transaction_id',
+]
+
+# Per-process state set up by init_worker
+_cipher = None
+_masked = None
+
+
+def init_worker():
+    """Create one app context and AESCipher per pool process"""
+    global _cipher, _masked
+    from app import create_app
+    from app.utils.encryption import AESCipher, mask_card_number
+
+    app = create_app()
+    app.app_context().push()
+    _cipher = AESCipher()
+    _masked = [mask_card_number(card) for card in TEST_CARDS]
+
+
+def build_chunk(args):
+    """Generate and encrypt one chunk of transaction rows (runs in a pool process)"""
+    seed, size, user_ids, now_ts = args
+    rng = np.random.default_rng(seed)
+
+    # Zipf-like skew so a few users own most of the volume
+    weights = 1.0 / np.arange(1, len(user_ids) + 1) ** 0.8
+    users = rng.choice(user_ids, size=size, p=weights / weights.sum())
+
+    amounts = np.clip(np.round(rng.lognormal(mean=4.4, sigma=0.9, size=size), 2), 1, 5000)
+    statuses = rng.choice(len(STATUS_NAMES), size=size, p=STATUS_WEIGHTS)
+    cards = rng.integers(0, len(TEST_CARDS), size=size)
+    offsets = rng.integers(0, 60 * 24 * 3600, size=size)
+    processing = rng.integers(1, 6, size=size)
+    fraud_scores = np.where(statuses == 3, rng.uniform(0.8, 0.99, size), rng.beta(2, 8, size))
+    ip_c = rng.integers(0, 256, size=size)
+    ip_d = rng.integers(1, 255, size=size)
+    agents = rng.integers(0, len(USER_AGENTS), size=size)
+    bank_ids = rng.integers(100000000, 999999999, size=size)
+
+    rows = []
+    for i in range(size):
+        card_index = int(cards[i])
+        status = STATUS_NAMES[statuses[i]]
+        created_at = datetime.utcfromtimestamp(now_ts - int(offsets[i]))
+        expiry = f"{(card_index % 12) + 1:02d}/{28 + card_index % 4}"
+        rows.append((
+            int(users[i]),
+            float(amounts[i]),
+            'USD',
+            status,
+            _masked[card_index],
+            _cipher.encrypt(f"{TEST_CARDS[card_index]}|{expiry}"),
+            round(float(fraud_scores[i]), 4),
+            f"10.{(int(users[i]) >> 8) % 256}.{ip_c[i]}.{ip_d[i]}",
+            USER_AGENTS[agents[i]],
+            created_at,
+            created_at + timedelta(seconds=int(processing[i])) if status in ('SUCCESS', 'FAILED') else None,
+            f"BANK_{bank_ids[i]}" if status == 'SUCCESS' else None,
+        ))
+    return rows
+
+
+def create_users(db, User, count):
+    """Bulk insert scale test users, return their ids"""
+    template = User(email=f"template@{EMAIL_DOMAIN}", role='customer', is_active=True)
+    template.set_password(PASSWORD)
+    # bcrypt once and reuse the hash, hashing per user would dominate the run
+    columns = {
+        c.name: getattr(template, c.key)
+        for c in User.__table__.columns
+        if c.name != 'id' and getattr(template, c.key) is not None
+    }
+
+    table = User.__table__
+    rows = []
+    for n in range(count):
+        row = dict(columns)
+        row['email'] = f"scale_{n}@{EMAIL_DOMAIN}"
+        row['role'] = 'merchant' if n % 10 == 0 else 'customer'
+        rows.append(row)
+        if len(rows) == 5000:
+            db.session.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+    return [
+        uid for (uid,) in db.session.query(User.id).filter(User.email.like(f"%@{EMAIL_DOMAIN}"))
+    ]
+
+
+def insert_rows(conn, table, rows):
+    """Multi-row INSERT (PyMySQL rewrites executemany into one statement)"""
+    conn.execute(table.insert(), [dict(zip(TRANSACTION_COLUMNS, row)) for row in rows])
+
+
+def load_infile(conn, path):
+    from sqlalchemy import text
+
+    conn.execute(text(
+        f"LOAD DATA LOCAL INFILE :path INTO TABLE transactions "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+        f"({', '.join(TRANSACTION_COLUMNS)})"
+    ), {'path': path})
+
+
+def tsv_value(value):
+    # \N is MySQL's NULL marker for LOAD DATA, generated values never contain tabs
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+
+def write_tsv(handle, rows):
+    handle.writelines('\t'.join(tsv_value(v) for v in row) + '\n' for row in rows)
+
+
+def purge(db, User, Transaction):
+    user_ids = db.session.query(User.id).filter(User.email.like(f"%@{EMAIL_DOMAIN}"))
+    deleted = Transaction.query.filter(Transaction.user_id.in_(user_ids)).delete(synchronize_session=False)
+    users = User.query.filter(User.email.like(f"%@{EMAIL_DOMAIN}")).delete(synchronize_session=False)
+    db.session.commit()
+    print(f"✓ Removed {users} users and {deleted} transactions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic users and transactions')
+    parser.add_argument('--users', type=int, default=1000, help='Users to create')
+    parser.add_argument('--transactions', type=int, default=100000, help='Transactions to create')
+    parser.add_argument('--batch', type=int, default=10000, help='Rows per INSERT / chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Encryption processes')
+    parser.add_argument('--mode', choices=['insert', 'infile'], default='insert')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--purge', action='store_true', help='Delete previously generated data')
+    args = parser.parse_args()
+
+    from app import create_app, db
+    from app.models.user import User
+    from app.models.transaction import Transaction
+
+    app = create_app()
+    with app.app_context():
+        if args.purge:
+            purge(db, User, Transaction)
+            return 0
+
+        print("=" * 70)
+        print(f"GENERATING {args.users:,} USERS / {args.transactions:,} TRANSACTIONS")
+        print("=" * 70)
+
+        started = time.perf_counter()
+        user_ids = create_users(db, User, args.users)
+        print(f"✓ {len(user_ids):,} users in {time.perf_counter() - started:.1f}s")
+
+        now_ts = int(time.time())
+        chunks = []
+        remaining = args.transactions
+        chunk_index = 0
+        while remaining > 0:
+            size = min(args.batch, remaining)
+            chunks.append((args.seed + chunk_index, size, user_ids, now_ts))
+            remaining -= size
+            chunk_index += 1
+
+        table = Transaction.__table__
+        engine = db.engine
+        if args.mode == 'infile':
+            from sqlalchemy import create_engine
+            engine = create_engine(db.engine.url, connect_args={'local_infile': True})
+
+        written = 0
+        started = time.perf_counter()
+        with engine.connect() as conn, Pool(args.workers, initializer=init_worker) as pool:
+            from sqlalchemy import text
+            conn.execute(text("SET unique_checks = 0, foreign_key_checks = 0"))
+
+            tsv = None
+            if args.mode == 'infile':
+                tsv = tempfile.NamedTemporaryFile('w', suffix='.tsv', newline='', delete=False)
+
+            for rows in pool.imap(build_chunk, chunks):
+                if tsv:
+                    write_tsv(tsv, rows)
+                else:
+                    insert_rows(conn, table, rows)
+                    conn.commit()
+                written += len(rows)
+                rate = written / max(time.perf_counter() - started, 1e-6)
+                print(f"\r   {written:,}/{args.transactions:,} rows ({rate:,.0f} rows/s)", end='', flush=True)
+
+            if tsv:
+                tsv.close()
+                print(f"\n   Loading {os.path.getsize(tsv.name) / 1e6:,.0f} MB with LOAD DATA LOCAL INFILE...")
+                load_infile(conn, tsv.name)
+                conn.commit()
+                os.unlink(tsv.name)
+
+            conn.execute(text("SET unique_checks = 1, foreign_key_checks = 1"))
+
+        elapsed = time.perf_counter() - started
+        print(f"\n✓ {written:,} transactions in {elapsed:.1f}s ({written / max(elapsed, 1e-6):,.0f} rows/s)")
+        print("=" * 70)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
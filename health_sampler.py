@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Background-Sampled Health Checks
+Probes dependencies on an interval so health requests never probe inline
+
+- One sampler thread per worker probes MySQL, Redis, SMTP and the ledger
+  every HEALTH_SAMPLE_INTERVAL seconds (a green thread under eventlet)
+- Each probe keeps a ring buffer of (timestamp, ok, latency_ms, error)
+- After every round an immutable snapshot dict is swapped in, so a health
+  request is a single attribute read: O(1), no I/O
+
+Endpoints registered by init_health(app):
+    GET /healthz                 Liveness: the process is serving requests
+    GET /readyz                  Readiness: last MySQL and Redis probes passed
+                                 and the snapshot is fresh (503 otherwise)
+    GET /api/admin/health/sampled  Full snapshot with latency / error history
+                                 (admin JWT required, like the rest of /api/admin)
+
+Wired up in wsgi.py:
+    from health_sampler import init_health
+    init_health(app)
+
+CLI (runs the probes once and prints the snapshot):
+    python health_sampler.py
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_INTERVAL = float(os.environ.get('HEALTH_SAMPLE_INTERVAL', 5))
+HISTORY_SIZE = int(os.environ.get('HEALTH_HISTORY_SIZE', 120))
+PROBE_TIMEOUT = 2.0
+# Readiness fails if the sampler itself has stalled
+STALE_AFTER = SAMPLE_INTERVAL * 3
+CRITICAL = ('mysql', 'redis')
+
+
+class HealthSampler:
+    """Runs probes in the background and publishes a snapshot after each round"""
+
+    def __init__(self, app, interval=SAMPLE_INTERVAL, history_size=HISTORY_SIZE):
+        self.app = app
+        self.interval = interval
+        self.probes = {}
+        self.history = {}
+        self.history_size = history_size
+        self.snapshot = {'status': 'starting', 'sampled_at': None, 'checks': {}}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_probe(self, name, fn):
+        """fn() raises on failure; its return value is ignored"""
+        self.probes[name] = fn
+        self.history[name] = deque(maxlen=self.history_size)
+
+    def sample_once(self):
+        checks = {}
+        for name, probe in self.probes.items():
+            started = time.perf_counter()
+            error = None
+            try:
+                with self.app.app_context():
+                    probe()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:200]
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            self.history[name].append((time.time(), error is None, latency_ms, error))
+            checks[name] = self._summarize(name)
+
+        healthy = all(check['ok'] for check in checks.values())
+        critical_ok = all(checks[name]['ok'] for name in CRITICAL if name in checks)
+        # Swap in a new dict, readers never see a half-built snapshot
+        self.snapshot = {
+            'status': 'healthy' if healthy else ('degraded' if critical_ok else 'unhealthy'),
+            'ready': critical_ok,
+            'sampled_at': time.time(),
+            'interval': self.interval,
+            'checks': checks,
+        }
+
+    def _summarize(self, name):
+        history = self.history[name]
+        latencies = sorted(entry[2] for entry in history)
+        failures = [entry for entry in history if not entry[1]]
+        last = history[-1]
+        return {
+            'ok': last[1],
+            'latency_ms': last[2],
+            'error': last[3],
+            'p95_latency_ms': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+            'error_rate': round(len(failures) / len(history), 4),
+            'last_error': failures[-1][3] if failures else None,
+            'last_error_at': failures[-1][0] if failures else None,
+            'samples': len(history),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_ready(self):
+        snapshot = self.snapshot
+        sampled_at = snapshot.get('sampled_at')
+        return bool(snapshot.get('ready')) and sampled_at is not None \
+            and time.time() - sampled_at < STALE_AFTER
+
+
+def probe_mysql():
+    from sqlalchemy import text
+    from app import db
+
+    with db.engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+
+
+def probe_redis():
+    import redis
+
+    client = redis.Redis(
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=int(os.environ.get('REDIS_PORT', 6379)),
+        socket_timeout=PROBE_TIMEOUT,
+        socket_connect_timeout=PROBE_TIMEOUT,
+    )
+    try:
+        client.ping()
+    finally:
+        client.close()
+
+
+def probe_smtp():
+    host = os.environ.get('MAIL_SERVER')
+    if not host:
+        return
+    port = int(os.environ.get('MAIL_PORT', 587))
+    with socket.create_connection((host, port), timeout=PROBE_TIMEOUT):
+        pass
+
+
+def probe_ledger():
+    # Only the ledger service writes the ledger; it refreshes this key every second
+    import redis
+    from ledger_service import HEARTBEAT_KEY
+
+    client = redis.Redis(
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=int(os.environ.get('REDIS_PORT', 6379)),
+        socket_timeout=PROBE_TIMEOUT,
+        socket_connect_timeout=PROBE_TIMEOUT,
+    )
+    try:
+        if not client.exists(HEARTBEAT_KEY):
+            raise RuntimeError("ledger service heartbeat missing")
+    finally:
+        client.close()
+
+
+def build_sampler(app):
+    sampler = HealthSampler(app)
+    sampler.add_probe('mysql', probe_mysql)
+    sampler.add_probe('redis', probe_redis)
+    sampler.add_probe('smtp', probe_smtp)
+    sampler.add_probe('ledger', probe_ledger)
+    return sampler
+
+
+def admin_only(view):
+    """401 without a valid bearer token, 403 unless its role is admin"""
+    from functools import wraps
+
+    from flask import jsonify, request
+
+    from app.utils.jwt_service import verify_token
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        payload = verify_token(header[7:]) if header.startswith('Bearer ') else None
+        if not payload:
+            return jsonify({'success': False, 'error': 'Authentication required'}), 401
+        if payload.get('role') != 'admin':
+            return jsonify({'success': False, 'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_health(app):
+    """Start the sampler and register liveness / readiness / snapshot endpoints"""
+    from flask import Blueprint, jsonify
+
+    sampler = build_sampler(app)
+    app.extensions['health_sampler'] = sampler
+    health_bp = Blueprint('health_sampled', __name__)
+
+    @health_bp.route('/healthz')
+    def liveness():
+        return jsonify({'status': 'alive'}), 200
+
+    @health_bp.route('/readyz')
+    def readiness():
+        ready = sampler.is_ready()
+        return jsonify({'ready': ready, 'status': sampler.snapshot['status']}), 200 if ready else 503
+
+    @health_bp.route('/api/admin/health/sampled')
+    @admin_only
+    def sampled_health():
+        snapshot = sampler.snapshot
+        return jsonify({'success': True, 'health': snapshot}), 200 if snapshot.get('ready') else 503
+
+    app.register_blueprint(health_bp)
+    sampler.start()
+    return sampler
+
+
+def main():
+    from app import create_app
+
+    app = create_app()
+    sampler = build_sampler(app)
+    sampler.sample_once()
+    print(json.dumps(sampler.snapshot, indent=2))
+    return 0 if sampler.snapshot['ready'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
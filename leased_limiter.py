@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Two-Tier Rate Limiting
+Per-process leased token buckets in front of one shared bucket in Redis
+
+Flask-Limiter with Redis storage costs a round trip on every limited request;
+with memory storage every gunicorn worker enforces the limit on its own, so
+4 workers allow 4x the payment limit. Here the limit lives in ONE Redis token
+bucket per (scope, key), and each worker leases tokens from it:
+
+    request --> local lease has a token?  --yes--> allowed, no network
+                    | no
+                    v
+                LEASE_SCRIPT (one atomic Lua call): refill the shared bucket,
+                take back this worker's expired unused tokens, hand out a new
+                lease of 1..MAX lease tokens (or the time until the next token)
+
+- Lease size starts at RATELIMIT_LEASE_MIN (default 2) and doubles while a
+  key keeps using up its lease in time, up to RATELIMIT_LEASE_SHARE of the
+  limit but never below RATELIMIT_LEASE_MIN. Without that floor a
+  "10 per minute" limit (share 0.1) would lease 1 token: every admitted
+  request would still cost a Redis call and only refusals would be local.
+- A lease is kept for RATELIMIT_LEASE_TTL or one refill interval
+  (period / limit: 6s for "10 per minute"), whichever is longer, capped at
+  LEASE_TTL_MAX. Low limits see requests seconds apart, so a 1s lease
+  would expire before its second token is used.
+- A refused key remembers when the shared bucket gets its next token and is
+  refused locally until then, so a brute-force loop costs no Redis traffic.
+- Unused tokens go back to Redis when a lease expires: in the next Lua call
+  for that key, or in the sweep piggybacked on any other Redis call.
+
+Tolerance (what "accurate" means here):
+- Never over-admits: every allowed request spent a token taken from the shared
+  bucket, so at most `limit` requests per period get through across all
+  workers, exactly as a single Redis bucket would
+- May under-admit: tokens leased to other workers are unavailable until
+  their lease expires (+ the sweep interval); at most (workers - 1) x max
+  lease requests are refused early. This is the price of the lease floor:
+  with the defaults a "5 per minute" login key hitting two workers can see
+  one request refused up to 12s early, while a key whose requests land on
+  one worker makes one Redis call per 2 admitted requests instead of every
+  one. Set RATELIMIT_LEASE_MIN=1 for exact admission on small limits.
+- A worker that dies loses its leased tokens; they return with the refill
+
+Limits are token buckets: "10 per minute" allows a burst of 10, then one
+every 6 seconds, instead of Flask-Limiter's fixed minute windows.
+If Redis is unreachable, requests are allowed (like RATELIMIT_SWALLOW_ERRORS).
+
+Routes (replaces @limiter.limit on the hot endpoints; Flask-Limiter keeps the
+default limits, with RATELIMIT_STORAGE_URI pointing at Redis):
+    from leased_limiter import leased_limit, remote_ip
+
+    @payment_bp.route('/process', methods=['POST'])
+    @leased_limit('10 per minute', scope='payment')
+    def process_payment(): ...
+
+    @auth_bp.route('/login', methods=['POST'])
+    @leased_limit('5 per minute', scope='login', key_func=remote_ip)
+    def login(): ...
+
+remote_ip() is request.remote_addr and never reads X-Forwarded-For itself, so
+a client cannot pick its own bucket. Behind a load balancer, wsgi.py wraps the
+app in werkzeug's ProxyFix with TRUSTED_PROXY_HOPS (the number of proxies in
+front of gunicorn), which takes the client address from exactly that hop.
+
+CLI:
+    python leased_limiter.py status payment user:42 --limit "10 per minute"
+    python leased_limiter.py bench --workers 4 --requests 20000 --limit "1000 per second"
+"""
+
+import argparse
+import math
+import os
+import re
+import sys
+import threading
+import time
+from functools import wraps
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+LEASE_SHARE = float(os.environ.get('RATELIMIT_LEASE_SHARE', 0.1))
+LEASE_TTL = float(os.environ.get('RATELIMIT_LEASE_TTL', 1.0))
+LEASE_MIN = int(os.environ.get('RATELIMIT_LEASE_MIN', 2))
+LEASE_TTL_MAX = 15.0
+SWEEP_INTERVAL = 1.0
+KEY_PREFIX = 'rl'
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# KEYS[1] = bucket hash; ARGV = capacity, refill per second, tokens wanted, tokens given back
+# Returns {granted, seconds until the next token (as a string)}
+LEASE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local back = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + back)
+
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+
+local wait = 0
+if granted == 0 and want > 0 then
+    wait = (1 - tokens) / rate
+end
+return {granted, tostring(wait)}
+"""
+
+_limiter = None
+
+
+def parse_limit(limit):
+    """'10 per minute', '10/minute' or '100 per 10 seconds' -> (count, period seconds)"""
+    match = re.fullmatch(r'\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*', limit.lower())
+    if not match:
+        raise ValueError(f"unrecognised rate limit: {limit!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def bucket_key(scope, key):
+    return f"{KEY_PREFIX}:{scope}:{key}"
+
+
+class Lease:
+    __slots__ = ('tokens', 'expires', 'size', 'denied_until', 'capacity', 'rate')
+
+    def __init__(self, capacity, rate):
+        self.tokens = 0
+        self.expires = 0.0
+        self.size = 1
+        self.denied_until = 0.0
+        self.capacity = capacity
+        self.rate = rate
+
+
+class LeasedLimiter:
+    """Local token leases per process, one shared token bucket per key in Redis"""
+
+    def __init__(self, client, lease_share=LEASE_SHARE, lease_ttl=LEASE_TTL, lease_min=LEASE_MIN):
+        self.client = client
+        self.lease_share = lease_share
+        self.lease_ttl = lease_ttl
+        self.lease_min = lease_min
+        self.leases = {}
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+        self.script = client.register_script(LEASE_SCRIPT)
+        self.redis_calls = 0
+
+    def min_lease(self, capacity):
+        return max(1, min(self.lease_min, capacity))
+
+    def max_lease(self, capacity):
+        return max(self.min_lease(capacity), int(capacity * self.lease_share))
+
+    def ttl(self, lease):
+        """How long leased tokens are kept: at least one refill interval"""
+        if self.lease_ttl <= 0:
+            return 0.0
+        return min(max(self.lease_ttl, 1 / lease.rate), LEASE_TTL_MAX)
+
+    def hit(self, scope, key, capacity, period):
+        """Spend one token; returns (allowed, seconds to wait when refused)"""
+        name = bucket_key(scope, key)
+        now = time.monotonic()
+        with self.lock:
+            lease = self.leases.get(name)
+            if lease is None:
+                lease = self.leases[name] = Lease(capacity, capacity / period)
+            if lease.denied_until > now:
+                return False, lease.denied_until - now
+            if lease.tokens > 0 and lease.expires > now:
+                lease.tokens -= 1
+                return True, 0.0
+
+            # Used up while still fresh: this key is hot, lease more next time
+            if lease.expires > now:
+                lease.size = min(lease.size * 2, self.max_lease(capacity))
+            else:
+                lease.size = self.min_lease(capacity)
+            give_back, lease.tokens = lease.tokens, 0
+            want = lease.size
+            sweep = self.collect_expired(now, exclude=name)
+
+        try:
+            granted, wait = self.lease(name, lease, want, give_back, sweep)
+        except redis.RedisError:
+            return True, 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            if granted == 0:
+                lease.denied_until = now + wait
+                return False, wait
+            lease.tokens += granted - 1
+            lease.expires = now + self.ttl(lease)
+            return True, 0.0
+
+    def lease(self, name, lease, want, give_back, sweep):
+        """One round trip: this key's lease plus any expired leases being returned"""
+        self.redis_calls += 1
+        if not sweep:
+            granted, wait = self.script(keys=[name], args=[lease.capacity, lease.rate, want, give_back])
+            return int(granted), float(wait)
+        pipe = self.client.pipeline(transaction=False)
+        self.script(keys=[name], args=[lease.capacity, lease.rate, want, give_back], client=pipe)
+        for other, expired in sweep:
+            self.script(keys=[other], args=[expired.capacity, expired.rate, 0, expired.tokens], client=pipe)
+        granted, wait = pipe.execute()[0]
+        return int(granted), float(wait)
+
+    def collect_expired(self, now, exclude):
+        """Expired leases whose unused tokens go back to Redis; forget idle keys"""
+        if now - self.last_sweep < SWEEP_INTERVAL:
+            return []
+        self.last_sweep = now
+        returned = []
+        for name, lease in list(self.leases.items()):
+            if name == exclude or lease.expires > now or lease.denied_until > now:
+                continue
+            if lease.tokens > 0:
+                returned.append((name, lease))
+            del self.leases[name]
+        return returned
+
+    def release(self):
+        """Return every unused leased token (worker shutdown)"""
+        with self.lock:
+            returned = [(name, lease) for name, lease in self.leases.items() if lease.tokens > 0]
+            self.leases = {}
+        if returned:
+            pipe = self.client.pipeline(transaction=False)
+            for name, lease in returned:
+                self.script(keys=[name], args=[lease.capacity, lease.rate, 0, lease.tokens], client=pipe)
+            pipe.execute()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = LeasedLimiter(redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            decode_responses=True,
+            socket_timeout=0.5,
+        ))
+    return _limiter
+
+
+def remote_ip():
+    from flask import request
+
+    # ProxyFix (TRUSTED_PROXY_HOPS) has already resolved trusted forwarding headers
+    return f"ip:{request.remote_addr}"
+
+
+def user_or_ip():
+    """The JWT user when the request carries one, else the client IP"""
+    from realtime import token_user_id
+
+    user_id = token_user_id()
+    return f"user:{user_id}" if user_id is not None else remote_ip()
+
+
+def leased_limit(limit, scope=None, key_func=user_or_ip):
+    """Route decorator: 429 with Retry-After once the shared bucket is empty"""
+    capacity, period = parse_limit(limit)
+
+    def decorator(fn):
+        name = scope or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify
+
+            allowed, wait = get_limiter().hit(name, key_func(), capacity, period)
+            if not allowed:
+                retry_after = max(1, math.ceil(wait))
+                response = jsonify({'error': f'Rate limit exceeded ({limit})', 'retry_after': retry_after})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def bench_worker(args):
+    scope, requests, capacity, period, leased = args
+    limiter = get_limiter()
+    if not leased:
+        limiter.lease_share = 0
+        limiter.lease_ttl = 0
+        limiter.lease_min = 1
+    allowed = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        allowed += limiter.hit(scope, 'bench', capacity, period)[0]
+    elapsed = time.perf_counter() - started
+    limiter.release()
+    return allowed, limiter.redis_calls, elapsed
+
+
+def bench(workers, requests, limit):
+    """Hammer one key from several processes: admitted vs the bucket's bound, and Redis calls"""
+    from multiprocessing import Pool
+
+    capacity, period = parse_limit(limit)
+    client = get_limiter().client
+    for leased in (False, True):
+        scope = f"bench-{os.getpid()}-{int(leased)}"
+        started = time.perf_counter()
+        with Pool(processes=workers) as pool:
+            results = pool.map(bench_worker, [(scope, requests, capacity, period, leased)] * workers)
+        elapsed = time.perf_counter() - started
+        client.delete(bucket_key(scope, 'bench'))
+
+        admitted = sum(r[0] for r in results)
+        calls = sum(r[1] for r in results)
+        total = workers * requests
+        bound = capacity + elapsed * capacity / period
+        per_request = sum(r[2] for r in results) / total * 1e6
+        print(f"   {'leased' if leased else 'no leasing'}:")
+        print(f"      admitted {admitted:,} of {total:,} (bucket allows at most {bound:,.0f} "
+              f"in {elapsed:.2f}s){'' if admitted <= bound else '  <-- OVER THE LIMIT'}")
+        print(f"      Redis calls {calls:,} ({calls / total:.1%} of requests), {per_request:.1f} µs/request")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Two-tier leased rate limiter')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    status = subparsers.add_parser('status', help='Tokens left in a shared bucket')
+    status.add_argument('scope')
+    status.add_argument('key')
+    status.add_argument('--limit', default='10 per minute')
+    bench_parser = subparsers.add_parser('bench', help='Accuracy and Redis calls across processes')
+    bench_parser.add_argument('--workers', type=int, default=4)
+    bench_parser.add_argument('--requests', type=int, default=20000, help='Per worker')
+    bench_parser.add_argument('--limit', default='1000 per second')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        return bench(args.workers, args.requests, args.limit)
+
+    capacity, period = parse_limit(args.limit)
+    limiter = get_limiter()
+    name = bucket_key(args.scope, args.key)
+    # A zero-token lease applies the refill without spending anything
+    limiter.script(keys=[name], args=[capacity, capacity / period, 0, 0])
+    tokens = limiter.client.hget(name, 'tokens')
+    print(f"{name}: {float(tokens):.2f} of {capacity} tokens "
+          f"(refill {capacity / period:.3f}/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
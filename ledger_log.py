@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Segmented Append-Only Ledger
+Replaces the single ledger.json document with an append-only block log
+
+Layout of LEDGER_DIR:
+    00000000.seg, 00000001.seg, ...   segment files, rolled at SEGMENT_BYTES
+    blocks.idx                        12 bytes per block: segment (u32), offset (u64)
+    LOCK                              flock held by the single writer
+
+Each block is one record in the active segment:
+    [payload length u32][crc32 u32][JSON block bytes]
+
+- Append writes one record and one index entry at the end of two files: O(1)
+  no matter how long the ledger is (ledger.json rewrote everything)
+- Block N is read with one pread of the index at N * 12 and one of the
+  segment: O(1) random access
+- Group commit: appends are buffered and made durable by commit(), which
+  fsyncs the segment, then the index. Callers append a batch and commit once
+  (outbox dispatcher: once per batch, before the DB commit)
+- Recovery on open: the index is cut back to its last valid record, then any
+  complete records written after it (crash before the index fsync) are
+  re-indexed and a torn tail is truncated
+
+Blocks are chained: {index, timestamp, data, previous_hash, hash}, with
+hash = sha256 of the canonical JSON of the other fields. Merkle-batched blocks
+(ledger_merkle.py) also carry `entries`, which is left out of the hash: the
+entries are committed through data.merkle_root, so a block header can be
+checked without them.
+
+Usage:
+    from ledger_log import get_ledger
+    ledger = get_ledger()
+    block = ledger.append({'transaction_id': 42, ...})
+    ledger.commit()
+    ledger.read(17)
+
+CLI:
+    python ledger_log.py convert --source ledger.json   # one-time migration
+    python ledger_log.py stats
+    python ledger_log.py show 17
+    python ledger_log.py verify
+    python ledger_log.py bench --blocks 200000
+
+Migrating the compose deployment (ledger_data volume mounted at /app/ledger):
+    docker compose run --rm -v ./ledger.json:/app/ledger.json:ro ledger \
+        python ledger_log.py convert --source /app/ledger.json
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+LEDGER_DIR = os.environ.get('LEDGER_DIR', 'ledger')
+SEGMENT_BYTES = int(os.environ.get('LEDGER_SEGMENT_BYTES', 64 * 1024 * 1024))
+
+RECORD_HEADER = struct.Struct('>II')   # payload length, crc32
+INDEX_ENTRY = struct.Struct('>IQ')     # segment number, byte offset
+GENESIS_HASH = '0' * 64
+UNHASHED_FIELDS = ('hash', 'entries')
+
+_ledger = None
+
+
+def block_hash(block):
+    body = {key: value for key, value in block.items() if key not in UNHASHED_FIELDS}
+    raw = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def encode_record(block):
+    payload = json.dumps(block, separators=(',', ':'), default=str).encode()
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_record(fd, offset):
+    """Return (block, end offset) or None for a missing or torn record"""
+    header = os.pread(fd, RECORD_HEADER.size, offset)
+    if len(header) < RECORD_HEADER.size:
+        return None
+    length, crc = RECORD_HEADER.unpack(header)
+    payload = os.pread(fd, length, offset + RECORD_HEADER.size)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return json.loads(payload), offset + RECORD_HEADER.size + length
+
+
+class LedgerLog:
+    """Single-writer segmented block log with an O(1) offset index"""
+
+    def __init__(self, directory=LEDGER_DIR, segment_bytes=SEGMENT_BYTES, readonly=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.readonly = readonly
+        self._readers = {}
+        self._lock = None
+
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+            self._lock = open(os.path.join(directory, 'LOCK'), 'a')
+            # Raises BlockingIOError if another process is the writer
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        index_path = os.path.join(directory, 'blocks.idx')
+        self._index = open(index_path, 'rb' if readonly else 'a+b')
+        self._segment = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._pending = 0
+        self._recover()
+
+    # -- recovery ---------------------------------------------------------
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{number:08d}.seg")
+
+    def _segment_numbers(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def _entry(self, position):
+        return INDEX_ENTRY.unpack(os.pread(self._index.fileno(), INDEX_ENTRY.size,
+                                           position * INDEX_ENTRY.size))
+
+    def _reader(self, number):
+        fd = self._readers.get(number)
+        if fd is None:
+            fd = os.open(self._segment_path(number), os.O_RDONLY)
+            self._readers[number] = fd
+        return fd
+
+    def _recover(self):
+        index_fd = self._index.fileno()
+        count = os.fstat(index_fd).st_size // INDEX_ENTRY.size
+        last, segment, end = None, 0, 0
+
+        # Walk back over index entries that point at missing or torn records
+        while count:
+            segment, offset = self._entry(count - 1)
+            record = read_record(self._reader(segment), offset) if os.path.exists(
+                self._segment_path(segment)) else None
+            if record:
+                last, end = record
+                break
+            count -= 1
+
+        if self.readonly:
+            self.count = count
+            self.last_hash = last.get('hash', GENESIS_HASH) if last else GENESIS_HASH
+            return
+
+        self._index.truncate(count * INDEX_ENTRY.size)
+        self._index.seek(0, os.SEEK_END)
+
+        # Re-index complete records that were written after the last index fsync
+        for number in [n for n in self._segment_numbers() if n >= segment]:
+            fd = self._reader(number)
+            position = end if number == segment else 0
+            while True:
+                record = read_record(fd, position)
+                if record is None:
+                    break
+                self._index.write(INDEX_ENTRY.pack(number, position))
+                last, position = record
+                count += 1
+            segment, end = number, position
+            os.truncate(self._segment_path(number), position)
+
+        self.count = count
+        self.last_hash = last.get('hash', GENESIS_HASH) if last else GENESIS_HASH
+        self._open_segment(segment)
+        self._sync()
+
+    def _open_segment(self, number):
+        if self._segment:
+            self._segment.close()
+        self._segment = open(self._segment_path(number), 'ab')
+        self._segment_number = number
+        self._segment_size = self._segment.tell()
+
+    # -- writing ----------------------------------------------------------
+
+    def append_block(self, block):
+        """Append a fully formed block as-is (used by the converter)"""
+        record = encode_record(block)
+        if self._segment_size and self._segment_size + len(record) > self.segment_bytes:
+            self._sync()
+            self._open_segment(self._segment_number + 1)
+            self._sync_directory()
+
+        offset = self._segment_size
+        self._segment.write(record)
+        self._index.write(INDEX_ENTRY.pack(self._segment_number, offset))
+        self._segment_size += len(record)
+        self.count += 1
+        self._pending += 1
+        self.last_hash = block.get('hash', self.last_hash)
+        return block
+
+    def append(self, data, entries=None):
+        """Chain data onto the ledger; durable after the next commit()"""
+        block = {
+            'index': self.count,
+            'timestamp': datetime.utcnow().isoformat(),
+            'data': data,
+            'previous_hash': self.last_hash,
+        }
+        block['hash'] = block_hash(block)
+        if entries is not None:
+            block['entries'] = entries
+        return self.append_block(block)
+
+    def commit(self):
+        """Group commit: one fsync for everything appended since the last commit"""
+        if self._pending:
+            self._sync()
+
+    def _sync(self):
+        # Segment before index, so an indexed record is always on disk
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._index.flush()
+        os.fsync(self._index.fileno())
+        self._pending = 0
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # -- reading ----------------------------------------------------------
+
+    def __len__(self):
+        return self.count
+
+    def read(self, position):
+        """Block at position, O(1)"""
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError(f"block {position} out of range (ledger has {self.count})")
+        if self._pending:
+            self._segment.flush()
+            self._index.flush()
+        segment, offset = self._entry(position)
+        record = read_record(self._reader(segment), offset)
+        if record is None:
+            raise IOError(f"block {position} is corrupt ({self._segment_path(segment)} @ {offset})")
+        return record[0]
+
+    def iter_blocks(self, start=0, stop=None):
+        stop = self.count if stop is None else min(stop, self.count)
+        for position in range(start, stop):
+            yield self.read(position)
+
+    def close(self):
+        if self._segment:
+            self.commit()
+            self._segment.close()
+        self._index.close()
+        for fd in self._readers.values():
+            os.close(fd)
+        self._readers = {}
+        if self._lock:
+            self._lock.close()
+
+
+def get_ledger():
+    """Process-wide writer for LEDGER_DIR"""
+    global _ledger
+    if _ledger is None:
+        _ledger = LedgerLog()
+    return _ledger
+
+
+def load_json_ledger(path):
+    with open(path) as handle:
+        data = json.load(handle)
+    if isinstance(data, dict):
+        data = data.get('chain') or data.get('blocks') or []
+    return data
+
+
+def convert(source, directory, batch=1000):
+    """One-time import of ledger.json, blocks kept verbatim (hashes unchanged)"""
+    blocks = load_json_ledger(source)
+    ledger = LedgerLog(directory)
+    if len(ledger):
+        print(f"✗ {directory} already holds {len(ledger)} blocks, refusing to import twice")
+        ledger.close()
+        return 1
+
+    for position, block in enumerate(blocks):
+        if block.get('index', position) != position:
+            print(f"   ⚠ block at position {position} has index {block.get('index')}")
+        ledger.append_block(block)
+        if (position + 1) % batch == 0:
+            ledger.commit()
+    ledger.commit()
+
+    imported = len(ledger)
+    ledger.close()
+    if imported != len(blocks):
+        print(f"✗ Imported {imported} of {len(blocks)} blocks")
+        return 1
+    print(f"✓ Imported {imported} blocks from {source} into {directory}")
+    print(f"  Keep {source} as a backup; the ledger now lives in {directory}")
+    return 0
+
+
+def verify(directory):
+    """Sequential hash-chain check"""
+    ledger = LedgerLog(directory, readonly=True)
+    previous, bad = None, 0
+    for block in ledger.iter_blocks():
+        if block.get('hash') != block_hash(block) or (
+                previous is not None and block.get('previous_hash') != previous.get('hash')):
+            print(f"   ✗ block {block.get('index')} does not verify")
+            bad += 1
+        previous = block
+    print(f"{'✓' if not bad else '✗'} {len(ledger)} blocks checked, {bad} invalid")
+    ledger.close()
+    return 0 if not bad else 1
+
+
+def bench(blocks):
+    """Show that append and random reads stay flat as the ledger grows"""
+    directory = tempfile.mkdtemp(prefix='ledger_bench_')
+    try:
+        ledger = LedgerLog(directory, segment_bytes=8 * 1024 * 1024)
+        step = max(blocks // 5, 1)
+        payload = {'transaction_id': 0, 'amount': '125.00', 'currency': 'USD', 'status': 'SUCCESS'}
+        for start in range(0, blocks, step):
+            started = time.perf_counter()
+            for i in range(start, min(start + step, blocks)):
+                ledger.append(dict(payload, transaction_id=i))
+                if i % 100 == 99:
+                    ledger.commit()
+            ledger.commit()
+            elapsed = time.perf_counter() - started
+            read_started = time.perf_counter()
+            for i in range(0, len(ledger), max(len(ledger) // 1000, 1)):
+                ledger.read(i)
+            reads = min(len(ledger), 1000)
+            print(f"   {len(ledger):>9,} blocks: append {elapsed / step * 1e6:6.1f} µs/block, "
+                  f"read {(time.perf_counter() - read_started) / reads * 1e6:6.1f} µs/block")
+        ledger.close()
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segmented append-only ledger')
+    parser.add_argument('--dir', default=LEDGER_DIR, help='Ledger directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert_parser = subparsers.add_parser('convert', help='Import an existing ledger.json')
+    convert_parser.add_argument('--source', default='ledger.json')
+    subparsers.add_parser('stats', help='Block count and segment sizes')
+    show = subparsers.add_parser('show', help='Print one block')
+    show.add_argument('index', type=int)
+    subparsers.add_parser('verify', help='Check the hash chain')
+    bench_parser = subparsers.add_parser('bench', help='Append/read timing in a temp dir')
+    bench_parser.add_argument('--blocks', type=int, default=200000)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        return convert(args.source, args.dir)
+    if args.command == 'verify':
+        return verify(args.dir)
+    if args.command == 'bench':
+        return bench(args.blocks)
+
+    ledger = LedgerLog(args.dir, readonly=True)
+    if args.command == 'show':
+        print(json.dumps(ledger.read(args.index), indent=2))
+    else:
+        print(f"Blocks: {len(ledger):,}")
+        print(f"Last hash: {ledger.last_hash}")
+        for number in ledger._segment_numbers():
+            size = os.path.getsize(ledger._segment_path(number))
+            print(f"   {number:08d}.seg  {size / 1e6:8.1f} MB")
+    ledger.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Merkle-Batched Ledger Blocks
+Many transactions per ledger block, with O(log n) inclusion proofs
+
+Instead of one ledger block per transaction, transactions are collected and
+sealed into one block when BLOCK_MAX_TX is reached or BLOCK_MAX_WAIT seconds
+have passed since the first pending one (and on every group commit):
+
+    block.data    = {'merkle_root': ..., 'tx_count': n,
+                     'first_transaction_id': ..., 'last_transaction_id': ...}
+    block.entries = [transaction dict, ...]       # not part of the block hash
+
+The Merkle tree follows RFC 6962: leaf = sha256(0x00 || canonical JSON),
+node = sha256(0x01 || left || right), split at the largest power of two.
+The block hash covers the root, so one header plus log2(n) sibling hashes
+prove that a transaction is in the chain.
+
+txmap.idx in LEDGER_DIR maps Transaction.id -> (block, leaf) with one 8-byte
+slot per id (a sparse file), so locating a transaction is one pread. A header
+records how many blocks are mapped; on open, blocks past it are re-mapped.
+Every lookup is checked against the block itself, so a slot left by a crash
+before fsync can never hide or forge a transaction.
+
+Usage:
+    from ledger_merkle import get_merkle_ledger, proof_response
+    get_merkle_ledger().add(transaction.to_dict())     # writer process only
+    body, status = proof_response(transaction_id)       # any process
+
+In deployment the writer process is ledger_service.py; workers submit to it.
+
+Auditors check a proof offline with verify_proof(proof) or:
+    python ledger_merkle.py verify-proof proof.json
+
+CLI:
+    python ledger_merkle.py prove 42 > proof.json
+    python ledger_merkle.py verify-proof proof.json
+    python ledger_merkle.py reindex
+    python ledger_merkle.py bench --transactions 100000
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ledger_log import LEDGER_DIR, LedgerLog, block_hash
+
+BLOCK_MAX_TX = int(os.environ.get('LEDGER_BLOCK_MAX_TX', 500))
+BLOCK_MAX_WAIT = float(os.environ.get('LEDGER_BLOCK_MAX_WAIT', 1.0))
+
+TXMAP_HEADER = struct.Struct('>Q')    # blocks mapped
+TXMAP_SLOT = struct.Struct('>II')     # block index + 1 (0 = empty), leaf index
+
+_merkle = None
+
+
+def canonical(entry):
+    return json.dumps(entry, sort_keys=True, separators=(',', ':'), default=str).encode()
+
+
+def leaf_hash(entry):
+    return hashlib.sha256(b'\x00' + canonical(entry)).hexdigest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def _split(n):
+    k = 1
+    while k * 2 < n:
+        k *= 2
+    return k
+
+
+def merkle_root(hashes):
+    if not hashes:
+        return hashlib.sha256(b'').hexdigest()
+    if len(hashes) == 1:
+        return hashes[0]
+    k = _split(len(hashes))
+    return node_hash(merkle_root(hashes[:k]), merkle_root(hashes[k:]))
+
+
+def audit_path(hashes, position):
+    """Sibling hashes from the leaf up: [{'side': 'left'|'right', 'hash': ...}]"""
+    if len(hashes) <= 1:
+        return []
+    k = _split(len(hashes))
+    if position < k:
+        return audit_path(hashes[:k], position) + [{'side': 'right', 'hash': merkle_root(hashes[k:])}]
+    return audit_path(hashes[k:], position - k) + [{'side': 'left', 'hash': merkle_root(hashes[:k])}]
+
+
+def verify_proof(proof):
+    """Check a proof from proof_response(); returns (ok, reason)"""
+    current = leaf_hash(proof['entry'])
+    for step in proof['path']:
+        if step['side'] == 'left':
+            current = node_hash(step['hash'], current)
+        else:
+            current = node_hash(current, step['hash'])
+
+    header = proof['block']
+    if current != header['data']['merkle_root']:
+        return False, 'Merkle path does not lead to the block root'
+    if block_hash(header) != header['hash']:
+        return False, 'Block header does not match its hash'
+    return True, 'Transaction is included in block %d' % header['index']
+
+
+class TxMap:
+    """Transaction.id -> (block index, leaf index), one fixed slot per id"""
+
+    def __init__(self, directory, readonly=False):
+        path = os.path.join(directory, 'txmap.idx')
+        self.fd = os.open(path, os.O_RDONLY if readonly else os.O_RDWR | os.O_CREAT, 0o644)
+
+    def mapped_blocks(self):
+        data = os.pread(self.fd, TXMAP_HEADER.size, 0)
+        return TXMAP_HEADER.unpack(data)[0] if len(data) == TXMAP_HEADER.size else 0
+
+    def lookup(self, transaction_id):
+        data = os.pread(self.fd, TXMAP_SLOT.size, TXMAP_HEADER.size + transaction_id * TXMAP_SLOT.size)
+        if len(data) < TXMAP_SLOT.size:
+            return None
+        block, leaf = TXMAP_SLOT.unpack(data)
+        return (block - 1, leaf) if block else None
+
+    def record(self, block_index, transaction_ids):
+        for leaf, transaction_id in enumerate(transaction_ids):
+            os.pwrite(self.fd, TXMAP_SLOT.pack(block_index + 1, leaf),
+                      TXMAP_HEADER.size + transaction_id * TXMAP_SLOT.size)
+
+    def commit(self, blocks):
+        # Slots first, then the header that says they cover `blocks`
+        os.fsync(self.fd)
+        os.pwrite(self.fd, TXMAP_HEADER.pack(blocks), 0)
+        os.fsync(self.fd)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def locate(ledger, txmap, transaction_id):
+    """Return (block, leaf index) for a transaction, verified against the block"""
+    slot = txmap.lookup(transaction_id)
+    if slot is None or slot[0] >= len(ledger):
+        return None
+    block = ledger.read(slot[0])
+    entries = block.get('entries') or []
+    if slot[1] >= len(entries) or entries[slot[1]].get('id') != transaction_id:
+        return None
+    return block, slot[1]
+
+
+class MerkleLedger:
+    """Writer side: batches transactions into Merkle blocks on a LedgerLog"""
+
+    def __init__(self, directory=LEDGER_DIR, max_count=BLOCK_MAX_TX, max_wait=BLOCK_MAX_WAIT):
+        self.ledger = LedgerLog(directory)
+        self.txmap = TxMap(directory)
+        self.max_count = max_count
+        self.max_wait = max_wait
+        self.pending = []
+        self.pending_ids = set()
+        self.opened_at = None
+        self.reindexed = self.reindex()
+
+    def reindex(self):
+        """Map every block written after the last txmap commit"""
+        start = self.txmap.mapped_blocks()
+        for position in range(start, len(self.ledger)):
+            entries = self.ledger.read(position).get('entries')
+            if entries:
+                self.txmap.record(position, [entry['id'] for entry in entries])
+        if start != len(self.ledger):
+            self.txmap.commit(len(self.ledger))
+        return len(self.ledger) - start
+
+    def add(self, entry):
+        """Queue a transaction dict (needs 'id'); duplicates are ignored"""
+        transaction_id = int(entry['id'])
+        if transaction_id in self.pending_ids or locate(self.ledger, self.txmap, transaction_id):
+            return False
+        if not self.pending:
+            self.opened_at = time.monotonic()
+        self.pending.append(entry)
+        self.pending_ids.add(transaction_id)
+        if len(self.pending) >= self.max_count:
+            self.seal()
+        return True
+
+    def due(self):
+        return bool(self.pending) and time.monotonic() - self.opened_at >= self.max_wait
+
+    def seal(self):
+        """Write the pending transactions as one block (durable after commit())"""
+        if not self.pending:
+            return None
+        entries, self.pending, self.pending_ids = self.pending, [], set()
+        ids = [int(entry['id']) for entry in entries]
+        block = self.ledger.append({
+            'merkle_root': merkle_root([leaf_hash(entry) for entry in entries]),
+            'tx_count': len(entries),
+            'first_transaction_id': min(ids),
+            'last_transaction_id': max(ids),
+        }, entries=entries)
+        self.txmap.record(block['index'], ids)
+        return block
+
+    def commit(self):
+        self.ledger.commit()
+        self.txmap.commit(len(self.ledger))
+
+    def flush(self):
+        """Seal whatever is pending and make it durable"""
+        if self.seal():
+            self.commit()
+
+    def close(self):
+        self.flush()
+        self.ledger.close()
+        self.txmap.close()
+
+
+def get_merkle_ledger():
+    """Process-wide writer for LEDGER_DIR"""
+    global _merkle
+    if _merkle is None:
+        _merkle = MerkleLedger()
+    return _merkle
+
+
+def build_proof(transaction_id, directory=LEDGER_DIR):
+    """Inclusion proof for one transaction, or None if it is not sealed yet"""
+    if not os.path.exists(os.path.join(directory, 'txmap.idx')):
+        return None
+    ledger = LedgerLog(directory, readonly=True)
+    txmap = TxMap(directory, readonly=True)
+    try:
+        found = locate(ledger, txmap, transaction_id)
+        if found is None:
+            return None
+        block, position = found
+        entries = block.pop('entries')
+        hashes = [leaf_hash(entry) for entry in entries]
+        return {
+            'transaction_id': transaction_id,
+            'entry': entries[position],
+            'leaf_index': position,
+            'path': audit_path(hashes, position),
+            'block': block,
+        }
+    finally:
+        ledger.close()
+        txmap.close()
+
+
+def proof_response(transaction_id):
+    """(json body, http status) for GET /api/ledger/proof/<transaction_id>"""
+    proof = build_proof(int(transaction_id))
+    if proof is None:
+        return {'success': False, 'error': 'Transaction is not in a sealed ledger block yet'}, 404
+    return {'success': True, 'proof': proof}, 200
+
+
+def bench(transactions, block_size):
+    directory = tempfile.mkdtemp(prefix='ledger_merkle_')
+    try:
+        writer = MerkleLedger(directory, max_count=block_size, max_wait=3600)
+        started = time.perf_counter()
+        for transaction_id in range(1, transactions + 1):
+            writer.add({'id': transaction_id, 'user_id': transaction_id % 97, 'amount': '25.00',
+                        'currency': 'USD', 'status': 'SUCCESS'})
+        writer.close()
+        elapsed = time.perf_counter() - started
+        print(f"   {transactions:,} transactions -> {len(writer.ledger):,} blocks "
+              f"in {elapsed:.2f}s ({elapsed / transactions * 1e6:.1f} µs/tx)")
+
+        sample = range(1, transactions + 1, max(transactions // 200, 1))
+        started = time.perf_counter()
+        proofs = [build_proof(transaction_id, directory) for transaction_id in sample]
+        elapsed = time.perf_counter() - started
+        valid = sum(verify_proof(proof)[0] for proof in proofs)
+        print(f"   {len(proofs)} proofs: {elapsed / len(proofs) * 1e3:.2f} ms each, "
+              f"{len(proofs[0]['path'])} hashes per path, {valid}/{len(proofs)} verify")
+        return 0 if valid == len(proofs) else 1
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merkle-batched ledger blocks')
+    parser.add_argument('--dir', default=LEDGER_DIR, help='Ledger directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    prove = subparsers.add_parser('prove', help='Print the inclusion proof for a transaction')
+    prove.add_argument('transaction_id', type=int)
+    check = subparsers.add_parser('verify-proof', help='Verify a saved proof offline')
+    check.add_argument('path')
+    subparsers.add_parser('reindex', help='Map blocks written since the last txmap commit')
+    bench_parser = subparsers.add_parser('bench', help='Batching and proof timing in a temp dir')
+    bench_parser.add_argument('--transactions', type=int, default=100000)
+    bench_parser.add_argument('--block-size', type=int, default=BLOCK_MAX_TX)
+    args = parser.parse_args()
+
+    if args.command == 'prove':
+        proof = build_proof(args.transaction_id, args.dir)
+        if proof is None:
+            print(f"✗ Transaction {args.transaction_id} is not in a sealed block", file=sys.stderr)
+            return 1
+        print(json.dumps(proof, indent=2, default=str))
+        return 0
+    if args.command == 'verify-proof':
+        with open(args.path) as handle:
+            data = json.load(handle)
+        ok, reason = verify_proof(data.get('proof', data))
+        print(f"{'✓' if ok else '✗'} {reason}")
+        return 0 if ok else 1
+    if args.command == 'bench':
+        return bench(args.transactions, args.block_size)
+
+    writer = MerkleLedger(args.dir)
+    writer.close()
+    print(f"✓ txmap up to date ({writer.reindexed} block(s) mapped)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Single-Writer Ledger Service
+The only process that appends to the ledger; everyone else talks to it via Redis
+
+Gunicorn workers and outbox dispatchers never open the ledger for writing.
+They push requests onto a Redis list and wait for an acknowledgement:
+
+    from ledger_service import submit, submit_nowait, wait_for_acks
+
+    ack = submit(transaction.to_dict())           # blocks until durable
+    # ack = {'status': 'committed', 'transaction_id': 42, 'block': 17, 'leaf': 3, ...}
+
+    ids = [submit_nowait(tx) for tx in batch]     # pipeline many, then
+    acks = wait_for_acks(ids)                     # wait once
+
+The service (`python ledger_service.py run`):
+- BLMOVEs requests from <prefix>:requests to <prefix>:processing, then drains
+  up to DRAIN_BATCH more in one pipelined round trip
+- Adds them to a MerkleLedger (ledger_merkle.py); a block is sealed as soon
+  as the request list is empty, so a lone request is never held back waiting
+  for company, and at the latest after BLOCK_MAX_TX transactions or
+  BLOCK_MAX_WAIT seconds while requests keep arriving
+- Group commit: sealed blocks are fsynced once, then every waiting request is
+  acknowledged in one pipeline (LPUSH <prefix>:ack:<request id>)
+- Requests left in <prefix>:processing by a crash are replayed on start;
+  replay is safe because the ledger ignores duplicate transaction ids and
+  acknowledges them with the existing block / leaf
+- Publishes <prefix>:heartbeat (used by the health sampler)
+
+There is exactly one writer: LedgerLog holds an exclusive flock on LOCK, so
+a second service on the same volume refuses to start.
+
+CLI:
+    python ledger_service.py run
+    python ledger_service.py stats
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+from ledger_log import LEDGER_DIR
+from ledger_merkle import BLOCK_MAX_TX, BLOCK_MAX_WAIT, MerkleLedger, locate
+
+PREFIX = os.environ.get('LEDGER_REDIS_PREFIX', 'ledger')
+REQUEST_KEY = f"{PREFIX}:requests"
+PROCESSING_KEY = f"{PREFIX}:processing"
+HEARTBEAT_KEY = f"{PREFIX}:heartbeat"
+ACK_TTL = 300
+ACK_TIMEOUT = float(os.environ.get('LEDGER_ACK_TIMEOUT', 10))
+DRAIN_BATCH = 200
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            decode_responses=True,
+        )
+    return _client
+
+
+def ack_key(request_id):
+    return f"{PREFIX}:ack:{request_id}"
+
+
+# -- client side (gunicorn workers, outbox dispatcher) -----------------------
+
+def submit_nowait(entry, client=None):
+    """Queue one transaction dict for the ledger, return the request id"""
+    request_id = uuid.uuid4().hex
+    (client or get_redis()).lpush(REQUEST_KEY, json.dumps(
+        {'request_id': request_id, 'entry': entry}, default=str))
+    return request_id
+
+
+def wait_for_acks(request_ids, timeout=ACK_TIMEOUT, client=None):
+    """Block until every request is durable; {request_id: ack}"""
+    client = client or get_redis()
+    deadline = time.monotonic() + timeout
+    acks = {}
+    for request_id in request_ids:
+        remaining = deadline - time.monotonic()
+        popped = client.brpop(ack_key(request_id), timeout=max(remaining, 0.01)) if remaining > 0 else None
+        if popped is None:
+            raise TimeoutError(f"ledger did not acknowledge {request_id} within {timeout}s")
+        ack = json.loads(popped[1])
+        if ack['status'] == 'error':
+            raise ValueError(f"ledger rejected {request_id}: {ack['error']}")
+        acks[request_id] = ack
+    return acks
+
+
+def submit(entry, timeout=ACK_TIMEOUT, client=None):
+    """Append one transaction and wait until it is durable"""
+    request_id = submit_nowait(entry, client)
+    return wait_for_acks([request_id], timeout, client)[request_id]
+
+
+# -- service side ------------------------------------------------------------
+
+class LedgerService:
+    """Drains the request list into Merkle blocks with group commit and acks"""
+
+    def __init__(self, client, directory=LEDGER_DIR, max_count=BLOCK_MAX_TX, max_wait=BLOCK_MAX_WAIT):
+        self.client = client
+        self.max_count = max_count
+        # Sealing is driven here so acks can follow each block
+        self.writer = MerkleLedger(directory, max_count=sys.maxsize, max_wait=max_wait)
+        self.waiting = {}       # transaction id -> [request ids] in the open block
+        self.unsynced = False   # blocks sealed since the last commit
+        self.acks = []          # (request id, ack) sent after the next commit
+        self.stopping = False
+
+    def handle(self, raw):
+        try:
+            request = json.loads(raw)
+            request_id = request['request_id']
+        except (ValueError, KeyError, TypeError):
+            return
+        try:
+            entry = request['entry']
+            transaction_id = int(entry['id'])
+        except (KeyError, TypeError, ValueError):
+            self.acks.append((request_id, {'status': 'error', 'error': 'entry needs an integer id'}))
+            return
+
+        if self.writer.add(entry) or transaction_id in self.waiting:
+            self.waiting.setdefault(transaction_id, []).append(request_id)
+            if len(self.writer.pending) >= self.max_count:
+                self.seal()
+            return
+
+        found = locate(self.writer.ledger, self.writer.txmap, transaction_id)
+        block, leaf = found
+        self.acks.append((request_id, self.ack(block, leaf, transaction_id, 'duplicate')))
+
+    def ack(self, block, leaf, transaction_id, status):
+        return {
+            'status': status,
+            'transaction_id': transaction_id,
+            'block': block['index'],
+            'leaf': leaf,
+            'block_hash': block['hash'],
+            'merkle_root': block['data']['merkle_root'],
+        }
+
+    def seal(self):
+        block = self.writer.seal()
+        if block is None:
+            return
+        for leaf, entry in enumerate(block['entries']):
+            transaction_id = int(entry['id'])
+            for request_id in self.waiting.pop(transaction_id, []):
+                self.acks.append((request_id, self.ack(block, leaf, transaction_id, 'committed')))
+        self.unsynced = True
+
+    def commit(self):
+        """fsync sealed blocks, then acknowledge everything that is now durable"""
+        if self.unsynced:
+            self.writer.commit()
+            self.unsynced = False
+        pipe = self.client.pipeline(transaction=False)
+        for request_id, ack in self.acks:
+            pipe.lpush(ack_key(request_id), json.dumps(ack))
+            pipe.expire(ack_key(request_id), ACK_TTL)
+        if not self.writer.pending:
+            # Everything moved to processing is durable and acked
+            pipe.delete(PROCESSING_KEY)
+        pipe.set(HEARTBEAT_KEY, json.dumps({'at': time.time(), 'blocks': len(self.writer.ledger)}), ex=10)
+        pipe.execute()
+        self.acks = []
+
+    def drain(self, timeout):
+        """(requests, whether the request list was emptied)"""
+        first = self.client.blmove(REQUEST_KEY, PROCESSING_KEY, timeout, 'RIGHT', 'LEFT')
+        if first is None:
+            return [], True
+        pipe = self.client.pipeline(transaction=False)
+        for _ in range(DRAIN_BATCH):
+            pipe.lmove(REQUEST_KEY, PROCESSING_KEY, 'RIGHT', 'LEFT')
+        moved = pipe.execute()
+        return [first] + [raw for raw in moved if raw is not None], moved[-1] is None
+
+    def step(self, timeout):
+        requests, emptied = self.drain(timeout)
+        for raw in requests:
+            self.handle(raw)
+        # Nobody else is queued: sealing now costs nothing in batching
+        if emptied or self.writer.due() or self.stopping:
+            self.seal()
+        self.commit()
+
+    def recover(self):
+        """Replay requests a previous run took but did not acknowledge"""
+        leftover = self.client.lrange(PROCESSING_KEY, 0, -1)
+        for raw in reversed(leftover):
+            self.handle(raw)
+        self.seal()
+        self.commit()
+        return len(leftover)
+
+    def run(self):
+        replayed = self.recover()
+        print(f"✓ Ledger service writing to {self.writer.ledger.directory} "
+              f"({len(self.writer.ledger)} blocks, {replayed} replayed request(s))")
+        while not self.stopping:
+            if self.writer.pending:
+                timeout = max(self.writer.max_wait - (time.monotonic() - self.writer.opened_at), 0.001)
+            else:
+                timeout = 1.0
+            self.step(timeout)
+        self.seal()
+        self.commit()
+        self.writer.close()
+        print("✓ Ledger service stopped cleanly")
+
+    def stop(self, *_):
+        self.stopping = True
+
+
+def print_stats(client):
+    heartbeat = client.get(HEARTBEAT_KEY)
+    print(f"Queued requests: {client.llen(REQUEST_KEY)}")
+    print(f"In flight:       {client.llen(PROCESSING_KEY)}")
+    print(f"Heartbeat:       {heartbeat or 'none (service down?)'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single-writer ledger service')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='Serve ledger append requests')
+    subparsers.add_parser('stats', help='Queue depth and heartbeat')
+    args = parser.parse_args()
+
+    client = get_redis()
+    if args.command == 'stats':
+        print_stats(client)
+        return 0
+
+    service = LedgerService(client)
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
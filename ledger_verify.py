@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Parallel, Checkpointed Ledger Verification
+Hash-chain and Merkle-root checks split across a process pool
+
+A verification run:
+1. Splits blocks [start, height) into contiguous ranges, one per worker
+2. Each worker re-hashes its blocks, checks previous_hash links inside its
+   range and recomputes Merkle roots of batched blocks (ledger_merkle.py)
+3. The parent stitches the ranges: the first block of every range must link
+   to the last hash of the range before it (or to the checkpoint)
+4. On success a signed checkpoint {height, hash} is written to
+   LEDGER_DIR/checkpoint.json (HMAC-SHA256, key LEDGER_CHECKPOINT_KEY,
+   falling back to SECRET_KEY)
+
+Routine runs are incremental: they start at the checkpoint height, after
+confirming the checkpoint signature and that the block at height-1 still
+has the checkpointed hash. --full re-verifies from block 0 on every core.
+
+Usage:
+    python ledger_verify.py                  # incremental since last checkpoint
+    python ledger_verify.py --full           # full audit, all cores
+    python ledger_verify.py --workers 4
+    python ledger_verify.py status           # show the current checkpoint
+    python ledger_verify.py bench --blocks 2000
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ledger_log import GENESIS_HASH, LEDGER_DIR, LedgerLog, block_hash
+from ledger_merkle import leaf_hash, merkle_root
+
+MIN_RANGE_BLOCKS = 500
+MAX_ERRORS = 100
+
+
+def checkpoint_key():
+    key = os.environ.get('LEDGER_CHECKPOINT_KEY') or os.environ.get('SECRET_KEY')
+    return key.encode() if key else None
+
+
+def sign(checkpoint, key):
+    body = json.dumps({k: v for k, v in checkpoint.items() if k != 'signature'},
+                      sort_keys=True, separators=(',', ':'))
+    return hmac.new(key, body.encode(), hashlib.sha256).hexdigest()
+
+
+def checkpoint_path(directory):
+    return os.path.join(directory, 'checkpoint.json')
+
+
+def load_checkpoint(directory, key):
+    """Return (checkpoint or None, error or None)"""
+    path = checkpoint_path(directory)
+    if not os.path.exists(path):
+        return None, None
+    with open(path) as handle:
+        checkpoint = json.load(handle)
+    if key is None:
+        return None, 'No LEDGER_CHECKPOINT_KEY / SECRET_KEY to check the checkpoint signature'
+    if not hmac.compare_digest(checkpoint.get('signature', ''), sign(checkpoint, key)):
+        return None, 'Checkpoint signature is invalid'
+    return checkpoint, None
+
+
+def save_checkpoint(directory, key, height, last_hash, mode):
+    checkpoint = {
+        'height': height,
+        'hash': last_hash,
+        'mode': mode,
+        'verified_at': datetime.utcnow().isoformat(),
+    }
+    checkpoint['signature'] = sign(checkpoint, key)
+    path = checkpoint_path(directory)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(checkpoint, handle, indent=2)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    return checkpoint
+
+
+def verify_range(args):
+    """Worker: check blocks [start, stop); return links for stitching plus errors"""
+    directory, start, stop = args
+    ledger = LedgerLog(directory, readonly=True)
+    errors = []
+    first_previous = last_hash = None
+    try:
+        for position in range(start, stop):
+            block = ledger.read(position)
+            if position == start:
+                first_previous = block.get('previous_hash')
+            elif block.get('previous_hash') != last_hash:
+                errors.append((position, 'previous_hash does not match block %d' % (position - 1)))
+            if block.get('hash') != block_hash(block):
+                errors.append((position, 'hash does not match block contents'))
+            entries = block.get('entries')
+            if entries is not None:
+                data = block.get('data') or {}
+                if merkle_root([leaf_hash(entry) for entry in entries]) != data.get('merkle_root'):
+                    errors.append((position, 'Merkle root does not match entries'))
+                if data.get('tx_count') != len(entries):
+                    errors.append((position, 'tx_count does not match entries'))
+            last_hash = block.get('hash')
+            if len(errors) >= MAX_ERRORS:
+                break
+    finally:
+        ledger.close()
+    return start, stop, first_previous, last_hash, errors
+
+
+def split_ranges(start, stop, workers):
+    total = stop - start
+    count = max(1, min(workers, total // MIN_RANGE_BLOCKS or 1))
+    size = -(-total // count)
+    return [(lo, min(lo + size, stop)) for lo in range(start, stop, size)]
+
+
+def verify(directory=LEDGER_DIR, full=False, workers=None, write_checkpoint=True):
+    """Verify the ledger; returns (ok, report dict)"""
+    key = checkpoint_key()
+    ledger = LedgerLog(directory, readonly=True)
+    height = len(ledger)
+
+    start, expected_previous = 0, GENESIS_HASH
+    checkpoint, error = (None, None) if full else load_checkpoint(directory, key)
+    if error:
+        ledger.close()
+        return False, {'error': error + ' (run with --full to re-audit)'}
+    if checkpoint:
+        start = checkpoint['height']
+        if start > height:
+            ledger.close()
+            return False, {'error': f"Ledger has {height} blocks, checkpoint says {start}"}
+        if start and ledger.read(start - 1).get('hash') != checkpoint['hash']:
+            ledger.close()
+            return False, {'error': f"Block {start - 1} no longer matches the checkpoint"}
+        expected_previous = checkpoint['hash']
+    elif height:
+        # The first block's previous_hash anchors the chain (legacy chains may not use zeros)
+        expected_previous = ledger.read(0).get('previous_hash')
+    ledger.close()
+
+    started = time.perf_counter()
+    workers = workers or cpu_count()
+    ranges = split_ranges(start, height, workers) if height > start else []
+    jobs = [(directory, lo, hi) for lo, hi in ranges]
+    if len(jobs) > 1:
+        with Pool(processes=len(jobs)) as pool:
+            results = pool.map(verify_range, jobs)
+    else:
+        results = [verify_range(job) for job in jobs]
+
+    errors = []
+    previous = expected_previous
+    last_hash = checkpoint['hash'] if checkpoint else None
+    for lo, hi, first_previous, range_last, range_errors in sorted(results):
+        if first_previous != previous:
+            errors.append((lo, 'previous_hash does not link to the preceding range'))
+        errors.extend(range_errors)
+        previous = last_hash = range_last
+
+    report = {
+        'mode': 'full' if full or not checkpoint else 'incremental',
+        'from': start,
+        'to': height,
+        'workers': len(jobs),
+        'seconds': round(time.perf_counter() - started, 3),
+        'errors': [{'block': block, 'error': message} for block, message in sorted(errors)[:MAX_ERRORS]],
+    }
+    ok = not errors
+    if ok and write_checkpoint and height:
+        if key is None:
+            report['checkpoint'] = 'not written: set LEDGER_CHECKPOINT_KEY or SECRET_KEY'
+        else:
+            save_checkpoint(directory, key, height, last_hash, report['mode'])
+            report['checkpoint'] = height
+    return ok, report
+
+
+def bench(blocks, per_block):
+    from ledger_merkle import MerkleLedger
+
+    directory = tempfile.mkdtemp(prefix='ledger_verify_')
+    try:
+        writer = MerkleLedger(directory, max_count=per_block, max_wait=3600)
+        for transaction_id in range(1, blocks * per_block + 1):
+            writer.add({'id': transaction_id, 'amount': '25.00', 'currency': 'USD', 'status': 'SUCCESS'})
+        writer.close()
+        print(f"   {blocks:,} blocks x {per_block} transactions")
+        for workers in sorted({1, cpu_count()}):
+            ok, report = verify(directory, full=True, workers=workers, write_checkpoint=False)
+            print(f"   {workers:>2} worker(s): {report['seconds']:.2f}s {'✓' if ok else '✗'}")
+        return 0
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel, checkpointed ledger verification')
+    parser.add_argument('--dir', default=LEDGER_DIR, help='Ledger directory')
+    parser.add_argument('--full', action='store_true', help='Ignore the checkpoint, verify everything')
+    parser.add_argument('--workers', type=int, help='Processes (default: all cores)')
+    parser.add_argument('command', nargs='?', choices=['verify', 'status', 'bench'], default='verify')
+    parser.add_argument('--blocks', type=int, default=2000, help='bench: blocks to generate')
+    parser.add_argument('--per-block', type=int, default=100, help='bench: transactions per block')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        return bench(args.blocks, args.per_block)
+
+    if args.command == 'status':
+        checkpoint, error = load_checkpoint(args.dir, checkpoint_key())
+        if error:
+            print(f"✗ {error}")
+            return 1
+        print(json.dumps(checkpoint, indent=2) if checkpoint else "No checkpoint yet")
+        return 0
+
+    ok, report = verify(args.dir, full=args.full, workers=args.workers)
+    if 'error' in report:
+        print(f"✗ {report['error']}")
+        return 1
+    print(f"{'✓' if ok else '✗'} {report['mode']} verification of blocks "
+          f"{report['from']}..{report['to']} with {report['workers']} worker(s) in {report['seconds']}s")
+    for item in report['errors']:
+        print(f"   ✗ block {item['block']}: {item['error']}")
+    if 'checkpoint' in report:
+        print(f"   Checkpoint: {report['checkpoint']}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Transactional Outbox & Dispatcher
+Post-commit side effects (ledger, SocketIO, email, webhooks) for payments
+
+The payment path writes outbox rows in the SAME database transaction as the
+Transaction row and returns as soon as the commit finishes:
+
+    from outbox_dispatcher import enqueue_payment_events
+
+    db.session.add(transaction)
+    db.session.flush()                     # assigns transaction.id
+    enqueue_payment_events(db.session, transaction, email=user.email, card_number=card_number)
+    db.session.commit()                    # payment + outbox are atomic
+
+This dispatcher drains the outbox in batches:
+- SELECT ... FOR UPDATE SKIP LOCKED, so several dispatchers can run side by side
+- Each event is handled, then marked dispatched in the same DB transaction
+- Failures are retried with exponential backoff up to MAX_ATTEMPTS
+- Delivery is at-least-once: handlers must tolerate duplicates (events carry
+  a stable event id and the transaction id for de-duplication)
+
+Usage:
+    python outbox_dispatcher.py create          # Create the outbox_events table
+    python outbox_dispatcher.py run             # Dispatch forever
+    python outbox_dispatcher.py run --once      # Drain what is pending and exit
+    python outbox_dispatcher.py stats           # Pending / failed counts
+
+Handlers are registered with @register_handler('<event type>'). A handler may
+return a completion callable instead of finishing inline: it is called once
+every event of the batch has been handled, and only then is that event marked
+dispatched. The ledger handler uses this to queue the whole batch with the
+single-writer ledger service (ledger_service.py) and then wait for each ack,
+so many appends share one block. A failed or late ack only retries its own
+ledger.append row; the rest of the batch is committed as usual.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, String, Table, Text, and_, func, select, update,
+)
+
+from app import create_app, db
+
+BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 200))
+POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', 0.5))
+MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 12))
+WEBHOOK_URL = os.environ.get('PAYMENT_WEBHOOK_URL')
+
+outbox_events = Table(
+    'outbox_events', db.metadata,
+    Column('id', BigInteger, primary_key=True, autoincrement=True),
+    Column('event_type', String(50), nullable=False),
+    Column('transaction_id', Integer, nullable=True, index=True),
+    Column('user_id', Integer, nullable=True),
+    Column('payload', Text, nullable=False),
+    Column('created_at', DateTime, nullable=False, default=datetime.utcnow),
+    Column('available_at', DateTime, nullable=False, default=datetime.utcnow),
+    Column('dispatched_at', DateTime, nullable=True),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('last_error', String(500), nullable=True),
+    extend_existing=True,
+)
+
+# Pending events are found through (dispatched_at, available_at)
+Index('ix_outbox_pending', outbox_events.c.dispatched_at, outbox_events.c.available_at)
+
+HANDLERS = {}
+# Longest a batch waits for deferred completions (ledger acks) in total
+COMPLETION_TIMEOUT = float(os.environ.get('OUTBOX_COMPLETION_TIMEOUT', 10))
+
+
+def register_handler(event_type):
+    """Decorator registering fn(app, event, payload) for an event type
+
+    fn may return a callable complete(timeout) that finishes the event after
+    the rest of the batch was handled; it raises to have the event retried.
+    """
+    def decorator(fn):
+        HANDLERS[event_type] = fn
+        return fn
+    return decorator
+
+
+def enqueue_event(session, event_type, payload, transaction_id=None, user_id=None):
+    """Add one outbox row to the caller's open DB transaction"""
+    session.execute(outbox_events.insert().values(
+        event_type=event_type,
+        transaction_id=transaction_id,
+        user_id=user_id,
+        payload=json.dumps(payload, default=str),
+    ))
+
+
+def enqueue_payment_events(session, transaction, email=None, card_number=None):
+    """
+    Queue every post-commit side effect of a processed payment
+    card_number is only used to fingerprint the card for the analytics
+    sketches; it is never written to the outbox.
+    """
+    from analytics_sketches import sketch_values
+
+    data = transaction.to_dict()
+    common = {'transaction_id': transaction.id, 'user_id': transaction.user_id}
+
+    enqueue_event(session, 'ledger.append', data, **common)
+    enqueue_event(session, 'socket.transaction', data, **common)
+    enqueue_event(session, 'sketch.record', dict(sketch_values(transaction, card_number),
+                                                 created_at=transaction.created_at), **common)
+    if email:
+        enqueue_event(session, 'mail.receipt', {'to': email, 'transaction': data}, **common)
+    if WEBHOOK_URL:
+        enqueue_event(session, 'webhook.transaction', data, **common)
+
+
+@register_handler('ledger.append')
+def append_ledger(app, event, payload):
+    from ledger_service import submit_nowait, wait_for_acks
+
+    # Redelivered events are harmless: the ledger de-duplicates on transaction id
+    request_id = submit_nowait(payload)
+
+    def complete(timeout):
+        wait_for_acks([request_id], timeout=timeout)
+
+    return complete
+
+
+@register_handler('socket.transaction')
+def emit_transaction(app, event, payload):
+    from realtime import emit_to_user
+    from realtime_deltas import DELTA_WINDOW, push_transactions
+
+    if DELTA_WINDOW > 0:
+        # Merged into the room's next transactions_delta (realtime_deltas.py)
+        push_transactions(event['user_id'], [payload])
+        return
+    # Through the Redis message queue: this process holds no sockets
+    emit_to_user(event['user_id'], 'transaction_update', payload)
+
+
+@register_handler('socket.delta')
+def push_delta(app, event, payload):
+    """
+    Status changes for the user's dashboard: payload is {'transactions': [...]}
+    Without a delta window this is still one emit per user and status, never
+    one per transaction: transactions_bulk_update {'status', 'ids', 'count'}.
+    """
+    from realtime import emit_to_user
+    from realtime_deltas import DELTA_WINDOW, push_transactions
+
+    if DELTA_WINDOW > 0:
+        push_transactions(event['user_id'], payload['transactions'])
+        return
+    by_status = {}
+    for transaction in payload['transactions']:
+        by_status.setdefault(transaction['status'], []).append(transaction['id'])
+    for status, ids in by_status.items():
+        emit_to_user(event['user_id'], 'transactions_bulk_update',
+                     {'status': status, 'ids': ids, 'count': len(ids)})
+
+
+@register_handler('sketch.record')
+def record_sketches(app, event, payload):
+    """Admin dashboard sketches (analytics_sketches.py); payload is sketch_values() + created_at"""
+    from analytics_sketches import record
+
+    created_at = payload.pop('created_at', None)
+    moment = datetime.fromisoformat(created_at) if created_at else event['created_at']
+    record(moment, payload)
+
+
+@register_handler('socket.emit')
+def emit_event(app, event, payload):
+    """Generic emit: payload is {'event': name, 'data': {...}} for the event's user room"""
+    from realtime import emit_to_user
+
+    emit_to_user(event['user_id'], payload['event'], payload['data'])
+
+
+@register_handler('mail.receipt')
+def send_receipt(app, event, payload):
+    mail = app.extensions.get('mail')
+    if mail is None:
+        return
+    from flask_mail import Message
+
+    tx = payload['transaction']
+    message = Message(
+        subject=f"Payment {tx.get('status')} - {tx.get('currency', 'USD')} {tx.get('amount')}",
+        recipients=[payload['to']],
+        body=(f"Transaction #{tx.get('id')}\n"
+              f"Amount: {tx.get('amount')} {tx.get('currency', 'USD')}\n"
+              f"Card: {tx.get('masked_card_number')}\n"
+              f"Status: {tx.get('status')}\n"),
+    )
+    mail.send(message)
+
+
+@register_handler('webhook.transaction')
+def post_webhook(app, event, payload):
+    body = json.dumps({'event_id': event['id'], 'type': 'transaction', 'data': payload}).encode()
+    request = urllib.request.Request(
+        WEBHOOK_URL, data=body, method='POST',
+        headers={'Content-Type': 'application/json', 'Idempotency-Key': f"outbox-{event['id']}"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        if response.status >= 300:
+            raise RuntimeError(f"webhook returned {response.status}")
+
+
+def dispatch_batch(app, conn):
+    """Claim and handle one batch, return number of events processed"""
+    now = datetime.utcnow()
+    rows = conn.execute(
+        select(outbox_events)
+        .where(and_(outbox_events.c.dispatched_at.is_(None),
+                    outbox_events.c.available_at <= now,
+                    outbox_events.c.attempts < MAX_ATTEMPTS))
+        .order_by(outbox_events.c.id)
+        .limit(BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    ).mappings().all()
+
+    def failed(event, error):
+        attempts = event['attempts'] + 1
+        conn.execute(update(outbox_events).where(outbox_events.c.id == event['id']).values(
+            attempts=attempts,
+            available_at=now + timedelta(seconds=min(2 ** attempts, 3600)),
+            last_error=str(error)[:500],
+        ))
+
+    def dispatched(event):
+        conn.execute(update(outbox_events).where(outbox_events.c.id == event['id']).values(
+            dispatched_at=datetime.utcnow(),
+            attempts=event['attempts'] + 1,
+        ))
+
+    pending = []
+    for event in rows:
+        handler = HANDLERS.get(event['event_type'])
+        try:
+            if handler is None:
+                raise LookupError(f"no handler for {event['event_type']}")
+            complete = handler(app, event, json.loads(event['payload']))
+        except Exception as e:
+            failed(event, e)
+            continue
+        if complete is None:
+            dispatched(event)
+        else:
+            pending.append((event, complete))
+
+    # Deferred completions share one deadline, so a dead dependency costs the
+    # batch COMPLETION_TIMEOUT once, not once per event
+    deadline = time.monotonic() + COMPLETION_TIMEOUT
+    for event, complete in pending:
+        try:
+            complete(max(deadline - time.monotonic(), 0.01))
+        except Exception as e:
+            failed(event, e)
+            continue
+        dispatched(event)
+
+    conn.commit()
+    return len(rows)
+
+
+def run(app, once=False):
+    print(f"✓ Outbox dispatcher started (batch {BATCH_SIZE}, handlers: {', '.join(sorted(HANDLERS))})")
+    with db.engine.connect() as conn:
+        while True:
+            try:
+                processed = dispatch_batch(app, conn)
+            except Exception as e:
+                # e.g. the database went away: nothing was committed, try again later
+                conn.rollback()
+                print(f"   ✗ Batch failed: {e}")
+                time.sleep(max(POLL_INTERVAL, 1))
+                continue
+            if processed:
+                print(f"   Dispatched {processed} event(s)")
+            elif once:
+                return
+            else:
+                time.sleep(POLL_INTERVAL)
+
+
+def print_stats():
+    with db.engine.connect() as conn:
+        pending = conn.execute(select(func.count()).where(and_(
+            outbox_events.c.dispatched_at.is_(None), outbox_events.c.attempts < MAX_ATTEMPTS
+        ))).scalar()
+        failed = conn.execute(select(func.count()).where(and_(
+            outbox_events.c.dispatched_at.is_(None), outbox_events.c.attempts >= MAX_ATTEMPTS
+        ))).scalar()
+        oldest = conn.execute(select(func.min(outbox_events.c.created_at)).where(
+            outbox_events.c.dispatched_at.is_(None)
+        )).scalar()
+    print(f"Pending: {pending}")
+    print(f"Failed (gave up after {MAX_ATTEMPTS} attempts): {failed}")
+    print(f"Oldest undelivered: {oldest or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transactional outbox dispatcher')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help='Create the outbox_events table')
+    run_parser = subparsers.add_parser('run', help='Dispatch pending events')
+    run_parser.add_argument('--once', action='store_true', help='Exit when the outbox is empty')
+    subparsers.add_parser('stats', help='Show outbox backlog')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.command == 'create':
+            outbox_events.create(db.engine, checkfirst=True)
+            print("✓ outbox_events table ready")
+        elif args.command == 'run':
+            run(app, once=args.once)
+        else:
+            print_stats()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Transactions Table Partitioning & Archival
+Monthly RANGE partitioning of `transactions` on created_at
+
+Usage:
+    python partition_transactions.py init                  # One-time migration
+    python partition_transactions.py maintain --ahead 3    # Pre-create future partitions
+    python partition_transactions.py archive --retain 24   # Export + drop expired months
+    python partition_transactions.py explain               # Show partition pruning
+    python partition_transactions.py list                  # Show partitions and row counts
+
+Layout: one partition per month named pYYYYMM holding rows with
+created_at < first day of the next month, plus a catch-all `pmax`.
+Queries with a created_at range only touch the matching months, e.g.
+    WHERE user_id = 1 AND created_at >= '2026-09-01' AND created_at < '2026-10-01'
+reads partition p202609 only.
+
+MySQL restrictions handled by `init`:
+- Every unique key must include created_at, so the primary key becomes (id, created_at)
+- Partitioned InnoDB tables cannot have foreign keys, so the transactions -> users
+  foreign key is dropped (the user_id index is kept)
+
+Archived partitions are written to ARCHIVE_DIR/transactions_pYYYYMM.csv.gz. The
+file is fsynced and its row count checked against the partition before the
+partition is dropped. Card tokens stay AES encrypted in the archive.
+Run `maintain` and `archive` daily from cron.
+"""
+
+import argparse
+import csv
+import gzip
+import os
+import sys
+from datetime import date, datetime
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TABLE = 'transactions'
+ARCHIVE_DIR = os.environ.get('TRANSACTION_ARCHIVE_DIR', 'archive')
+
+
+def add_months(day, months):
+    """Return the first day of the month `months` after day's month"""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month_start):
+    return f"p{month_start.year:04d}{month_start.month:02d}"
+
+
+def partition_clause(month_start):
+    upper = add_months(month_start, 1)
+    return (f"PARTITION {partition_name(month_start)} "
+            f"VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))")
+
+
+def list_partitions(conn):
+    """Return [(name, description, rows)] ordered by position"""
+    from sqlalchemy import text
+
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+        "FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'table': TABLE}).fetchall()
+    return [(r[0], r[1], r[2]) for r in rows if r[0] is not None]
+
+
+def monthly_partitions(conn):
+    """Return {month_start: name} for pYYYYMM partitions"""
+    months = {}
+    for name, _, _ in list_partitions(conn):
+        if name.startswith('p') and name[1:].isdigit():
+            months[date(int(name[1:5]), int(name[5:7]), 1)] = name
+    return months
+
+
+def init_partitions(conn, ahead):
+    """One-time migration converting transactions into a partitioned table"""
+    from sqlalchemy import text
+
+    if list_partitions(conn):
+        print("✓ transactions is already partitioned")
+        return True
+
+    unique_keys = conn.execute(text(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'"
+    ), {'table': TABLE}).scalars().all()
+    if unique_keys:
+        print(f"✗ Unique keys must include created_at before partitioning: {', '.join(unique_keys)}")
+        return False
+
+    foreign_keys = conn.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+    ), {'table': TABLE}).scalars().all()
+    for fk in foreign_keys:
+        print(f"   Dropping foreign key {fk}")
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP FOREIGN KEY `{fk}`"))
+
+    oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {TABLE}")).scalar()
+    first_month = (oldest or datetime.utcnow()).date().replace(day=1)
+    last_month = add_months(date.today(), ahead)
+
+    clauses = []
+    month = first_month
+    while month <= last_month:
+        clauses.append(partition_clause(month))
+        month = add_months(month, 1)
+    clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    print(f"   Rebuilding primary key and creating {len(clauses)} partitions "
+          f"({partition_name(first_month)} .. {partition_name(last_month)})")
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"
+    ))
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(created_at)) ("
+        + ", ".join(clauses) + ")"
+    ))
+    print("✓ transactions partitioned by month")
+    return True
+
+
+def precreate_partitions(conn, ahead):
+    """Split pmax so that the next `ahead` months have their own partition"""
+    from sqlalchemy import text
+
+    existing = monthly_partitions(conn)
+    if not existing:
+        print("✗ transactions is not partitioned. Run: python partition_transactions.py init")
+        return False
+
+    latest = max(existing)
+    target = add_months(date.today(), ahead)
+    new_months = []
+    month = add_months(latest, 1)
+    while month <= target:
+        new_months.append(month)
+        month = add_months(month, 1)
+
+    if not new_months:
+        print(f"✓ Partitions already exist through {partition_name(latest)}")
+        return True
+
+    clauses = [partition_clause(m) for m in new_months]
+    clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    # pmax is empty in steady state, so the reorganize is metadata-only
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO (" + ", ".join(clauses) + ")"
+    ))
+    print(f"✓ Created {', '.join(partition_name(m) for m in new_months)}")
+    return True
+
+
+def export_partition(conn, name, path):
+    """Stream one partition to a gzip CSV file, return rows written"""
+    from sqlalchemy import text
+
+    tmp_path = path + '.tmp'
+    result = conn.execution_options(stream_results=True, max_row_buffer=5000).execute(
+        text(f"SELECT * FROM {TABLE} PARTITION ({name}) ORDER BY id")
+    )
+
+    written = 0
+    with open(tmp_path, 'wb') as raw:
+        with gzip.open(raw, 'wt', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(result.keys())
+            while True:
+                chunk = result.fetchmany(5000)
+                if not chunk:
+                    break
+                writer.writerows(chunk)
+                written += len(chunk)
+        # gzip trailer is written on close, fsync afterwards
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    os.replace(tmp_path, path)
+    return written
+
+
+def archive_partitions(conn, retain, archive_dir):
+    """Export and drop monthly partitions older than `retain` months"""
+    from sqlalchemy import text
+
+    cutoff = add_months(date.today(), -retain)
+    expired = [(m, n) for m, n in sorted(monthly_partitions(conn).items()) if m < cutoff]
+    if not expired:
+        print(f"✓ Nothing older than {partition_name(cutoff)} to archive")
+        return True
+
+    os.makedirs(archive_dir, exist_ok=True)
+    for month, name in expired:
+        path = os.path.join(archive_dir, f"{TABLE}_{name}.csv.gz")
+        expected = conn.execute(text(f"SELECT COUNT(*) FROM {TABLE} PARTITION ({name})")).scalar()
+        written = export_partition(conn, name, path)
+
+        if written != expected:
+            print(f"✗ {name}: exported {written} rows but partition holds {expected}, keeping it")
+            return False
+
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {name}"))
+        print(f"✓ {name}: {written} rows archived to {path} and partition dropped")
+    return True
+
+
+def explain_pruning(conn):
+    """Show which partitions a date-bounded history query reads"""
+    from sqlalchemy import text
+
+    start = add_months(date.today(), -1)
+    end = add_months(date.today(), 1)
+    query = (f"SELECT id, amount, status FROM {TABLE} "
+             f"WHERE created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}'")
+    row = conn.execute(text("EXPLAIN " + query)).mappings().first()
+    print(query)
+    print(f"   partitions: {row['partitions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transactions table partition maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    init = subparsers.add_parser('init', help='Partition the transactions table by month')
+    init.add_argument('--ahead', type=int, default=3, help='Future months to create')
+    maintain = subparsers.add_parser('maintain', help='Pre-create future partitions')
+    maintain.add_argument('--ahead', type=int, default=3, help='Future months to keep ready')
+    archive = subparsers.add_parser('archive', help='Export and drop expired partitions')
+    archive.add_argument('--retain', type=int, default=24, help='Months to keep online')
+    archive.add_argument('--archive-dir', default=ARCHIVE_DIR, help='Directory for .csv.gz files')
+    subparsers.add_parser('explain', help='Show partition pruning for a date-bounded query')
+    subparsers.add_parser('list', help='List partitions')
+    args = parser.parse_args()
+
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if args.command == 'init':
+                ok = init_partitions(conn, args.ahead)
+            elif args.command == 'maintain':
+                ok = precreate_partitions(conn, args.ahead)
+            elif args.command == 'archive':
+                ok = archive_partitions(conn, args.retain, args.archive_dir)
+            elif args.command == 'explain':
+                explain_pruning(conn)
+                ok = True
+            else:
+                for name, description, rows in list_partitions(conn):
+                    print(f"{name:<10} < {description:<12} ~{rows} rows")
+                ok = True
+            conn.commit()
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Real-Time Delivery Across Workers
+Flask-SocketIO on a Redis message queue, with one room per user
+
+With several eventlet workers, a socket is connected to exactly one of them.
+An emit from another worker, the outbox dispatcher or a CLI job only reaches
+it if it travels through a shared message queue:
+
+    any process --emit_to_user()--> Redis pub/sub --> every worker --> sockets in room user_<id>
+
+Server side (wsgi.py):
+    from realtime import init_realtime
+    socketio = init_realtime(app)      # reconfigures app.socketio with the queue
+
+- Every worker subscribes to SOCKETIO_MESSAGE_QUEUE (default: the app Redis)
+- On connect the JWT (auth={'token': ...}, ?token= or Authorization header)
+  is decoded and the socket joins user_<id>; unauthenticated sockets are
+  refused. If the app already has a connect handler, it is kept and should
+  call join_user_room(user_id) itself.
+
+Anywhere else (background workers, outbox, CLI):
+    from realtime import emit_to_user
+    emit_to_user(user_id, 'transaction_update', payload)
+
+Several workers behind one port need WebSocket-only clients
+(io(url, {transports: ['websocket']})): HTTP long-polling needs every request
+of a session to reach the same worker, which gunicorn cannot guarantee.
+Dockerfile.prod sets SOCKETIO_TRANSPORTS=websocket for that reason.
+
+Capacity (test_socketio_multiworker.py --capacity N measures it on the target
+host): an idle WebSocket costs an eventlet worker tens of KB, and fan-out is
+bounded by one CPU core per worker. --worker-connections is the hard cap per
+worker; size SOCKETIO_WORKERS as ceil(peak sockets / sockets per worker) and
+keep it at or below the core count.
+
+CLI:
+    python realtime.py emit --user-id 1 --event ping --data '{"hello": "world"}'
+"""
+
+import argparse
+import json
+import os
+import sys
+
+SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+
+_emitter = None
+
+
+def message_queue_url():
+    return os.environ.get('SOCKETIO_MESSAGE_QUEUE') or "redis://{}:{}/{}".format(
+        os.environ.get('REDIS_HOST', 'localhost'),
+        os.environ.get('REDIS_PORT', 6379),
+        os.environ.get('REDIS_DB', 0),
+    )
+
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+
+def socketio_options():
+    options = {'message_queue': message_queue_url(), 'channel': SOCKETIO_CHANNEL}
+    transports = os.environ.get('SOCKETIO_TRANSPORTS')
+    if transports:
+        options['transports'] = [t.strip() for t in transports.split(',') if t.strip()]
+    return options
+
+
+def token_user_id(auth=None):
+    """User id from the connecting socket's JWT, or None"""
+    import jwt
+    from flask import current_app, request
+
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    header = request.headers.get('Authorization', '')
+    if not token and header.startswith('Bearer '):
+        token = header[7:]
+    if not token:
+        return None
+
+    secret = current_app.config.get('JWT_SECRET_KEY') or os.environ.get('JWT_SECRET_KEY')
+    try:
+        claims = jwt.decode(token, secret, algorithms=['HS256'])
+    except jwt.PyJWTError:
+        return None
+    user_id = claims.get('user_id', claims.get('sub'))
+    return int(user_id) if str(user_id).isdigit() else None
+
+
+def join_user_room(user_id):
+    from flask_socketio import join_room
+
+    join_room(user_room(user_id))
+
+
+def init_realtime(app, socketio=None, resolve_user=token_user_id):
+    """Put the app's SocketIO on the message queue and add per-user rooms"""
+    from flask_socketio import SocketIO
+
+    socketio = socketio or getattr(app, 'socketio', None)
+    if socketio is None:
+        socketio = SocketIO(app, **socketio_options())
+    else:
+        # Re-run init_app on the existing instance: its handlers are re-registered
+        # on the new server; drop the old middleware so it is not wrapped twice
+        if hasattr(socketio, 'sockio_mw') and app.wsgi_app is socketio.sockio_mw:
+            app.wsgi_app = socketio.sockio_mw.wsgi_app
+        socketio.init_app(app, **socketio_options())
+    app.socketio = socketio
+
+    has_connect = any(name == 'connect' and namespace in (None, '/')
+                      for name, _, namespace in socketio.handlers)
+    if not has_connect:
+        @socketio.on('connect')
+        def connect(auth=None):
+            user_id = resolve_user(auth)
+            if user_id is None:
+                return False
+            join_user_room(user_id)
+
+    return socketio
+
+
+def get_emitter():
+    """Write-only SocketIO for processes that do not serve sockets"""
+    global _emitter
+    if _emitter is None:
+        from flask_socketio import SocketIO
+
+        _emitter = SocketIO(message_queue=message_queue_url(), channel=SOCKETIO_CHANNEL)
+    return _emitter
+
+
+def emit_to_user(user_id, event, data):
+    get_emitter().emit(event, data, room=user_room(user_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Real-time delivery tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    emit = subparsers.add_parser('emit', help="Send an event to a user's room from the CLI")
+    emit.add_argument('--user-id', type=int, required=True)
+    emit.add_argument('--event', required=True)
+    emit.add_argument('--data', default='{}', help='JSON payload')
+    args = parser.parse_args()
+
+    emit_to_user(args.user_id, args.event, json.loads(args.data))
+    print(f"✓ Sent '{args.event}' to {user_room(args.user_id)} via {message_queue_url()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
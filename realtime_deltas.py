@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Coalesced Dashboard Deltas
+One batched SocketIO event per user room per window instead of one per transaction
+
+Producers (outbox dispatcher, bulk admin actions) never emit directly; they
+merge each transaction's latest state into a per-room Redis hash:
+
+    push_transactions(user_id, [{'id', 'status', 'amount', 'currency', 'previous_status'}])
+
+A Lua script keeps one entry per transaction id: the newest status wins,
+while the first-seen "is new" flag and previous status are kept, so
+intermediate states (PENDING -> SUCCESS -> FRAUD) collapse into one change.
+
+Every web worker runs a flusher (init_deltas). Every DELTA_WINDOW seconds it
+atomically claims the due rooms and emits ONE `transactions_delta` each:
+
+    {'seq': 17,
+     'new': [1041, 1042],                              # new transaction ids
+     'statuses': {'1041': 'SUCCESS', '998': 'FRAUD'},  # latest status per id
+     'stats': {'count': 2,                             # counter deltas to add
+               'by_status': {'SUCCESS': 2, 'PENDING': -1, 'FRAUD': 1},
+               'volume': {'USD': '250.00'}}}
+
+A delta with more than MAX_DELTA_ITEMS entries is sent as {'seq', 'resync': true}:
+the client should re-fetch instead of applying it.
+
+Backpressure: a client that answers `delta_ack` with {'seq': n} opts in to
+flow control. While it has MAX_IN_FLIGHT unacknowledged deltas its room is
+not flushed; updates keep merging in Redis, so a slow browser gets fewer,
+larger deltas and never the states in between. After STALE_SECONDS without
+an ack the room is flushed anyway. Clients that never ack get every window.
+
+Server setup (wsgi.py, after init_realtime):
+    from realtime_deltas import init_deltas
+    init_deltas(socketio)
+
+Coalescing is opt-in: with SOCKETIO_DELTA_WINDOW=0 (the default) producers
+emit one `transaction_update` per change, which is what the dashboard listens
+for today, and no flusher runs. Set a window (e.g. 0.25) once the client
+handles `transactions_delta`.
+
+Settings: SOCKETIO_DELTA_WINDOW (seconds, default 0 = per-event emits),
+SOCKETIO_MAX_IN_FLIGHT (default 2).
+
+CLI:
+    python realtime_deltas.py flush        # standalone flusher (no web workers)
+    python realtime_deltas.py stats
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+from realtime import get_emitter, user_room
+
+DELTA_WINDOW = float(os.environ.get('SOCKETIO_DELTA_WINDOW', 0))
+MIN_POLL = 0.05
+MAX_IN_FLIGHT = int(os.environ.get('SOCKETIO_MAX_IN_FLIGHT', 2))
+STALE_SECONDS = 10
+MAX_DELTA_ITEMS = 500
+CLAIM_BATCH = 200
+KEY_TTL = 24 * 3600
+
+DIRTY_KEY = 'rt:dirty'
+
+MERGE_SCRIPT = """
+for i = 3, #ARGV, 2 do
+    local entry = cjson.decode(ARGV[i + 1])
+    local old = redis.call('HGET', KEYS[1], ARGV[i])
+    if old then
+        local first = cjson.decode(old)
+        entry['new'] = first['new']
+        entry['previous_status'] = first['previous_status']
+        if entry['amount'] == cjson.null then
+            entry['amount'] = first['amount']
+            entry['currency'] = first['currency']
+        end
+    end
+    redis.call('HSET', KEYS[1], ARGV[i], cjson.encode(entry))
+end
+redis.call('EXPIRE', KEYS[1], %d)
+redis.call('ZADD', KEYS[2], 'NX', ARGV[1], ARGV[2])
+return 1
+""" % KEY_TTL
+
+CLAIM_SCRIPT = """
+local rooms = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, room in ipairs(rooms) do
+    redis.call('ZREM', KEYS[1], room)
+end
+return rooms
+"""
+
+TAKE_SCRIPT = """
+local entries = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return entries
+"""
+
+ACK_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or tonumber(ARGV[1]) > tonumber(current) then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', %d)
+end
+return 1
+""" % KEY_TTL
+
+_client = None
+_scripts = {}
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            decode_responses=True,
+        )
+    return _client
+
+
+def script(client, name, source):
+    if name not in _scripts:
+        _scripts[name] = client.register_script(source)
+    return _scripts[name]
+
+
+def delta_key(room):
+    return f"rt:delta:{room}"
+
+
+def push_transactions(user_id, transactions, client=None):
+    """Merge transaction states into the user's pending delta (one round trip)"""
+    if not transactions:
+        return
+    client = client or get_redis()
+    room = user_room(user_id)
+    args = [time.time() + DELTA_WINDOW, room]
+    for tx in transactions:
+        previous = tx.get('previous_status')
+        args.append(str(tx['id']))
+        args.append(json.dumps({
+            'status': getattr(tx.get('status'), 'name', tx.get('status')),
+            'amount': str(tx['amount']) if tx.get('amount') is not None else None,
+            'currency': tx.get('currency'),
+            'new': previous is None,
+            'previous_status': previous,
+        }))
+    script(client, 'merge', MERGE_SCRIPT)(keys=[delta_key(room), DIRTY_KEY], args=args)
+
+
+def build_delta(entries):
+    """Turn {id: entry} into the client-facing delta body"""
+    new, statuses = [], {}
+    by_status, volume = {}, {}
+
+    def add_volume(currency, amount):
+        volume[currency] = volume.get(currency, Decimal('0')) + amount
+
+    for tx_id, entry in entries.items():
+        status, previous = entry.get('status'), entry.get('previous_status')
+        statuses[tx_id] = status
+        amount = Decimal(entry['amount']) if entry.get('amount') else None
+        currency = entry.get('currency') or 'USD'
+        if entry.get('new'):
+            new.append(int(tx_id))
+            by_status[status] = by_status.get(status, 0) + 1
+            if status == 'SUCCESS' and amount is not None:
+                add_volume(currency, amount)
+        elif previous and previous != status:
+            by_status[previous] = by_status.get(previous, 0) - 1
+            by_status[status] = by_status.get(status, 0) + 1
+            if amount is not None and 'SUCCESS' in (previous, status):
+                add_volume(currency, amount if status == 'SUCCESS' else -amount)
+
+    return {
+        'new': sorted(new),
+        'statuses': statuses,
+        'stats': {
+            'count': len(new),
+            'by_status': {k: v for k, v in by_status.items() if v},
+            'volume': {k: str(v) for k, v in volume.items() if v},
+        },
+    }
+
+
+def held_back(client, room, now):
+    """True while an acking client still has MAX_IN_FLIGHT deltas unacknowledged"""
+    seq, acked, sent_at = client.mget(f"rt:seq:{room}", f"rt:acked:{room}", f"rt:sent_at:{room}")
+    if acked is None or seq is None:
+        return False
+    in_flight = int(seq) - int(acked)
+    return in_flight >= MAX_IN_FLIGHT and now - float(sent_at or 0) < STALE_SECONDS
+
+
+def flush_due(emit, client=None):
+    """Emit one delta per due room; returns how many were sent"""
+    client = client or get_redis()
+    now = time.time()
+    rooms = script(client, 'claim', CLAIM_SCRIPT)(keys=[DIRTY_KEY], args=[now, CLAIM_BATCH])
+    sent = 0
+    for room in rooms:
+        if held_back(client, room, now):
+            # Keep merging; look again next window
+            client.zadd(DIRTY_KEY, {room: now + DELTA_WINDOW}, nx=True)
+            continue
+
+        flat = script(client, 'take', TAKE_SCRIPT)(keys=[delta_key(room)])
+        if not flat:
+            continue
+        entries = {flat[i]: json.loads(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(f"rt:seq:{room}")
+        pipe.expire(f"rt:seq:{room}", KEY_TTL)
+        pipe.set(f"rt:sent_at:{room}", now, ex=KEY_TTL)
+        seq = pipe.execute()[0]
+
+        if len(entries) > MAX_DELTA_ITEMS:
+            body = {'seq': seq, 'resync': True}
+        else:
+            body = {'seq': seq, **build_delta(entries)}
+        emit(room, 'transactions_delta', body)
+        sent += 1
+    return sent
+
+
+def ack_delta(room, seq, client=None):
+    client = client or get_redis()
+    script(client, 'ack', ACK_SCRIPT)(keys=[f"rt:acked:{room}"], args=[int(seq)])
+
+
+def run_flusher(emit, sleep=time.sleep):
+    # Never spin on Redis, whatever the window
+    idle = max(DELTA_WINDOW / 2, MIN_POLL)
+    while True:
+        try:
+            sent = flush_due(emit)
+        except redis.RedisError as e:
+            print(f"   ✗ Delta flush failed: {e}")
+            sent = 0
+        if not sent:
+            sleep(idle)
+
+
+def init_deltas(socketio):
+    """Start this worker's flusher and accept delta_ack from clients"""
+    from flask_socketio import rooms
+
+    @socketio.on('delta_ack')
+    def delta_ack(data=None):
+        try:
+            seq = int((data or {}).get('seq', 0))
+        except (TypeError, ValueError, AttributeError):
+            return
+        for room in rooms():
+            if room.startswith('user_'):
+                ack_delta(room, seq)
+
+    if DELTA_WINDOW > 0:
+        def emit(room, event, body):
+            socketio.emit(event, body, room=room)
+
+        socketio.start_background_task(run_flusher, emit, socketio.sleep)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coalesced dashboard deltas')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('flush', help='Run a standalone flusher')
+    subparsers.add_parser('stats', help='Rooms waiting for a flush')
+    args = parser.parse_args()
+
+    client = get_redis()
+    if args.command == 'stats':
+        print(f"Rooms with pending deltas: {client.zcard(DIRTY_KEY)}")
+        return 0
+
+    if DELTA_WINDOW <= 0:
+        print("✗ SOCKETIO_DELTA_WINDOW is 0: deltas are off and events are emitted per change, "
+              "nothing to flush")
+        return 1
+
+    emitter = get_emitter()
+    print(f"✓ Delta flusher running (window {DELTA_WINDOW}s, max in flight {MAX_IN_FLIGHT})")
+    run_flusher(lambda room, event, body: emitter.emit(event, body, room=room))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Background PDF Statement Generation
+Moves reportlab statement rendering out of the request and caches the result
+
+Flow:
+1. The export route calls request_statement(user_id, date_from, date_to)
+   - Computes the data version of the range (row count, max id, last change)
+   - If STATEMENT_DIR/<user_id>/<key>.pdf exists for that version: ready at once
+   - Otherwise a job is pushed to the Redis list statements:queue
+2. `python statement_jobs.py worker` pops jobs, streams rows in chunks,
+   renders the PDF page by page and reports progress:
+   - SocketIO event `statement_progress` to the user's room (realtime.py)
+   - Job hash statements:job:<id> for clients that poll
+3. The download route calls statement_response(user_id, key), which serves
+   the file with an ETag (the cache key) and HTTP Range support
+
+Cache key = sha256(user_id, date range, data version, TEMPLATE_VERSION), so an
+unchanged statement is never rendered twice and any new or updated transaction
+in the range produces a new key.
+
+statements:key:<key> points at the one job for a key. It lives for JOB_TTL
+while the job is queued; once a worker starts, the TTL drops to LOCK_TTL and
+every progress update refreshes it, so a crashed worker frees the key within
+LOCK_TTL. A request that finds the key pointing at a failed or vanished job
+replaces it instead of joining it.
+
+Usage in routes:
+    from statement_jobs import request_statement, job_status, statement_response
+
+    body, status = request_statement(user_id, date_from, date_to)   # 200 ready / 202 queued
+    body, status = job_status(job_id, user_id)
+    return statement_response(user_id, key)
+
+CLI:
+    python statement_jobs.py worker
+    python statement_jobs.py cleanup --days 30
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+import uuid
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+from realtime import emit_to_user
+
+STATEMENT_DIR = os.environ.get('STATEMENT_DIR', 'statements')
+TEMPLATE_VERSION = '1'
+QUEUE_KEY = 'statements:queue'
+JOB_TTL = 24 * 3600
+LOCK_TTL = 120
+CHUNK_ROWS = 1000
+ROWS_PER_PAGE = 40
+
+# Delete the key only if it still points at this job
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            decode_responses=True,
+        )
+    return _client
+
+
+def data_version(session, user_id, date_from, date_to):
+    """Cheap fingerprint of the rows in range, read from the (user_id, created_at) index"""
+    from sqlalchemy import text
+
+    row = session.execute(text("""
+        SELECT COUNT(*), MAX(id), MAX(COALESCE(processed_at, created_at))
+        FROM transactions
+        WHERE user_id = :user_id AND created_at >= :date_from AND created_at < :date_to
+    """), {'user_id': user_id, 'date_from': date_from, 'date_to': date_to}).first()
+    return f"{row[0]}:{row[1]}:{row[2]}"
+
+
+def cache_key(user_id, date_from, date_to, version):
+    raw = f"{user_id}|{date_from.isoformat()}|{date_to.isoformat()}|{version}|{TEMPLATE_VERSION}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def artifact_path(user_id, key):
+    return os.path.join(STATEMENT_DIR, str(int(user_id)), f"{key}.pdf")
+
+
+def lock_key(key):
+    return f"statements:key:{key}"
+
+
+def release_lock(client, key, job_id):
+    client.eval(RELEASE_SCRIPT, 1, lock_key(key), job_id)
+
+
+def job_alive(client, job_id):
+    return client.hget(f"statements:job:{job_id}", 'status') in ('queued', 'running')
+
+
+def request_statement(user_id, date_from, date_to):
+    """Return a ready artifact or enqueue a job; (body, http status)"""
+    from app import db
+
+    version = data_version(db.session, user_id, date_from, date_to)
+    key = cache_key(user_id, date_from, date_to, version)
+    if os.path.exists(artifact_path(user_id, key)):
+        return {'success': True, 'status': 'ready', 'key': key, 'progress': 100}, 200
+
+    client = get_redis()
+    # One job per key: a second click while rendering joins the running job
+    job_id = client.get(lock_key(key))
+    if job_id is not None and not job_alive(client, job_id):
+        # Failed, expired, or its artifact was cleaned up: start over
+        release_lock(client, key, job_id)
+        job_id = None
+    if job_id is None:
+        job_id = uuid.uuid4().hex
+        if client.set(lock_key(key), job_id, nx=True, ex=JOB_TTL):
+            client.hset(f"statements:job:{job_id}", mapping={
+                'user_id': user_id, 'key': key, 'status': 'queued', 'progress': 0,
+                'date_from': date_from.isoformat(), 'date_to': date_to.isoformat(),
+            })
+            client.expire(f"statements:job:{job_id}", JOB_TTL)
+            client.lpush(QUEUE_KEY, job_id)
+        else:
+            job_id = client.get(lock_key(key))
+
+    return {'success': True, 'status': 'queued', 'job_id': job_id, 'key': key}, 202
+
+
+def job_status(job_id, user_id):
+    job = get_redis().hgetall(f"statements:job:{job_id}")
+    if not job or job.get('user_id') != str(user_id):
+        return {'success': False, 'error': 'Job not found'}, 404
+    return {'success': True, 'job_id': job_id, **job}, 200
+
+
+def statement_response(user_id, key):
+    """Serve a cached statement with ETag / If-None-Match and Range support"""
+    from flask import jsonify, send_file
+
+    if not key.isalnum():
+        return jsonify({'success': False, 'error': 'Invalid statement key'}), 400
+    path = artifact_path(user_id, key)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Statement not found'}), 404
+
+    response = send_file(
+        os.path.abspath(path),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"statement_{key[:8]}.pdf",
+        conditional=True,
+        etag=key,
+        max_age=3600,
+    )
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+class ProgressReporter:
+    """Writes job progress to Redis, keeps the job's key alive and emits to the user's SocketIO room"""
+
+    def __init__(self, client, job_id, user_id, key):
+        self.client = client
+        self.job_id = job_id
+        self.user_id = user_id
+        self.key = key
+        self.last_sent = 0.0
+
+    def update(self, progress, status='running', force=False, **extra):
+        now = time.time()
+        if not force and now - self.last_sent < 0.5:
+            return
+        self.last_sent = now
+        fields = {'status': status, 'progress': progress, **extra}
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(f"statements:job:{self.job_id}", mapping=fields)
+        if status == 'running':
+            pipe.expire(lock_key(self.key), LOCK_TTL)
+        pipe.execute()
+        # Delivered by whichever web worker holds the user's socket
+        emit_to_user(self.user_id, 'statement_progress', {'job_id': self.job_id, **fields})
+
+
+def render_statement(conn, job, path, progress):
+    """Stream rows into a PDF, one page at a time"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    from sqlalchemy import text
+
+    user_id = int(job['user_id'])
+    params = {'user_id': user_id, 'date_from': job['date_from'], 'date_to': job['date_to']}
+    total = conn.execute(text("""
+        SELECT COUNT(*) FROM transactions
+        WHERE user_id = :user_id AND created_at >= :date_from AND created_at < :date_to
+    """), params).scalar() or 0
+
+    result = conn.execution_options(stream_results=True, max_row_buffer=CHUNK_ROWS).execute(text("""
+        SELECT id, created_at, amount, currency, status, masked_card_number
+        FROM transactions
+        WHERE user_id = :user_id AND created_at >= :date_from AND created_at < :date_to
+        ORDER BY created_at, id
+    """), params)
+
+    tmp_path = path + '.tmp'
+    pdf = canvas.Canvas(tmp_path, pagesize=letter)
+    width, height = letter
+
+    def page_header(page):
+        pdf.setFont('Helvetica-Bold', 14)
+        pdf.drawString(40, height - 50, 'Transaction Statement')
+        pdf.setFont('Helvetica', 9)
+        pdf.drawString(40, height - 66, f"{job['date_from'][:10]} to {job['date_to'][:10]}")
+        pdf.drawRightString(width - 40, height - 66, f"Page {page}")
+        pdf.setFont('Helvetica-Bold', 9)
+        for x, label in ((40, 'ID'), (100, 'Date'), (230, 'Card'), (360, 'Status'), (470, 'Amount')):
+            pdf.drawString(x, height - 90, label)
+        pdf.setFont('Helvetica', 9)
+
+    page, line, done, total_amount = 1, 0, 0, 0.0
+    page_header(page)
+    while True:
+        rows = result.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        for row in rows:
+            if line == ROWS_PER_PAGE:
+                pdf.showPage()
+                page += 1
+                line = 0
+                page_header(page)
+            y = height - 108 - line * 15
+            status = getattr(row[4], 'name', row[4])
+            pdf.drawString(40, y, str(row[0]))
+            pdf.drawString(100, y, row[1].strftime('%Y-%m-%d %H:%M'))
+            pdf.drawString(230, y, row[5] or '')
+            pdf.drawString(360, y, str(status))
+            pdf.drawRightString(width - 40, y, f"{float(row[2]):,.2f} {row[3]}")
+            if status == 'SUCCESS':
+                total_amount += float(row[2])
+            line += 1
+        done += len(rows)
+        progress.update(int(done * 100 / total) if total else 100)
+
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawString(40, 40, f"{total} transactions, successful total {total_amount:,.2f}")
+    pdf.save()
+    os.replace(tmp_path, path)
+    return total
+
+
+def run_worker():
+    from app import create_app, db
+
+    app = create_app()
+    client = get_redis()
+    print("✓ Statement worker waiting for jobs")
+    with app.app_context():
+        while True:
+            popped = client.brpop(QUEUE_KEY, timeout=5)
+            if not popped:
+                continue
+            job_id = popped[1]
+            job = client.hgetall(f"statements:job:{job_id}")
+            if not job:
+                continue
+
+            path = artifact_path(job['user_id'], job['key'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            progress = ProgressReporter(client, job_id, job['user_id'], job['key'])
+            progress.update(0, force=True)
+            started = time.perf_counter()
+            try:
+                with db.engine.connect() as conn:
+                    rows = render_statement(conn, job, path, progress)
+                progress.update(100, status='ready', force=True, key=job['key'])
+                print(f"   ✓ Job {job_id}: {rows} rows in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                progress.update(0, status='failed', force=True, error=str(e)[:200])
+                print(f"   ✗ Job {job_id}: {e}")
+            finally:
+                # A request may already have replaced a lock that expired mid-render
+                release_lock(client, job['key'], job_id)
+
+
+def cleanup(days):
+    cutoff = time.time() - days * 86400
+    removed = 0
+    for root, _, files in os.walk(STATEMENT_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+    print(f"✓ Removed {removed} cached statement(s) older than {days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Background PDF statements')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('worker', help='Render queued statements')
+    clean = subparsers.add_parser('cleanup', help='Delete old cached statements')
+    clean.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        run_worker()
+    else:
+        cleanup(args.days)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
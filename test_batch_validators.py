@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Batch Validator Equivalence Test
+The vectorized validators must give exactly the scalar answer for every row
+
+Compares batch_validators.py against the scalar field checks in
+payment_schema.py (and against app.utils.validators' accept/reject decision
+when the app package is importable) on:
+- realistic columns (batch_validators.sample_columns)
+- hand-picked edge cases (blank, separators, non-ASCII digits, 4-digit years,
+  trailing zeros, exponents, overlong values)
+- random strings over an alphabet of digits, separators and junk
+
+Usage:
+    python test_batch_validators.py
+    python test_batch_validators.py --rows 200000 --seed 3
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch_validators import (
+    CODES, sample_columns, validate_amounts, validate_card_numbers, validate_cvvs, validate_expiry_dates,
+)
+from payment_schema import PAYMENT_SCHEMA
+
+
+def print_success(text):
+    print(f"✅ {text}")
+
+
+def print_error(text):
+    print(f"❌ {text}")
+
+
+def print_info(text):
+    print(f"ℹ️  {text}")
+
+
+EDGE_CASES = {
+    'card_number': ['4111111111111111', '4111 1111 1111 1111', '4111-1111-1111-1111', ' 4111111111111111 ',
+                    '4111111111111112', '411111', '4' * 20, '41111111111111111111111111111111111111',
+                    '4111 1111 1111 1111 ' + ' ' * 20, '٤١١١١١١١١١١١١١١١', '4111\t1111111111111',
+                    '-', ' ', '   ', '', None, 4111111111111111, '0000000000000', '378282246310005'],
+    'cvv': ['123', '1234', '12', '12345', ' 123 ', '12a', '١٢٣', '', None, 123, '   '],
+    'expiry_date': ['12/26', '1226', '12/2026', '13/30', '00/30', '01/99', '12/0099', ' 12/30 ', '1/30',
+                    '12/3', '12-30', '１２/３０', '', None, '   ', '12/30/30', '12/300', 'ab/cd'],
+    'amount': ['99.99', '0', '0.00', '-5', '1e3', '1E-2', '0.001', '10.500', '.5', '5.', '.', '', None,
+               ' 7 ', '   ', '٣', 'NaN', 'Infinity', '+5', '1_000', '999999.99', '999999.991', '1000000',
+               '123456789012345678', '0000000000000000000001.5', 12.5, 3, '1.2.3', '1..2'],
+}
+
+VECTORIZED = {
+    'card_number': validate_card_numbers,
+    'cvv': validate_cvvs,
+    'expiry_date': validate_expiry_dates,
+    'amount': validate_amounts,
+}
+
+
+def scalar_code(field, value):
+    """What the compiled schema reports for one value"""
+    if value is None or value == '':
+        return 'required'
+    return PAYMENT_SCHEMA[field].check(value if isinstance(value, str) else str(value))[1] or ''
+
+
+def compare(field, values):
+    result = VECTORIZED[field](values)
+    ok, codes = result[0], result[1]
+    mismatches = []
+    for i, value in enumerate(values):
+        expected = scalar_code(field, value)
+        got = CODES[codes[i]]
+        if got != expected or bool(ok[i]) != (expected == ''):
+            mismatches.append((value, expected, got))
+        elif field == 'amount' and not expected:
+            cents = int(PAYMENT_SCHEMA['amount'].check(str(value))[0] * 100)
+            if cents != result[2][i]:
+                mismatches.append((value, f"{cents} cents", f"{result[2][i]} cents"))
+    return mismatches
+
+
+def random_strings(rng, rows, alphabet):
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 24))) for _ in range(rows)]
+
+
+def app_validators():
+    try:
+        from app.utils import validators
+    except ImportError:
+        return None
+    return {
+        'card_number': validators.validate_card_number,
+        'cvv': validators.validate_cvv,
+        'expiry_date': validators.validate_expiry_date,
+        'amount': validators.validate_amount,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch validator equivalence test')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"\n{'='*60}")
+    print("  🧪 Batch Validator Equivalence Test")
+    print(f"{'='*60}\n")
+
+    rng = random.Random(args.seed)
+    year = date.today().year % 100
+    columns = sample_columns(args.rows, seed=args.seed)
+    columns['cvv'] = [str(rng.randrange(0, 100000)) for _ in range(args.rows)]
+    alphabets = {
+        'card_number': '0123456789' * 4 + ' -x.٣',
+        'cvv': '0123456789' * 2 + ' a',
+        'expiry_date': '0123456789/' + f"{year:02d}" * 2 + ' -',
+        'amount': '0123456789' * 3 + '..-+e ',
+    }
+
+    failed = 0
+    for field in VECTORIZED:
+        cases = [('sample rows', columns[field]), ('edge cases', EDGE_CASES[field]),
+                 ('random strings', random_strings(rng, args.rows, alphabets[field]))]
+        for label, values in cases:
+            mismatches = compare(field, values)
+            if mismatches:
+                failed += 1
+                print_error(f"{field} / {label}: {len(mismatches)} of {len(values):,} rows differ, e.g.")
+                for value, expected, got in mismatches[:5]:
+                    print(f"      {value!r}: scalar {expected or 'valid'}, vectorized {got or 'valid'}")
+            else:
+                print_success(f"{field} / {label}: {len(values):,} rows identical")
+
+    scalar = app_validators()
+    if scalar is None:
+        print_info("app.utils.validators not importable here: compared against payment_schema only")
+    else:
+        for field, validate in scalar.items():
+            values = EDGE_CASES[field] + columns[field][:2000]
+            ok = VECTORIZED[field](values)[0]
+            differ = [value for value, flag in zip(values, ok) if bool(validate(value)[0]) != bool(flag)]
+            if differ:
+                failed += 1
+                print_error(f"{field}: app.utils.validators disagrees on {len(differ)} row(s), e.g. {differ[:5]}")
+            else:
+                print_success(f"{field}: same accept/reject decisions as app.utils.validators")
+
+    print(f"\nEquivalence checks: {'all passed' if not failed else f'{failed} failed'}")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Streaming Export Memory Test
+Asserts that CSV, NDJSON and Parquet export memory stays flat for a 5M-row export
+
+Usage:
+    python test_export_memory.py                     # 5,000,000 synthetic rows, no DB needed
+    python test_export_memory.py --rows 500000       # quicker run
+    python test_export_memory.py --format parquet    # one format only
+    python test_export_memory.py --db                # real export from the transactions table
+
+The export is consumed the way a socket would (bytes counted and discarded)
+while peak RSS is tracked with getrusage. A 1/10th-size run goes first, so
+any growth between it and the full run is memory that scales with row count.
+The test fails if that growth exceeds --limit-mb.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from export_stream import CHUNK_ROWS, EXPORT_COLUMNS, FORMATS, WAREHOUSE_COLUMNS, export_chunks
+
+CASES = [('csv', False), ('csv', True), ('ndjson', True), ('parquet', False)]
+
+
+def print_success(text):
+    print(f"✅ {text}")
+
+
+def print_error(text):
+    print(f"❌ {text}")
+
+
+def synthetic_chunks(total_rows, columns=EXPORT_COLUMNS, chunk_rows=CHUNK_ROWS):
+    """Rows shaped like the given export columns, generated lazily chunk by chunk"""
+    base = datetime(2026, 1, 1)
+    statuses = ['SUCCESS', 'SUCCESS', 'SUCCESS', 'FAILED', 'PENDING']
+    currencies = ['USD', 'USD', 'EUR', 'GBP']
+    for start in range(0, total_rows, chunk_rows):
+        rows = []
+        for i in range(start, min(start + chunk_rows, total_rows)):
+            created = base + timedelta(seconds=i)
+            values = {
+                'id': i + 1, 'user_id': i % 5000 + 1, 'created_at': created,
+                'amount': Decimal(10000 + i % 49000) / 100, 'currency': currencies[i % 4],
+                'status': statuses[i % 5], 'masked_card_number': '************1111',
+                'fraud_score': 0.12, 'ip_address': f"192.168.{i % 256}.{i % 254 + 1}",
+                'processed_at': created + timedelta(seconds=2),
+                'external_transaction_id': f"BANK_{100000 + i % 900000}",
+            }
+            rows.append(tuple(values[name] for name in columns))
+        yield rows
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fmt, chunks, compress):
+    """Consume one export, return (peak RSS MB so far, output MB, seconds)"""
+    started = time.perf_counter()
+    total_bytes = 0
+    for data in export_chunks(fmt, chunks, compress=compress):
+        total_bytes += len(data)
+    return peak_rss_mb(), total_bytes / 1e6, time.perf_counter() - started
+
+
+def case_label(fmt, compress):
+    return fmt + ('+gzip' if compress else '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming export memory test')
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--limit-mb', type=float, default=8.0, help='Allowed RSS growth')
+    parser.add_argument('--format', choices=list(FORMATS), help='Only test this format')
+    parser.add_argument('--db', action='store_true', help='Export the real transactions table')
+    args = parser.parse_args()
+    cases = [case for case in CASES if args.format in (None, case[0])]
+
+    print(f"\n{'='*60}")
+    print("  🧪 Streaming Export Memory Test")
+    print(f"{'='*60}\n")
+
+    failed = 0
+    if args.db:
+        from app import create_app
+        from export_stream import iter_transaction_chunks
+
+        app = create_app()
+        with app.app_context():
+            baseline = peak_rss_mb()
+            for fmt, compress in cases:
+                columns = EXPORT_COLUMNS if fmt == 'csv' else WAREHOUSE_COLUMNS
+                peak, size, elapsed = measure(fmt, iter_transaction_chunks(columns=columns), compress)
+                label = case_label(fmt, compress)
+                growth = peak - baseline
+                if growth <= args.limit_mb:
+                    print_success(f"DB {label}: RSS +{growth:.1f} MB for {size:,.0f} MB output ({elapsed:.1f}s)")
+                else:
+                    print_error(f"DB {label}: RSS grew {growth:.1f} MB, limit {args.limit_mb} MB")
+                    failed += 1
+        return 0 if failed == 0 else 1
+
+    for fmt, compress in cases:
+        label = case_label(fmt, compress)
+        columns = EXPORT_COLUMNS if fmt == 'csv' else WAREHOUSE_COLUMNS
+        small_peak, _, _ = measure(fmt, synthetic_chunks(args.rows // 10, columns), compress)
+        peak, size, elapsed = measure(fmt, synthetic_chunks(args.rows, columns), compress)
+        growth = peak - small_peak
+
+        print(f"{label}: {args.rows:,} rows -> {size:,.0f} MB in {elapsed:.1f}s, "
+              f"peak RSS {peak:.1f} MB (1/10th run: {small_peak:.1f} MB)")
+
+        if growth > args.limit_mb:
+            print_error(f"{label}: RSS grew {growth:.1f} MB with row count, limit {args.limit_mb} MB")
+            failed += 1
+        else:
+            print_success(f"{label}: memory is flat (+{growth:.1f} MB)")
+
+    print(f"\nMemory checks: {len(cases) - failed} passed, {failed} failed")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
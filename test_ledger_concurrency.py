@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Ledger Service Concurrency Stress Test
+Many worker processes append through the single-writer service; nothing may be lost or forked
+
+Needs Redis (REDIS_HOST / REDIS_PORT). Uses a temporary LEDGER_DIR and its own
+Redis key prefix, so it does not touch the real ledger.
+
+Usage:
+    python test_ledger_concurrency.py
+    python test_ledger_concurrency.py --workers 8 --transactions 20000 --kills 3
+
+What it does:
+- Starts `ledger_service.py run` as a subprocess
+- N worker processes (like gunicorn workers) submit overlapping transaction
+  ids in small batches and wait for acks, resubmitting anything that times out
+- The service is killed with SIGKILL --kills times mid-run and restarted
+- Afterwards it checks:
+    every transaction id is in the ledger exactly once
+    every ack points at the block and leaf that really hold the transaction
+    the chain verifies end to end (one unbroken previous_hash chain)
+"""
+
+import argparse
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from multiprocessing import Pool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def print_success(text):
+    print(f"✅ {text}")
+
+
+def print_error(text):
+    print(f"❌ {text}")
+
+
+def start_service(env):
+    return subprocess.Popen([sys.executable, os.path.join(HERE, 'ledger_service.py'), 'run'],
+                            env=env, stdout=subprocess.DEVNULL)
+
+
+def worker(args):
+    """Submit ids in batches of 25, retrying until each one is acknowledged"""
+    worker_id, ids, batch_size = args
+    from ledger_service import submit_nowait, wait_for_acks
+
+    acks = {}
+    retries = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        while batch:
+            request_ids = {submit_nowait({'id': tid, 'worker': worker_id, 'amount': '10.00'}): tid
+                           for tid in batch}
+            try:
+                for request_id, ack in wait_for_acks(list(request_ids), timeout=3).items():
+                    acks.setdefault(request_ids[request_id], []).append((ack['block'], ack['leaf']))
+                batch = []
+            except TimeoutError:
+                retries += 1
+    return acks, retries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ledger service concurrency stress test')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent writer processes')
+    parser.add_argument('--transactions', type=int, default=5000)
+    parser.add_argument('--duplicates', type=float, default=0.2, help='Share of ids also sent by another worker')
+    parser.add_argument('--kills', type=int, default=2, help='SIGKILL the service this many times')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='ledger_stress_')
+    env = dict(os.environ, LEDGER_DIR=directory, LEDGER_REDIS_PREFIX=f"ledger_test_{uuid.uuid4().hex[:8]}",
+               LEDGER_BLOCK_MAX_TX='100', LEDGER_BLOCK_MAX_WAIT='0.05')
+    os.environ.update(env)
+
+    from ledger_log import LedgerLog
+    from ledger_service import PREFIX, get_redis
+    from ledger_verify import verify
+
+    print(f"\n{'='*60}")
+    print("  🧪 Ledger Service Concurrency Stress Test")
+    print(f"{'='*60}\n")
+
+    # Every id goes to one worker; a share is also sent by a second worker
+    rng = random.Random(7)
+    ids = list(range(1, args.transactions + 1))
+    assignments = [[] for _ in range(args.workers)]
+    for tid in ids:
+        owner = tid % args.workers
+        assignments[owner].append(tid)
+        if args.workers > 1 and rng.random() < args.duplicates:
+            assignments[(owner + 1 + rng.randrange(args.workers - 1)) % args.workers].append(tid)
+    for assigned in assignments:
+        rng.shuffle(assigned)
+
+    service = start_service(env)
+    failed = 0
+    started = time.perf_counter()
+    try:
+        with Pool(processes=args.workers) as pool:
+            pending = pool.map_async(worker, [(n, assigned, 25) for n, assigned in enumerate(assignments)])
+            for _ in range(args.kills):
+                time.sleep(rng.uniform(0.5, 1.5))
+                if pending.ready():
+                    break
+                service.send_signal(signal.SIGKILL)
+                service.wait()
+                print(f"   💥 killed the ledger service (pid {service.pid}), restarting")
+                service = start_service(env)
+            results = pending.get()
+        elapsed = time.perf_counter() - started
+    finally:
+        service.send_signal(signal.SIGTERM)
+        service.wait(timeout=30)
+
+    submitted = sum(len(assigned) for assigned in assignments)
+    retries = sum(r for _, r in results)
+    print(f"{submitted:,} submissions ({submitted - len(ids):,} duplicates) from {args.workers} workers "
+          f"in {elapsed:.1f}s, {retries} batch retries\n")
+
+    ledger = LedgerLog(directory, readonly=True)
+    location = {}
+    duplicated = set()
+    for block in ledger.iter_blocks():
+        for leaf, entry in enumerate(block.get('entries') or []):
+            if entry['id'] in location:
+                duplicated.add(entry['id'])
+            location[entry['id']] = (block['index'], leaf)
+    blocks = len(ledger)
+    ledger.close()
+
+    missing = set(ids) - set(location)
+    if missing:
+        print_error(f"{len(missing)} acknowledged transaction(s) missing from the ledger")
+        failed += 1
+    else:
+        print_success(f"All {len(ids):,} transactions are in the ledger ({blocks} blocks)")
+
+    if duplicated:
+        print_error(f"{len(duplicated)} transaction(s) written more than once")
+        failed += 1
+    else:
+        print_success("No transaction was written twice")
+
+    wrong = [tid for acks, _ in results for tid, places in acks.items()
+             if any(place != location.get(tid) for place in places)]
+    if wrong:
+        print_error(f"{len(wrong)} ack(s) point at the wrong block or leaf")
+        failed += 1
+    else:
+        print_success("Every ack matches the block and leaf holding the transaction")
+
+    ok, report = verify(directory, full=True, write_checkpoint=False)
+    if ok:
+        print_success(f"Chain verifies: {report['to']} blocks, no fork")
+    else:
+        print_error(f"Chain verification failed: {report.get('error') or report['errors'][:3]}")
+        failed += 1
+
+    client = get_redis()
+    leftover = client.keys(f"{PREFIX}:*")
+    if leftover:
+        client.delete(*leftover)
+    shutil.rmtree(directory)
+
+    print(f"\nConcurrency checks: {4 - failed} passed, {failed} failed")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
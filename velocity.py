@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Sliding-Window Velocity Limits
+Card, IP and device counters for fraud signals, checked in one Redis round trip
+
+Per-route rate limits count requests per user. Fraud velocity needs other
+keys and other questions:
+
+    card_attempts   more than 5 attempts on one card in 10 minutes
+    ip_attempts     more than 30 attempts from one IP in 10 minutes
+    ip_cards        more than 20 different cards from one IP in an hour
+    device_cards    more than 10 different cards from one user agent + IP in an hour
+
+Every rule is a Redis sorted set per key, scored by time:
+- attempt rules add a unique member per attempt; distinct rules add the
+  counted value itself (a card fingerprint), so a repeat only refreshes its
+  score and ZCARD is the number of DIFFERENT values in the window
+- per rule: ZREMRANGEBYSCORE (drop expired), ZADD, ZREMRANGEBYRANK (keep at
+  most 2 x limit members, so a hammered key stays small), ZCARD, EXPIRE
+- all rules for a payment go out in ONE non-transactional pipeline: one
+  network round trip, well under 1 ms on a local Redis (see `bench`)
+
+Cards are never stored: the key and member is an HMAC-SHA256 fingerprint of
+the PAN (VELOCITY_KEY, falling back to SECRET_KEY; importing this module fails
+if neither is set, since an unkeyed hash of a PAN is brute-forceable). User
+agents are hashed too.
+
+In PaymentService.process_payment, before fraud scoring:
+    from velocity import check_payment
+
+    velocity = check_payment(card_number, ip_address, user_agent)
+    if velocity.exceeded:
+        # decline and record the attempt as FRAUD, with velocity.exceeded as the reason
+        ...
+
+If Redis is unreachable the check is skipped (result.available is False) and
+the payment goes on to the model-based fraud score.
+
+CLI:
+    python velocity.py check --card 4111111111111111 --ip 10.0.0.1 --user-agent curl
+    python velocity.py bench --checks 5000
+"""
+
+import argparse
+import hashlib
+import hmac
+import os
+import sys
+import time
+import uuid
+from collections import namedtuple
+
+# Add app to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import redis
+
+KEY_PREFIX = 'vel'
+FINGERPRINT_KEY = (os.environ.get('VELOCITY_KEY') or os.environ.get('SECRET_KEY') or '').encode()
+if not FINGERPRINT_KEY:
+    raise RuntimeError("velocity.py needs VELOCITY_KEY or SECRET_KEY to fingerprint card numbers")
+
+# name, key dimension, counted value (None = every attempt), window seconds, limit
+Rule = namedtuple('Rule', 'name dimension distinct window limit')
+
+RULES = (
+    Rule('card_attempts', 'card', None, 600, 5),
+    Rule('ip_attempts', 'ip', None, 600, 30),
+    Rule('ip_cards', 'ip', 'card', 3600, 20),
+    Rule('device_cards', 'device', 'card', 3600, 10),
+)
+
+VelocityResult = namedtuple('VelocityResult', 'exceeded counts available elapsed_ms')
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis(
+            host=os.environ.get('REDIS_HOST', 'localhost'),
+            port=int(os.environ.get('REDIS_PORT', 6379)),
+            db=int(os.environ.get('REDIS_DB', 0)),
+            decode_responses=True,
+            socket_timeout=0.25,
+        )
+    return _client
+
+
+def fingerprint(value):
+    """Keyed hash so card numbers never reach Redis"""
+    digits = ''.join(ch for ch in str(value) if ch.isalnum())
+    return hmac.new(FINGERPRINT_KEY, digits.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def payment_dimensions(card_number, ip_address, user_agent):
+    ua = hashlib.sha256((user_agent or '').encode()).hexdigest()[:16]
+    return {
+        'card': fingerprint(card_number),
+        'ip': ip_address or 'unknown',
+        'device': f"{ua}:{ip_address or 'unknown'}",
+    }
+
+
+def check(dimensions, rules=RULES, record=True, client=None, now=None):
+    """Record this attempt under every rule and return the window counts, one round trip"""
+    client = client or get_redis()
+    now = time.time() if now is None else now
+    attempt = f"{now:.6f}:{uuid.uuid4().hex[:8]}"
+    active = [rule for rule in rules
+              if dimensions.get(rule.dimension) and (rule.distinct is None or dimensions.get(rule.distinct))]
+
+    started = time.perf_counter()
+    pipe = client.pipeline(transaction=False)
+    for rule in active:
+        key = f"{KEY_PREFIX}:{rule.name}:{dimensions[rule.dimension]}"
+        pipe.zremrangebyscore(key, '-inf', now - rule.window)
+        if record:
+            member = attempt if rule.distinct is None else dimensions[rule.distinct]
+            pipe.zadd(key, {member: now})
+            pipe.zremrangebyrank(key, 0, -(rule.limit * 2) - 1)
+            pipe.expire(key, rule.window)
+        pipe.zcard(key)
+    try:
+        replies = pipe.execute()
+    except redis.RedisError:
+        return VelocityResult([], {}, False, (time.perf_counter() - started) * 1000)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    per_rule = 5 if record else 2
+    # ZCARD is the last reply of each rule's block
+    counts = {rule.name: replies[(i + 1) * per_rule - 1] for i, rule in enumerate(active)}
+    exceeded = [rule.name for rule in active if counts[rule.name] > rule.limit]
+    return VelocityResult(exceeded, counts, True, elapsed_ms)
+
+
+def check_payment(card_number, ip_address=None, user_agent=None, record=True, client=None):
+    return check(payment_dimensions(card_number, ip_address, user_agent), record=record, client=client)
+
+
+def bench(checks):
+    """Latency of one full check (all rules, one pipeline) against the configured Redis"""
+    client = get_redis()
+    timings = []
+    run = uuid.uuid4().hex[:6]
+    for n in range(checks):
+        dimensions = payment_dimensions(f"4111{run}{n % 500:06d}", f"10.{n % 7}.0.{n % 50}", 'bench')
+        timings.append(check(dimensions, client=client).elapsed_ms)
+    for key in client.scan_iter(f"{KEY_PREFIX}:*", count=1000):
+        if run in key:
+            client.delete(key)
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"   {checks:,} checks x {len(RULES)} rules: p50 {p50:.3f} ms, p99 {p99:.3f} ms, "
+          f"max {timings[-1]:.3f} ms")
+    return 0 if p50 <= 1.0 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sliding-window velocity limits')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help='Current counts for a card / IP / user agent')
+    check_parser.add_argument('--card', required=True)
+    check_parser.add_argument('--ip')
+    check_parser.add_argument('--user-agent')
+    check_parser.add_argument('--record', action='store_true', help='Count this as an attempt')
+    bench_parser = subparsers.add_parser('bench', help='Round-trip latency of a full check')
+    bench_parser.add_argument('--checks', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        return bench(args.checks)
+
+    result = check_payment(args.card, args.ip, args.user_agent, record=args.record)
+    if not result.available:
+        print("✗ Redis unavailable")
+        return 1
+    limits = {rule.name: rule for rule in RULES}
+    for name, count in result.counts.items():
+        rule = limits[name]
+        flag = '  <-- exceeded' if name in result.exceeded else ''
+        print(f"   {name:<14} {count:>4} / {rule.limit} in {rule.window // 60} min{flag}")
+    print(f"   ({result.elapsed_ms:.2f} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,5 +26,14 @@ if [ $attempt -gt $max_attempts ]; then
     exit 1
 fi
 
+# Size workers from the core count and the DB pool from the worker model
+export GUNICORN_WORKER_CLASS=sync
+export GUNICORN_WORKERS=${GUNICORN_WORKERS:-$(( $(nproc) * 2 + 1 ))}
+
+if [ -z "$DB_POOL_SIZE" ] || [ -z "$DB_MAX_OVERFLOW" ]; then
+    eval "$(python db_pool_monitor.py limits | grep '^export')"
+fi
+echo "Workers: $GUNICORN_WORKERS ($GUNICORN_WORKER_CLASS), DB pool: size=$DB_POOL_SIZE overflow=$DB_MAX_OVERFLOW"
+
 echo "Starting Flask application with gunicorn..."
-exec gunicorn --bind 0.0.0.0:5000 --workers 4 --worker-class sync --timeout 120 --access-logfile - --error-logfile - wsgi:app
+exec gunicorn --bind 0.0.0.0:5000 --workers $GUNICORN_WORKERS --worker-class $GUNICORN_WORKER_CLASS --timeout 120 --access-logfile - --error-logfile - wsgi:app
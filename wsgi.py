@@ -1,14 +1,29 @@
 """
 WSGI Entry Point for Production Deployment
 """
+import os
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
 from app import create_app
+from health_sampler import init_health
+from realtime import init_realtime
+from realtime_deltas import init_deltas
+# Fails at startup, not on the first payment, without a card fingerprint key
+import velocity  # noqa: F401
 
 app = create_app()
-socketio = app.socketio if hasattr(app, 'socketio') else None
+# Trust X-Forwarded-For / -Proto from exactly this many proxies in front of us
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
+# Background dependency probes; /healthz, /readyz and /api/admin/health/sampled
+init_health(app)
+# Redis message queue + per-user rooms, so every worker can reach every socket
+socketio = init_realtime(app)
+# Coalesced transactions_delta per user room, only if SOCKETIO_DELTA_WINDOW > 0
+init_deltas(socketio)
 
 if __name__ == '__main__':
-    if socketio:
-        socketio.run(app, host='0.0.0.0', port=5000, debug=False)
-    else:
-        app.run(host='0.0.0.0', port=5000, debug=False)
+    socketio.run(app, host='0.0.0.0', port=5000, debug=False)
 